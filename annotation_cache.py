@@ -0,0 +1,48 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module stores the protein name, protein comment, organism and taxonomy lineage of protein accession
+#           codes in a local SQLite database, so the information only has to be retrieved from the NCBI protein
+#           database once.
+#           When the cache holds more than the maximum number of accession codes, the least recently used ones
+#           are removed.
+
+import json
+import sqlite_lru
+
+
+class AnnotationCache:
+    """Persistent cache that maps protein accession codes to a tuple of protein name, protein comment, organism and
+    the taxonomy lineage of the organism as a list of (name, rank) tuples from the root down.
+
+    The cache is stored in the SQLite database file at path and holds at most max_entries accession codes.
+    It can be shared by multiple threads. Codes that were cached before lineages with ranks were kept are seen as
+    missing, so they are retrieved again.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        self.table = sqlite_lru.LruTable(path, "annotation", "accession",
+                                         [("name", "TEXT NOT NULL"), ("comment", "TEXT NOT NULL"),
+                                          ("organism", "TEXT NOT NULL"), ("lineage", "TEXT")], max_entries)
+
+    def get_many(self, accessions):
+        """Accepts a list of accession codes and returns a dictionary with the cached info of the codes that were
+        found in the cache. The found codes are marked as recently used.
+        """
+        found = {}
+        for accession, (name, comment, organism, lineage) in self.table.get_many(accessions).items():
+            if lineage is not None:
+                found[accession] = (name, comment, organism, [tuple(taxon) for taxon in json.loads(lineage)])
+        return found
+
+    def put_many(self, annotations):
+        """Accepts a dictionary with accession codes as keys and tuples of protein name, protein comment, organism
+        and lineage as values and stores them in the cache. Afterwards the least recently used codes are removed if
+        the cache holds more than max_entries codes.
+        """
+        self.table.put_many({accession: (name, comment, organism, json.dumps(lineage))
+                             for accession, (name, comment, organism, lineage) in annotations.items()})
+
+    def close(self):
+        """Closes the connection with the cache database."""
+        self.table.close()
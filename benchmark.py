@@ -0,0 +1,673 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module measures the performance of the BLAST ingest and the web application without access to the
+#           NCBI servers or the real database. It generates a synthetic pair of fastq files modelled on txt1 and txt2,
+#           canned BLAST xml and GenBank records for the reads and serves them from a local stub of the qblast and
+#           Entrez servers. The reads are stored in the local benchmark database from the config file, after which
+#           the pages of the web application are requested by multiple clients at the same time. The timings of
+#           every step are written to a JSON file, so the results of different runs can be compared.
+
+import argparse
+import gzip
+import itertools
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import StringIO
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from Bio import Entrez, BiopythonExperimentalWarning
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', BiopythonExperimentalWarning)
+    from Bio import SearchIO
+import annotation_cache
+import blast_script
+import database
+import insert_script
+import schema
+
+# Number of read pairs in the generated fastq files
+READS = 10000
+# Length of the generated reads, the reads in txt1 and txt2 are 301 bases long
+READ_LENGTH = 301
+# Number of different protein accession codes the canned BLAST results are drawn from
+PROTEINS = 2000
+# Maximum number of hits per read in the canned BLAST results, like the hitlist_size of the qblast searches
+HITS_PER_READ = 10
+# Fraction of the reads without any hits
+NO_HIT_FRACTION = 0.2
+# Number of times the parsing and annotation steps are repeated
+REPEATS = 200
+# Number of reads that are annotated through the stub Entrez server, Bio.Entrez sends at most 3 requests per second
+ANNOTATE_REPEATS = 30
+# Number of reads that are stored in the benchmark database
+STORE_READS = 2000
+# Number of clients that request pages at the same time and the number of requests per client and page
+CLIENTS = 8
+REQUESTS = 50
+# Section of config.ini with the settings of the benchmark database
+SECTION = "benchmark"
+# Base URL of the Entrez utilities, requests to it are sent to the stub server instead
+ENTREZ_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+GENERA = ["Streptomyces", "Mycobacterium", "Pseudomonas", "Rhodococcus", "Burkholderia", "Corynebacterium",
+          "Actinoplanes", "Nocardia", "Micromonospora", "Frankia"]
+SPECIES = ["coelicolor", "tuberculosis", "aeruginosa", "erythropolis", "cepacia", "glutamicum", "sp.", "albus",
+           "griseus", "fluorescens"]
+PROTEIN_NAMES = ["hypothetical protein", "ABC transporter ATP-binding protein", "MFS transporter",
+                 "TetR family transcriptional regulator", "SDR family oxidoreductase",
+                 "serine/threonine protein kinase",
+                 "DNA-binding response regulator", "acyl-CoA dehydrogenase", "GNAT family N-acetyltransferase",
+                 "LuxR family transcriptional regulator", "alpha/beta hydrolase", "NAD(P)-dependent oxidoreductase"]
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+# Lineage of the canned organisms above their genus as (taxonomy id, name, rank) tuples from the root down, the genera
+# and organisms get taxonomy ids from GENUS_TAXID and SPECIES_TAXID on
+LINEAGE = [(131567, "cellular organisms", "no rank"), (2, "Bacteria", "domain"), (201174, "Actinomycetota", "phylum"),
+           (1760, "Actinomycetes", "class")]
+GENUS_TAXID = 100000
+SPECIES_TAXID = 200000
+
+
+def generate_fastq_pair(forward_file, reverse_file, reads=READS, read_length=READ_LENGTH, seed=1):
+    """Accepts the names of two fastq files, the number of read pairs and the length of the reads and writes a
+    synthetic pair of forward and reverse read files, which are gzip compressed if the names end with .gz.
+
+    The headers follow the Illumina MiSeq headers of txt1 and txt2, with /1 and /2 for the forward and reverse read.
+    The sequences are GC rich like the Streptomyces reads in txt1 and txt2 and the quality drops towards the end of
+    the reads, more so for the reverse reads. The reads are written one by one, so millions of reads can be generated
+    without holding them in memory. Returns the headers of the forward reads of the first pairs, at most 100000.
+    """
+    generator = random.Random(seed)
+    headers = []
+    with _open_output(forward_file) as forward, _open_output(reverse_file) as reverse:
+        for number in range(reads):
+            title = "HWI-M02942:21:000000000-ACNW4:1:{}:{}:{}".format(1101 + number // 1000000, 1000 + number % 25000,
+                                                                      2561 + number // 25000)
+            if len(headers) < 100000:
+                headers.append(title + "/1")
+            for handle, mate, decay in ((forward, 1, 0.04), (reverse, 2, 0.08)):
+                sequence = "".join(generator.choices("ACGT", weights=(17, 33, 33, 17), k=read_length))
+                qualities = "".join(chr(33 + max(2, min(38, int(38 - decay * position
+                                                                + generator.gauss(0, 3)))))
+                                    for position in range(read_length))
+                handle.write("@{}/{}\n{}\n+\n{}\n".format(title, mate, sequence, qualities))
+    return headers
+
+
+def _open_output(filename):
+    """Opens a file for writing, with gzip compression if the name ends with .gz."""
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "wt")
+    return open(filename, "w")
+
+
+def protein_accession(number):
+    """Returns the accession code of canned protein number, without version number."""
+    return "WP_{:09d}".format(100000000 + number)
+
+
+def protein_annotation(accession):
+    """Accepts the accession code of a canned protein and returns its protein name, comment, organism and the
+    taxonomy lineage of the organism as (name, rank) tuples, like prot_org_info.
+
+    The annotation is derived from the accession code, so the GenBank records of the stub server and the expected
+    annotations always agree.
+    """
+    generator = random.Random(accession)
+    organism = "{} {}".format(generator.choice(GENERA), generator.choice(SPECIES))
+    name = generator.choice(PROTEIN_NAMES)
+    if generator.random() < 0.5:
+        comment = "REFSEQ: This record represents a single, non-redundant, protein sequence."
+    else:
+        comment = ""
+    return name, comment, organism, [(taxon, rank) for taxid, taxon, rank in organism_lineage(organism)]
+
+
+def organism_lineage(organism):
+    """Accepts the name of a canned organism and returns its lineage as (taxonomy id, name, rank) tuples from the
+    root down to the organism itself."""
+    genus, species = organism.split(" ", 1)
+    genus_number = GENERA.index(genus)
+    return LINEAGE + [(GENUS_TAXID + genus_number, genus, "genus"),
+                      (SPECIES_TAXID + genus_number * len(SPECIES) + SPECIES.index(species), organism, "species")]
+
+
+def canned_hits(header, proteins=PROTEINS, hits_per_read=HITS_PER_READ, no_hit_fraction=NO_HIT_FRACTION):
+    """Accepts a read header and returns the accession codes of the proteins the read hits in the canned BLAST
+    results. The hits are derived from the header, so the same read always gets the same hits."""
+    generator = random.Random(header)
+    if generator.random() < no_hit_fraction:
+        return []
+    return generator.sample(range(proteins), generator.randint(1, hits_per_read))
+
+
+def blast_xml(headers, proteins=PROTEINS):
+    """Accepts a list of read headers and returns the BLAST xml of a blastx search with one query per header, with
+    the hits of canned_hits and the same layout as the output of the NCBI qblast service."""
+    iterations = []
+    for number, header in enumerate(headers, 1):
+        hits = []
+        generator = random.Random(header)
+        for rank, protein in enumerate(canned_hits(header, proteins), 1):
+            accession = protein_accession(protein)
+            align_length = generator.randint(40, 100)
+            identity = generator.randint(align_length // 3, align_length)
+            positives = generator.randint(identity, align_length)
+            query_start = generator.randint(1, READ_LENGTH - 3 * align_length)
+            hit_start = generator.randint(1, 200)
+            bitscore = round(200.0 / rank + generator.random(), 1)
+            alignment = "".join(generator.choice(AMINO_ACIDS) for _ in range(align_length))
+            hits.append(HIT_TEMPLATE.format(
+                rank=rank, accession=accession, definition="{0} [{2}]".format(*protein_annotation(accession)),
+                bitscore=bitscore, score=int(bitscore * 2.5), evalue="{:.3g}".format(10 ** -(bitscore / 5)),
+                query_from=query_start, query_to=query_start + 3 * align_length - 1, hit_from=hit_start,
+                hit_to=hit_start + align_length - 1, identity=identity, positives=positives,
+                align_length=align_length, alignment=alignment))
+        if hits:
+            message = ""
+        else:
+            message = "\n      <Iteration_message>No hits found</Iteration_message>"
+        iterations.append(ITERATION_TEMPLATE.format(number=number, header=header, length=READ_LENGTH,
+                                                    hits="".join(hits), message=message))
+    return XML_TEMPLATE.format(header=headers[0] if headers else "", length=READ_LENGTH,
+                               iterations="".join(iterations))
+
+
+XML_TEMPLATE = """<?xml version="1.0"?>
+<!DOCTYPE BlastOutput PUBLIC "-//NCBI//NCBI BlastOutput/EN" "http://www.ncbi.nlm.nih.gov/dtd/NCBI_BlastOutput.dtd">
+<BlastOutput>
+  <BlastOutput_program>blastx</BlastOutput_program>
+  <BlastOutput_version>BLASTX 2.8.0+</BlastOutput_version>
+  <BlastOutput_reference>Stephen F. Altschul et al. (1997), Nucleic Acids Res. 25:3389-3402.</BlastOutput_reference>
+  <BlastOutput_db>nr</BlastOutput_db>
+  <BlastOutput_query-ID>Query_1</BlastOutput_query-ID>
+  <BlastOutput_query-def>{header}</BlastOutput_query-def>
+  <BlastOutput_query-len>{length}</BlastOutput_query-len>
+  <BlastOutput_param>
+    <Parameters>
+      <Parameters_matrix>BLOSUM62</Parameters_matrix>
+      <Parameters_expect>0.0001</Parameters_expect>
+      <Parameters_gap-open>11</Parameters_gap-open>
+      <Parameters_gap-extend>1</Parameters_gap-extend>
+      <Parameters_filter>L</Parameters_filter>
+    </Parameters>
+  </BlastOutput_param>
+  <BlastOutput_iterations>{iterations}
+  </BlastOutput_iterations>
+</BlastOutput>
+"""
+
+ITERATION_TEMPLATE = """
+    <Iteration>
+      <Iteration_iter-num>{number}</Iteration_iter-num>
+      <Iteration_query-ID>Query_{number}</Iteration_query-ID>
+      <Iteration_query-def>{header}</Iteration_query-def>
+      <Iteration_query-len>{length}</Iteration_query-len>
+      <Iteration_hits>{hits}
+      </Iteration_hits>
+      <Iteration_stat>
+        <Statistics>
+          <Statistics_db-num>150000000</Statistics_db-num>
+          <Statistics_db-len>55000000000</Statistics_db-len>
+          <Statistics_hsp-len>0</Statistics_hsp-len>
+          <Statistics_eff-space>0</Statistics_eff-space>
+          <Statistics_kappa>0.041</Statistics_kappa>
+          <Statistics_lambda>0.267</Statistics_lambda>
+          <Statistics_entropy>0.14</Statistics_entropy>
+        </Statistics>
+      </Iteration_stat>{message}
+    </Iteration>"""
+
+HIT_TEMPLATE = """
+        <Hit>
+          <Hit_num>{rank}</Hit_num>
+          <Hit_id>ref|{accession}.1|</Hit_id>
+          <Hit_def>{definition}</Hit_def>
+          <Hit_accession>{accession}</Hit_accession>
+          <Hit_len>400</Hit_len>
+          <Hit_hsps>
+            <Hsp>
+              <Hsp_num>1</Hsp_num>
+              <Hsp_bit-score>{bitscore}</Hsp_bit-score>
+              <Hsp_score>{score}</Hsp_score>
+              <Hsp_evalue>{evalue}</Hsp_evalue>
+              <Hsp_query-from>{query_from}</Hsp_query-from>
+              <Hsp_query-to>{query_to}</Hsp_query-to>
+              <Hsp_hit-from>{hit_from}</Hsp_hit-from>
+              <Hsp_hit-to>{hit_to}</Hsp_hit-to>
+              <Hsp_query-frame>1</Hsp_query-frame>
+              <Hsp_hit-frame>0</Hsp_hit-frame>
+              <Hsp_identity>{identity}</Hsp_identity>
+              <Hsp_positive>{positives}</Hsp_positive>
+              <Hsp_gaps>0</Hsp_gaps>
+              <Hsp_align-len>{align_length}</Hsp_align-len>
+              <Hsp_qseq>{alignment}</Hsp_qseq>
+              <Hsp_hseq>{alignment}</Hsp_hseq>
+              <Hsp_midline>{alignment}</Hsp_midline>
+            </Hsp>
+          </Hit_hsps>
+        </Hit>"""
+
+
+def genbank_records(accessions):
+    """Accepts a list of protein accession codes and returns GenBank protein records for them, with the protein name,
+    comment, organism and taxonomy id of protein_annotation. Codes that aren't canned proteins are left out."""
+    records = []
+    for code in accessions:
+        accession = code.split('.')[0]
+        if not accession.startswith("WP_") or not accession[3:].isdigit():
+            continue
+        name, comment, organism, lineage = protein_annotation(accession)
+        taxa = organism_lineage(organism)
+        generator = random.Random(accession)
+        sequence = "".join(generator.choice(AMINO_ACIDS.lower()) for _ in range(60))
+        sequence = " ".join(sequence[start:start + 10] for start in range(0, 60, 10))
+        if comment:
+            comment = "COMMENT     {}\n".format(comment)
+        # Like in real GenBank records, the lineage starts below "cellular organisms" and ends above the organism
+        records.append(GENBANK_TEMPLATE.format(accession=accession, name=name, comment=comment, organism=organism,
+                                               taxonomy="; ".join(taxon for taxon, rank in lineage[1:-1]),
+                                               taxid=taxa[-1][0], sequence=sequence))
+    return "".join(records)
+
+
+def taxonomy_records(taxids):
+    """Accepts a list of taxonomy ids and returns the records of the canned organisms among them in the xml format
+    of the NCBI taxonomy database, with their lineage and ranks. Other ids are left out."""
+    organisms = {}
+    for genus in GENERA:
+        for species in SPECIES:
+            organism = "{} {}".format(genus, species)
+            organisms[str(organism_lineage(organism)[-1][0])] = organism
+    records = []
+    for taxid in taxids:
+        if taxid not in organisms:
+            continue
+        lineage = organism_lineage(organisms[taxid])
+        ancestors = "".join(TAXON_TEMPLATE.format(taxid=ancestor_id, name=name, rank=rank)
+                            for ancestor_id, name, rank in lineage[:-1])
+        records.append(TAXONOMY_TEMPLATE.format(taxid=taxid, name=lineage[-1][1], parent=lineage[-2][0],
+                                                lineage="; ".join(name for ancestor_id, name, rank in lineage[:-1]),
+                                                ancestors=ancestors))
+    return TAXA_SET_TEMPLATE.format("".join(records))
+
+
+GENBANK_TEMPLATE = """LOCUS       {accession}                60 aa            linear   BCT 01-JUN-2018
+DEFINITION  {name} [{organism}].
+ACCESSION   {accession}
+VERSION     {accession}.1
+KEYWORDS    RefSeq.
+SOURCE      {organism}
+  ORGANISM  {organism}
+            {taxonomy}.
+{comment}FEATURES             Location/Qualifiers
+     source          1..60
+                     /organism="{organism}"
+                     /db_xref="taxon:{taxid}"
+ORIGIN
+        1 {sequence}
+//
+"""
+
+
+TAXA_SET_TEMPLATE = """<?xml version="1.0" ?>
+<!DOCTYPE TaxaSet PUBLIC "-//NLM//DTD Taxon, 14th January 2002//EN"
+  "https://www.ncbi.nlm.nih.gov/entrez/query/DTD/taxon.dtd">
+<TaxaSet>{}</TaxaSet>
+"""
+
+TAXONOMY_TEMPLATE = """<Taxon>
+    <TaxId>{taxid}</TaxId>
+    <ScientificName>{name}</ScientificName>
+    <ParentTaxId>{parent}</ParentTaxId>
+    <Rank>species</Rank>
+    <Division>Bacteria</Division>
+    <Lineage>{lineage}</Lineage>
+    <LineageEx>{ancestors}
+    </LineageEx>
+</Taxon>
+"""
+
+TAXON_TEMPLATE = """
+        <Taxon>
+            <TaxId>{taxid}</TaxId>
+            <ScientificName>{name}</ScientificName>
+            <Rank>{rank}</Rank>
+        </Taxon>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers qblast and Entrez efetch requests with the canned BLAST results, GenBank records and taxonomy records.
+
+    A qblast search is answered with a request id straight away and its results are returned on the first poll.
+    """
+
+    def do_GET(self):
+        self.answer(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.answer(parse_qs(self.rfile.read(length).decode()))
+
+    def answer(self, parameters):
+        path = urlparse(self.path).path
+        command = parameters.get("CMD", [""])[0]
+        content_type = "text/plain"
+        if path.endswith("efetch.fcgi") and parameters.get("db", [""])[0] == "taxonomy":
+            body = taxonomy_records(",".join(parameters.get("id", [])).split(","))
+            # Bio.Entrez only parses xml that isn't sent as plain text
+            content_type = "text/xml"
+        elif path.endswith("efetch.fcgi"):
+            body = genbank_records(",".join(parameters.get("id", [])).split(","))
+        elif command == "Put":
+            headers = [line[1:].split(None, 1)[0] for line in parameters.get("QUERY", [""])[0].splitlines()
+                       if line.startswith(">")]
+            with self.server.lock:
+                self.server.searches += 1
+                rid = "STUB{:06d}".format(self.server.searches)
+                self.server.queries[rid] = headers
+            body = "<!--QBlastInfoBegin\n    RID = {}\n    RTOE = 0\nQBlastInfoEnd\n-->\n".format(rid)
+        elif command == "Get" and parameters.get("FORMAT_OBJECT", [""])[0] == "SearchInfo":
+            body = "<!--QBlastInfoBegin\n\tStatus=READY\n\tThereAreHits=yes\nQBlastInfoEnd\n-->\n"
+        elif command == "Get":
+            with self.server.lock:
+                headers = self.server.queries.pop(parameters.get("RID", [""])[0], [])
+            body = blast_xml(headers)
+        else:
+            self.send_error(400)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0):
+    """Starts the stub qblast and Entrez server on a free port of localhost in a background thread and returns the
+    server. Its qblast endpoint is server.blast_url and its Entrez utilities are found under server.entrez_url."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.searches = 0
+    server.queries = {}
+    base = "http://127.0.0.1:{}/".format(server.server_address[1])
+    server.blast_url = base + "Blast.cgi"
+    server.entrez_url = base + "entrez/eutils/"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def redirect_entrez(entrez_url):
+    """Sends the requests of Bio.Entrez to entrez_url instead of the NCBI servers.
+
+    Bio.Entrez doesn't have a setting for the address of the Entrez utilities, so the urlopen function it uses is
+    replaced by one that rewrites the address of every request.
+    """
+    urlopen = Entrez.urlopen
+
+    def redirected(request, *args, **kwargs):
+        if request.full_url.startswith(ENTREZ_URL):
+            request.full_url = entrez_url + request.full_url[len(ENTREZ_URL):]
+        return urlopen(request, *args, **kwargs)
+
+    Entrez.urlopen = redirected
+
+
+def summarize(samples, items=None):
+    """Accepts a list of durations in seconds and optionally the number of items processed in total and returns a
+    dictionary with the number of samples, the total, mean, median, 95th percentile and maximum duration and the
+    number of items or samples per second."""
+    samples = sorted(samples)
+    total = sum(samples)
+    if items is None:
+        items = len(samples)
+    summary = {"count": len(samples), "total_seconds": total}
+    if samples:
+        summary.update({"mean_seconds": total / len(samples), "median_seconds": statistics.median(samples),
+                        "p95_seconds": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                        "max_seconds": samples[-1]})
+    if total:
+        summary["per_second"] = items / total
+    return summary
+
+
+def timed(function, *args, **kwargs):
+    """Calls function with the arguments and returns its return value and the duration of the call in seconds."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_read_fastq(forward_file, reverse_file):
+    """Reads both fastq files with read_fastq and returns the timing and the number of reads."""
+    reads, duration = timed(lambda: sum(1 for filename in (forward_file, reverse_file)
+                                        for _ in blast_script.read_fastq(filename)))
+    summary = summarize([duration], reads)
+    summary["reads"] = reads
+    return summary
+
+
+def bench_read_xml(headers, repeats):
+    """Times read_xml on the canned results of a single read with hits and map_qresults on the canned results of a
+    batch of reads, repeats times each."""
+    single = next(header for header in headers if canned_hits(header))
+    with open("blast_result.xml", "w") as out_handle:
+        out_handle.write(blast_xml([single]))
+    single_samples = [timed(blast_script.read_xml, "blast_result.xml")[1] for _ in range(repeats)]
+
+    batch = headers[:blast_script.BATCH_SIZE]
+    batch_xml = blast_xml(batch)
+    batch_samples = []
+    for _ in range(repeats):
+        batch_samples.append(timed(lambda: blast_script.map_qresults(
+            SearchIO.parse(StringIO(batch_xml), 'blast-xml'), batch))[1])
+    return {"read_xml": summarize(single_samples),
+            "map_qresults_batch": summarize(batch_samples, repeats * len(batch))}
+
+
+def bench_blast_batch(headers, blast_url):
+    """Times a single blast_batch search of a batch of reads against the stub qblast server.
+
+    Only one search is timed, because qblast waits 20 seconds between two requests for results, also for other
+    servers than the NCBI server.
+    """
+    batch = headers[:blast_script.BATCH_SIZE]
+    return summarize([timed(blast_script.blast_batch, batch, ["ACGT" * 75] * len(batch), blast_url)[1]],
+                     len(batch))
+
+
+def bench_prot_org_info(headers, repeats, cache_path):
+    """Times prot_org_info on the hits of repeats reads against the stub Entrez server, without a cache, with an
+    empty annotation cache and with the filled cache."""
+    code_lists = [[protein_accession(protein) for protein in canned_hits(header)] for header in headers]
+    code_lists = [codes for codes in code_lists if codes][:repeats]
+    results = {"uncached": summarize([timed(blast_script.prot_org_info, codes)[1] for codes in code_lists])}
+    cache = annotation_cache.AnnotationCache(cache_path)
+    try:
+        results["cold_cache"] = summarize([timed(blast_script.prot_org_info, codes, None, cache)[1]
+                                           for codes in code_lists])
+        results["warm_cache"] = summarize([timed(blast_script.prot_org_info, codes, None, cache)[1]
+                                           for codes in code_lists])
+    finally:
+        cache.close()
+    return results
+
+
+def reset_database():
+    """Removes all tables from the benchmark database and creates them again with the migrations of schema."""
+    with database.connection() as con:
+        schema.recreate(con)
+
+
+def bench_store(reads):
+    """Stores the reads with their canned BLAST results and annotations in the benchmark database, the first half
+    one read per transaction with insert_read_and_data and the second half with send_to_database and a
+    BulkInserter. Returns the timings of both."""
+    prepared = []
+    for read in reads:
+        blast_data = blast_script.map_qresults(
+            SearchIO.parse(StringIO(blast_xml([read.header])), 'blast-xml'), [read.header])[read.header]
+        annotations = list(zip(*[protein_annotation(code) for code in blast_data[5]])) or [[], [], [], []]
+        prepared.append((read, blast_data, annotations))
+    half = len(prepared) // 2
+
+    per_read = []
+    with database.connection() as con:
+        cursor = con.cursor()
+        for read, blast_data, (names, comments, organisms, lineages) in prepared[:half]:
+            score, query_cover, identity, positives, evalue, codes = blast_data
+            hit_list = [list(hit) for hit in zip(score, query_cover, identity, positives, evalue, organisms, names,
+                                                 comments, codes, lineages)]
+            start = time.perf_counter()
+            insert_script.insert_read_and_data(cursor, [read.header, read.sequence, read.quality_score,
+                                                        read.qualities], hit_list)
+            con.commit()
+            per_read.append(time.perf_counter() - start)
+        cursor.close()
+
+    loader = insert_script.BulkInserter(blast_script.INSERT_BATCH_SIZE)
+    bulk = []
+    for read, blast_data, (names, comments, organisms, lineages) in prepared[half:]:
+        start = time.perf_counter()
+        blast_script.send_to_database(read.header, read.sequence, read.quality_score, *blast_data[:5], organisms,
+                                      names, comments, blast_data[5], loader, read.qualities, lineages)
+        bulk.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    loader.flush()
+    bulk.append(time.perf_counter() - start)
+    return {"insert_read_and_data": summarize(per_read),
+            "send_to_database": summarize(bulk, len(prepared) - half)}
+
+
+def bench_routes(clients, requests):
+    """Requests the home page, the search results and the hit pages with clients concurrent test clients of the
+    web application, requests times per client and page, and returns the timings per page."""
+    # Imported here, so the fastq and BLAST steps can be run without flask and matplotlib
+    import webapp
+    with database.connection() as con:
+        cursor = con.cursor()
+        cursor.execute("SELECT HIT_id FROM HIT")
+        hit_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+    if not hit_ids:
+        raise RuntimeError("The benchmark database doesn't contain any hits")
+    pages = {"/": lambda generator: "/",
+             "/results": lambda generator: "/results?organism={}&read_quality=10000".format(
+                 generator.choice(GENERA)),
+             "/hit/<id>": lambda generator: "/hit/{}".format(generator.choice(hit_ids)),
+             "/api/hit/<id>": lambda generator: "/api/hit/{}".format(generator.choice(hit_ids))}
+
+    def client(page, number):
+        generator = random.Random(number)
+        test_client = webapp.app.test_client()
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = test_client.get(pages[page](generator), follow_redirects=True)
+            response.get_data()
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError("{} returned status {}".format(page, response.status_code))
+        return samples
+
+    results = {}
+    with ThreadPoolExecutor(clients) as executor:
+        for page in pages:
+            start = time.perf_counter()
+            samples = []
+            for client_samples in executor.map(client, [page] * clients, range(clients)):
+                samples.extend(client_samples)
+            summary = summarize(samples)
+            summary["requests_per_second"] = len(samples) / (time.perf_counter() - start)
+            results[page] = summary
+    return results
+
+
+def run(workdir, reads=READS, repeats=REPEATS, annotate_repeats=ANNOTATE_REPEATS, store_reads=STORE_READS,
+        clients=CLIENTS, requests=REQUESTS, section=SECTION, gzipped=False):
+    """Runs all benchmarks in workdir against the benchmark database in the given section of config.ini and returns
+    a dictionary with the settings and the timings."""
+    if section == "database":
+        raise ValueError("The benchmark removes all tables, it can't be run against the real database")
+    database.SECTION = section
+    os.chdir(workdir)
+    extension = ".txt.gz" if gzipped else ".txt"
+    forward_file = os.path.join(workdir, "forward" + extension)
+    reverse_file = os.path.join(workdir, "reverse" + extension)
+
+    report = {"started": datetime.now().isoformat(timespec="seconds"),
+              "settings": {"reads": reads, "repeats": repeats, "annotate_repeats": annotate_repeats,
+                           "store_reads": store_reads, "clients": clients,
+                           "requests": requests, "section": section, "gzip": gzipped,
+                           "batch_size": blast_script.BATCH_SIZE,
+                           "insert_batch_size": blast_script.INSERT_BATCH_SIZE},
+              "results": {}}
+    results = report["results"]
+
+    print("Generating {} read pairs...".format(reads))
+    headers, duration = timed(generate_fastq_pair, forward_file, reverse_file, reads)
+    results["generate_fastq"] = summarize([duration], 2 * reads)
+    print("Timing read_fastq...")
+    results["read_fastq"] = bench_read_fastq(forward_file, reverse_file)
+    print("Timing read_xml...")
+    results.update(bench_read_xml(headers, repeats))
+
+    server = start_stub_server()
+    redirect_entrez(server.entrez_url)
+    try:
+        print("Timing blast_batch...")
+        results["blast_batch"] = bench_blast_batch(headers, server.blast_url)
+        print("Timing prot_org_info...")
+        results["prot_org_info"] = bench_prot_org_info(headers, annotate_repeats,
+                                                       os.path.join(workdir, "annotation_cache.sqlite"))
+    finally:
+        server.shutdown()
+
+    print("Storing {} reads...".format(store_reads))
+    reset_database()
+    pairs = zip(blast_script.read_fastq(forward_file), blast_script.read_fastq(reverse_file))
+    results.update(bench_store(list(itertools.islice(itertools.chain.from_iterable(pairs), store_reads))))
+    print("Timing the web application with {} clients...".format(clients))
+    results["routes"] = bench_routes(clients, requests)
+    report["pool"] = database.pool_stats()
+    report["finished"] = datetime.now().isoformat(timespec="seconds")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the BLAST ingest and the web application offline.")
+    parser.add_argument("--reads", type=int, default=READS, help="number of read pairs to generate")
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help="number of times the BLAST parsing and annotation steps are timed")
+    parser.add_argument("--annotate-repeats", type=int, default=ANNOTATE_REPEATS,
+                        help="number of reads annotated through the stub Entrez server")
+    parser.add_argument("--store-reads", type=int, default=STORE_READS,
+                        help="number of reads stored in the benchmark database")
+    parser.add_argument("--clients", type=int, default=CLIENTS, help="number of concurrent web clients")
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="number of requests per client and page")
+    parser.add_argument("--section", default=SECTION, help="section of config.ini with the benchmark database")
+    parser.add_argument("--gzip", action="store_true", help="generate gzip compressed fastq files")
+    parser.add_argument("--workdir", default=None, help="directory for the generated files, a new temporary "
+                                                        "directory by default")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are written to")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    result = run(os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="blast_benchmark_")), args.reads,
+                 args.repeats, args.annotate_repeats, args.store_reads, args.clients, args.requests, args.section,
+                 args.gzip)
+    with open(output, "w") as out_handle:
+        json.dump(result, out_handle, indent=2)
+    print("Results written to {}".format(output))
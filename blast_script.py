@@ -6,170 +6,739 @@
 #           and passes the results on to the insert_script module for insertion into a mysql
 #           database.
 
+import argparse
+import gzip
+import itertools
+import logging
+import numpy
+import os
+import shutil
+import subprocess
+import tempfile
 import warnings
+import annotation_cache
+import checkpoint
+import database
 import insert_script as insert
-import time
+import metrics
+import pair_merging
+import pipeline
+import result_cache
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from Bio.Blast import NCBIWWW
 from Bio import Entrez, BiopythonExperimentalWarning, SeqIO
+from Bio.SeqIO.QualityIO import FastqGeneralIterator
 with warnings.catch_warnings():
     warnings.simplefilter('ignore', BiopythonExperimentalWarning)
     from Bio import SearchIO
 
+# A single read from a fastq file
+Read = namedtuple("Read", ["header", "sequence", "quality_score", "mean_quality", "qualities"])
 
-def main():
+# Number of reads that are submitted together in a single qblast request
+BATCH_SIZE = 10
+# URL of the qblast endpoint, can be pointed at another server for testing
+BLAST_URL = NCBIWWW.NCBI_BLAST_URL
+# Search backends: the remote NCBI qblast service or a local BLAST+ installation
+BACKENDS = ("remote", "local")
+# Database and settings of the blastx searches, which are the same for qblast and a local BLAST+ installation
+REMOTE_DATABASE = "nr"
+WORD_SIZE = 6
+EXPECT = 0.0001
+MATRIX = "BLOSUM62"
+GAP_OPEN = 11
+GAP_EXTEND = 1
+HITLIST_SIZE = 10
+# Local BLAST+ protein database and the number of blastx processes that run next to each other
+LOCAL_DATABASE = "nr"
+WORKERS = os.cpu_count() or 1
+# Minimum number of reads per blastx process, every process loads the database first, so with only a few reads per
+# process most of the time goes into starting blastx. With the local backend a batch holds this many reads per process.
+LOCAL_CHUNK_SIZE = 50
+# Maximum number of qblast submissions and Entrez requests per second
+BLAST_RATE = 1 / 12.0
+ENTREZ_RATE = 3
+# Local cache with protein info, the maximum number of accession codes in it and the number of codes or
+# taxonomy ids per efetch
+ANNOTATION_CACHE = "annotation_cache.sqlite"
+CACHE_SIZE = 100000
+EFETCH_BATCH_SIZE = 100
+# Local database with the status of every read and the name of this worker in it
+CHECKPOINTS = "checkpoints.sqlite"
+# Number of threads per pipeline stage and the maximum number of items waiting between two stages
+SEARCH_WORKERS = 1
+ANNOTATE_WORKERS = 2
+STORE_WORKERS = 1
+QUEUE_SIZE = 20
+# Number of reads that are inserted into the database in a single transaction
+INSERT_BATCH_SIZE = insert.BATCH_SIZE
+# When reads are linked to their corresponding forward or reverse read: per read, per batch or after the load
+PAIRING_MODES = ("read", "batch", "deferred")
+
+# SQLite file with the BLAST results of every searched sequence and the maximum number of sequences kept in it
+RESULT_CACHE = "result_cache.sqlite"
+RESULT_CACHE_SIZE = 1000000
+# Reads with a lower mean phred quality or fewer bases are left out, 0 keeps all reads
+MIN_QUALITY = 0
+MIN_LENGTH = 0
+
+SEARCH_RESULTS = metrics.Counter("search_results_total", "Number of reads of which the BLAST results were searched "
+                                                         "or reused.", ("source",))
+FILTERED_READS = metrics.Counter("filtered_reads_total", "Number of reads left out because of their quality or "
+                                                         "length.")
+
+
+def main(batch_size=None, blast_url=BLAST_URL, backend="remote", blast_database=LOCAL_DATABASE,
+         workers=WORKERS, search_workers=SEARCH_WORKERS, annotate_workers=ANNOTATE_WORKERS, store_workers=STORE_WORKERS,
+         queue_size=QUEUE_SIZE, cache_path=ANNOTATION_CACHE, cache_size=CACHE_SIZE, checkpoint_path=CHECKPOINTS,
+         worker_id=None, insert_batch_size=INSERT_BATCH_SIZE, pairing="read", profiler=None, all_hsps=False,
+         debug_dir=None, result_cache_path=RESULT_CACHE, result_cache_size=RESULT_CACHE_SIZE, min_quality=MIN_QUALITY,
+         min_length=MIN_LENGTH, merge=False, min_overlap=pair_merging.MIN_OVERLAP,
+         max_mismatch_rate=pair_merging.MAX_MISMATCH_RATE, binned_qualities=False, lease=checkpoint.LEASE,
+         local_chunk_size=LOCAL_CHUNK_SIZE):
     """This function calls the functions to read the files containing the forward and reverse reads in fastq format,
     BLAST the sequences in the files, retrieve the BLAST data and to store it in a mysql database by using the
     insert_script module. If something is wrong with the file names or file contents, an error message is printed and
     the program shuts down.
+
+    The reads are BLASTed in batches of batch_size reads per qblast request, the results are then stored read by read.
+    With the local backend every batch is split over workers blastx processes that search the local BLAST+ database
+    blast_database instead, with at least local_chunk_size reads per process. Without a batch_size, a batch holds
+    BATCH_SIZE reads with the remote backend and local_chunk_size reads for every worker with the local backend.
+    Searching, annotating and storing run at the same time in a pipeline with the given number of threads per stage.
+    The protein info of the hits is kept in an annotation cache at cache_path with at most cache_size accession codes.
+    The status of every read is kept in the checkpoint database at checkpoint_path. Reads that were already stored or
+    that are claimed by another worker are skipped, so the program can be restarted or run by multiple workers at once.
+    Claims expire after lease seconds, but are refreshed by a heartbeat while this run is going on.
+    Every store thread commits the reads to the database in batches of insert_batch_size reads. Depending on the
+    pairing mode, reads are linked to their corresponding read per read, per batch or once after all reads are stored.
+    If a metrics.Profiler is given, the reading of the files and every stage of the pipeline are profiled with it,
+    one call at a time.
+    With all_hsps every HSP of a hit is stored as a hit of its own instead of only the best one. If debug_dir is
+    given, every BLAST response is also written to an xml file with a unique name in that directory.
+    The BLAST results of every sequence are kept in a result cache at result_cache_path with at most
+    result_cache_size sequences, so reads with a sequence that was already searched, or its reverse complement, are
+    stored with the same hits without BLASTing them again. No results are cached if result_cache_path is None.
+    Reads with a mean phred quality below min_quality or with fewer than min_length bases are not BLASTed or stored.
+    With merge, the forward and reverse read of a pair are read together and merged into one query if they overlap
+    by at least min_overlap bases with at most max_mismatch_rate mismatches. The results of a merged pair are stored
+    for both reads. Pairs that don't overlap are BLASTed as separate reads.
+    The per-base qualities of every read are stored compressed, with binned_qualities they are binned first.
     """
 
     forward_file = "txt1.txt"
     reverse_file = "txt2.txt"
     try:
-        headers1, seqs1, ascii_score1 = read_fastq(forward_file)
-        headers2, seqs2, ascii_score2 = read_fastq(reverse_file)
+        if merge:
+            # The reads of a pair have to come along close together to be merged
+            pairs = itertools.zip_longest(read_fastq(forward_file), read_fastq(reverse_file))
+            reads = (read for read in itertools.chain.from_iterable(pairs) if read is not None)
+        else:
+            reads = itertools.chain(read_fastq(forward_file), read_fastq(reverse_file))
     except IOError:
         print("Couldn't find the specified fastq files, shutting down the program.")
-    except ValueError as e:
-        print("Something is wrong with the contents of one of the files, the following error occurred: \n" + e.args[0])
-        print("Please enter correct data files.")
     else:
-        headers = headers1 + headers2
-        seqs = seqs1 + seqs2
-        ascii_score = ascii_score1 + ascii_score2
+        checkpoints = checkpoint.CheckpointStore(checkpoint_path, worker_id, lease)
+        checkpoints.start_heartbeat()
+        reads = filter_reads(checkpoint.claim_reads(reads, checkpoints), min_quality, min_length, checkpoints)
+        if merge:
+            reads = pair_merging.merge_pairs(reads, min_overlap, max_mismatch_rate)
+
+        executor = None
+        if backend == "local":
+            if batch_size is None:
+                batch_size = workers * local_chunk_size
+            executor = ProcessPoolExecutor(max_workers=workers)
+            search = partial(local_blast_batch, blast_database=blast_database, executor=executor, workers=workers,
+                             all_hsps=all_hsps, debug_dir=debug_dir, chunk_size=local_chunk_size)
+        else:
+            if batch_size is None:
+                batch_size = BATCH_SIZE
+            search = rate_limited(partial(blast_batch, url_base=blast_url, all_hsps=all_hsps, debug_dir=debug_dir),
+                                  pipeline.TokenBucket(BLAST_RATE))
+        results = None
+        if result_cache_path is not None:
+            results = result_cache.ResultCache(result_cache_path, result_cache_size)
+            if backend == "local":
+                settings = search_settings("local", blast_database)
+            else:
+                settings = search_settings("remote", REMOTE_DATABASE, blast_url)
+            search = deduplicated(search, results, all_hsps, settings)
+        entrez_limiter = pipeline.TokenBucket(ENTREZ_RATE, ENTREZ_RATE)
+        cache = annotation_cache.AnnotationCache(cache_path, cache_size)
+
+        def search_batch(headers, seqs):
+            results = search(headers, seqs)
+            checkpoints.set_status(headers, checkpoint.SEARCHED)
+            return results
+
+        def annotate(read, blast_data):
+            annotations = prot_org_info(blast_data[5], entrez_limiter, cache)
+            checkpoints.set_status([mate.header for mate in pair_merging.mates(read)], checkpoint.ANNOTATED)
+            return annotations
+
+        # Every store thread collects its own batches of reads
+        loaders = []
+        local = threading.local()
 
+        def store(read, blast_data, annotations):
+            if not hasattr(local, "loader"):
+                local.loader = insert.BulkInserter(insert_batch_size, pairing, binned_qualities)
+                loaders.append(local.loader)
+            for mate in pair_merging.mates(read):
+                store_read(mate, blast_data, annotations, local.loader, checkpoints)
+
+        if profiler is not None:
+            reads = profiler.wrap_iterator(reads)
+            search_batch, annotate, store = [profiler.wrap(function) for function in (search_batch, annotate, store)]
         try:
-            with open("latest_header.txt", "r") as latest_header_file:
-                latest_header = latest_header_file.readline().strip()
-        except IOError:
-            print("No file was found containing the latest header that was blasted. Starting from the beginning.")
+            pipeline.run_pipeline(reads, search_batch, annotate, store, batch_size, search_workers, annotate_workers,
+                                  store_workers, queue_size)
+        except ValueError as e:
+            print("Something went wrong, possibly with the contents of one of the files, the following error "
+                  "occurred: \n" + str(e))
+            print("Please enter correct data files.")
+        finally:
+            try:
+                for loader in loaders:
+                    checkpoints.set_status(loader.flush(), checkpoint.STORED)
+                first_ids = [loader.first_read_id for loader in loaders if loader.first_read_id is not None]
+                if pairing == "deferred" and first_ids:
+                    link_new_pairs(min(first_ids))
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+                cache.close()
+                if results is not None:
+                    results.close()
+                checkpoints.release()
+                checkpoints.close()
+                if checkpoints.skipped:
+                    print("Skipped {} reads that are claimed by another running worker.".format(checkpoints.skipped))
+
+
+def link_new_pairs(first_id):
+    """Accepts the id of the first read that was inserted and links all reads inserted since then to their
+    corresponding forward or reverse read with a single query.
+    """
+    with database.connection() as con:
+        cursor = metrics.TimedCursor(con.cursor(), "ingest")
+        print("Linked {} reads to their corresponding read.".format(insert.link_pairs(cursor, first_id)))
+        con.commit()
+        cursor.close()
+
+
+def search_settings(backend, blast_database, url=None):
+    """Accepts a backend, the name of the BLAST database and optionally the url of the qblast endpoint and returns a
+    description of the searches with the BLAST parameters, which is part of the keys of the result cache."""
+    settings = "{}:{}:word_size={}:expect={}:matrix={}:gapcosts={} {}:hitlist_size={}".format(
+        backend, blast_database, WORD_SIZE, EXPECT, MATRIX, GAP_OPEN, GAP_EXTEND, HITLIST_SIZE)
+    if url is not None:
+        settings += ":" + url
+    return settings
+
+
+def deduplicated(search, cache, all_hsps=False, settings=""):
+    """Accepts a search function that BLASTS lists of headers and sequences, like blast_batch, a ResultCache and the
+    description of the searches made by search_settings and returns a search function that only BLASTS the sequences
+    it doesn't know the results of yet.
+
+    Reads with the same sequence or with each other's reverse complement get the same results. The results of
+    sequences that are in the cache are taken from there and of the other sequences only the first read is BLASTed,
+    after which its results are added to the cache and used for all reads with that sequence. Results of searches
+    with other settings, such as another database, aren't used.
+    """
+    def search_distinct(headers, seqs):
+        keys = [result_cache.sequence_key(seq, all_hsps, settings) for seq in seqs]
+        known = cache.get_many(keys)
+        distinct = {}
+        for header, seq, key in zip(headers, seqs, keys):
+            if key not in known and key not in distinct:
+                distinct[key] = (header, seq)
+        if distinct:
+            found = search([header for header, seq in distinct.values()], [seq for header, seq in distinct.values()])
+            searched = {key: found[header] for key, (header, seq) in distinct.items()}
+            cache.put_many(searched)
+            known.update(searched)
+        SEARCH_RESULTS.inc("blast", amount=len(distinct))
+        SEARCH_RESULTS.inc("reused", amount=len(headers) - len(distinct))
+        return {header: known[key] for header, key in zip(headers, keys)}
+    return search_distinct
+
+
+def filter_reads(reads, min_quality, min_length, checkpoints, chunk_size=100):
+    """Accepts an iterator of reads, the minimum mean phred quality and length of a read and a CheckpointStore and
+    yields the reads that are good enough. The other reads are marked as filtered out in the checkpoint store, in
+    chunks of chunk_size reads. Filtered reads are checked again by later runs, which may use other thresholds.
+    """
+    rejected = []
+    for read in reads:
+        if read.mean_quality >= min_quality and len(read.sequence) >= min_length:
+            yield read
         else:
-            while headers[0] != latest_header:
-                del headers[0]
-                del seqs[0]
-                del ascii_score[0]
-            del headers[0]
-            del seqs[0]
-            del ascii_score[0]
-            print("Continuing with blasting starting from header " + headers[0])
-
-        for (header, sequence, quality) in zip(headers, seqs, ascii_score):
-            blast_query(sequence)
-            score, query_cover, identity, positives, evalue, protein_codes = read_xml()
-            protein_names, protein_comments, organisms = prot_org_info(protein_codes)
-            condata = insert.connect("sql7241825", "sql7.freemysqlhosting.net", "sql7241825", "7cCBxT27sc")
-            send_to_database(header, sequence, quality, score, query_cover, identity, positives, evalue,
-                             organisms, protein_names, protein_comments, protein_codes, condata[1])
-            condata[0].commit()
-            with open("latest_header.txt", "w") as header_save:
-                header_save.write(header)
-            condata[1].close()
-            condata[0].close()
-            time.sleep(12)
+            rejected.append(read.header)
+            if len(rejected) == chunk_size:
+                checkpoints.set_status(rejected, checkpoint.FILTERED)
+                FILTERED_READS.inc(amount=len(rejected))
+                rejected = []
+    if rejected:
+        checkpoints.set_status(rejected, checkpoint.FILTERED)
+        FILTERED_READS.inc(amount=len(rejected))
+
+
+def rate_limited(function, bucket):
+    """Accepts a function and a TokenBucket and returns a function that waits for a token before every call."""
+    def limited(*args, **kwargs):
+        bucket.acquire()
+        return function(*args, **kwargs)
+    return limited
+
+
+def store_read(read, blast_data, annotations, loader, checkpoints):
+    """Accepts a read, its BLAST results, the protein and organism info of the hits, a BulkInserter and a
+    CheckpointStore, passes the read and its hits on to the inserter and marks the reads that were committed as stored.
+
+    The reads of a batch and their hits are committed in a single transaction before the reads are marked, so a crash
+    never leaves a read half stored. A read that was committed but not marked is found in the database on the next run.
+    """
+    header, sequence, quality = read.header, read.sequence, read.quality_score
+    score, query_cover, identity, positives, evalue, protein_codes = blast_data
+    protein_names, protein_comments, organisms, lineages = annotations
+    stored_headers = send_to_database(header, sequence, quality, score, query_cover, identity, positives, evalue,
+                                      organisms, protein_names, protein_comments, protein_codes, loader, read.qualities,
+                                      lineages)
+    checkpoints.set_status(stored_headers, checkpoint.STORED)
 
 
 def send_to_database(header, sequence, quality, score, query_cover, identity, positives, evalue,
-                     organisms, protein_names, protein_comments, protein_codes, cursor):
+                     organisms, protein_names, protein_comments, protein_codes, loader, qualities=None, lineages=None):
     """Accepts a single read header, sequence and quality score along with lists containing BLAST result
-    data corresponding to that read and a cursor object and passes it along to the insert_script module.
+    data corresponding to that read, a BulkInserter and optionally the quality string of the read and the taxonomy
+    lineages of the organisms and passes it along to the insert_script module.
 
     This function accepts the data of a single read and lists containing all BLAST results corresponding to that
-    read. It then restructures these lists to the format accepted by the insert_read_and_data function of the
-    insert_script module, where it is inserted into a mysql database.
+    read. It then restructures these lists to the format accepted by the BulkInserter of the insert_script module,
+    where it is inserted into a mysql database together with the other reads of the batch. Returns the headers of
+    the reads that were committed.
     """
-    read_list = [header, sequence, quality]
+    read_list = [header, sequence, quality, qualities]
     match_list = []
     for i in range(len(score)):
         match_list.append([score[i], query_cover[i], identity[i], positives[i], evalue[i], organisms[i],
-                           protein_names[i], protein_comments[i], protein_codes[i]])
-    insert.insert_read_and_data(cursor, read_list, match_list)
+                           protein_names[i], protein_comments[i], protein_codes[i],
+                           lineages[i] if lineages is not None else None])
+    return loader.add(read_list, match_list)
 
 
 def read_fastq(filename):
-    """Accepts the name of a fastq file, reads it and returns the contents.
+    """Accepts the name of a fastq file, which may be gzip compressed, opens it and returns an iterator of its reads.
 
-    This function accepts the name of a fastq file containing multiple DNA sequences and reads it.
-    For each sequence, the corresponding ascii quality score is calculated. This function returns
-    3 lists containing the headers, sequences and ascii quality scores.
+    This function opens the file straight away, so an IOError is raised if it doesn't exist. The reads are only read
+    from the file when the returned iterator is used, so the whole file is never held in memory.
     """
-    seqs = []
-    headers = []
-    ascii_score = []
-    records = SeqIO.parse(filename, "fastq")
-    for record in records:
-        seqs.append(record.seq)
-        headers.append(record.id)
-        subascii_score = 0
-        for letter in record.letter_annotations["phred_quality"]:
-            subascii_score += int(letter)
-        ascii_score.append(subascii_score)
-    return headers, seqs, ascii_score
-
-
-def blast_query(seq):
-    """Accepts a DNA sequence, BLASTS it and writes the BLAST results to an XML file.
-
-    This function accepts a DNA sequence as input and runs a BLAST against the non redundant protein database using
-    the blastx algorithm. The results of this BLAST search are then written to the 'blast_result' xml file.
-    """
-    print("Running BLAST search...")
-    result_handle = NCBIWWW.qblast("blastx", "nr", seq, word_size=6, expect=0.0001, filter=True, matrix_name='BLOSUM62',
-                                   gapcosts='11 1', hitlist_size=10)
-    with open("blast_result.xml", "w") as out_handle:
-        out_handle.write(result_handle.read())
-    result_handle.close()
+    if filename.endswith(".gz"):
+        handle = gzip.open(filename, "rt")
+    else:
+        handle = open(filename, "r")
+    return iter_fastq(handle)
+
+
+def iter_fastq(handle):
+    """Accepts a handle of a fastq file and yields its reads one by one.
+
+    For each sequence, the total and mean ascii quality score are calculated with numpy. Every read is yielded as a
+    Read tuple containing the header, sequence, total quality score, mean quality score and the quality string.
+    A ValueError is raised if the file isn't in fastq format. The handle is closed when all reads have been read.
+    """
+    with handle:
+        for title, sequence, qualities in FastqGeneralIterator(handle):
+            phred_scores = numpy.frombuffer(qualities.encode("ascii"), dtype=numpy.uint8).astype(numpy.int64) - 33
+            if phred_scores.size:
+                mean_quality = float(phred_scores.mean())
+            else:
+                mean_quality = 0.0
+            yield Read(title.split(None, 1)[0], sequence, int(phred_scores.sum()), mean_quality, qualities)
+
+
+@metrics.timed("blast_batch")
+def blast_batch(headers, seqs, url_base=BLAST_URL, all_hsps=False, debug_dir=None):
+    """Accepts lists of read headers and DNA sequences, BLASTS them in one request and returns the results per header.
+
+    This function combines the reads into a single multi-FASTA query and runs one blastx search against the non
+    redundant protein database, with the settings WORD_SIZE up to HITLIST_SIZE. The results are parsed per query
+    straight from the response and returned in a dictionary with the read header as key and the lists returned by
+    parse_qresult as value. Reads without any hits get empty lists. If debug_dir is given, the response is also
+    written to a new xml file in that directory.
+    """
+    print("Running BLAST search for {} reads...".format(len(headers)))
+    fasta = "".join(">{}\n{}\n".format(header, seq) for header, seq in zip(headers, seqs))
+    result_handle = NCBIWWW.qblast("blastx", REMOTE_DATABASE, fasta, url_base=url_base, word_size=WORD_SIZE,
+                                   expect=EXPECT, filter=True, matrix_name=MATRIX,
+                                   gapcosts="{} {}".format(GAP_OPEN, GAP_EXTEND), hitlist_size=HITLIST_SIZE)
     print("BLAST search finished.")
+    with spool(result_handle, debug_dir) as handle:
+        return map_qresults(SearchIO.parse(handle, 'blast-xml'), headers, all_hsps)
+
+
+@metrics.timed("local_blast_batch")
+def local_blast_batch(headers, seqs, blast_database, executor, workers, all_hsps=False, debug_dir=None,
+                      chunk_size=LOCAL_CHUNK_SIZE):
+    """Accepts lists of read headers and DNA sequences, BLASTS them against a local database and returns the results
+    per header.
+
+    This function splits the reads into at most one chunk per worker, with at least chunk_size reads per chunk
+    unless the whole batch is smaller, and runs local_blast_chunk on every chunk in the process pool executor, so the
+    chunks are searched at the same time. The results of all chunks are combined in a single dictionary with the
+    read header as key, like the one returned by blast_batch.
+    """
+    chunks = max(1, min(workers, len(headers) // chunk_size))
+    chunk_size = -(-len(headers) // chunks)
+    futures = [executor.submit(local_blast_chunk, headers[start:start + chunk_size], seqs[start:start + chunk_size],
+                               blast_database, all_hsps, debug_dir)
+               for start in range(0, len(headers), chunk_size)]
+    results = {}
+    for future in futures:
+        results.update(future.result())
+    return results
 
 
-def read_xml():
-    """Reads the blast_result xml file and returns the contents.
+def local_blast_chunk(headers, seqs, blast_database, all_hsps=False, debug_dir=None):
+    """Accepts lists of read headers and DNA sequences and the name of a local protein database, runs a local blastx
+    search and returns the results per header.
 
-    This function reads the blast_result xml file containing the results of a single BLAST search.
+    This function runs the blastx program of BLAST+ with the same settings as the qblast searches. The reads are
+    passed to blastx in a temporary FASTA file and the xml output is parsed while blastx writes it, so the output is
+    never held in memory as a whole. If blastx can't be run or exits with an error, an OSError or CalledProcessError
+    is raised.
+    """
+    with tempfile.NamedTemporaryFile("w", prefix="blast_query_", suffix=".fasta") as query_file, \
+            tempfile.TemporaryFile("w+") as error_file:
+        query_file.writelines(">{}\n{}\n".format(header, seq) for header, seq in zip(headers, seqs))
+        query_file.flush()
+        command = ["blastx", "-query", query_file.name, "-db", blast_database, "-outfmt", "5",
+                   "-word_size", str(WORD_SIZE), "-evalue", str(EXPECT), "-seg", "yes", "-matrix", MATRIX,
+                   "-gapopen", str(GAP_OPEN), "-gapextend", str(GAP_EXTEND), "-max_target_seqs", str(HITLIST_SIZE),
+                   "-num_threads", "1"]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_file, universal_newlines=True)
+        try:
+            with spool(process.stdout, debug_dir) as handle:
+                results = map_qresults(SearchIO.parse(handle, 'blast-xml'), headers, all_hsps)
+        except Exception:
+            # The output is incomplete if blastx failed, report the error of blastx instead of the parse error
+            if process.wait() == 0:
+                raise
+            results = None
+        if process.wait() != 0:
+            error_file.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, command, stderr=error_file.read())
+    return results
+
+
+@contextmanager
+def spool(handle, debug_dir=None):
+    """Context manager that accepts the handle of a BLAST xml response and returns a handle to parse it from.
+
+    Normally the response handle itself is returned, so the xml is parsed while it is read. If debug_dir is given,
+    the response is first copied to a new file with a unique name in that directory, so responses of searches that
+    run at the same time are kept apart and can be inspected afterwards, and the copy is parsed instead.
+    The response handle is closed afterwards.
+    """
+    try:
+        if debug_dir is None:
+            yield handle
+        else:
+            with tempfile.NamedTemporaryFile("w", dir=debug_dir, prefix="blast_result_", suffix=".xml",
+                                             delete=False) as out_handle:
+                shutil.copyfileobj(handle, out_handle)
+            print("BLAST results written to {}.".format(out_handle.name))
+            with open(out_handle.name) as spooled:
+                yield spooled
+    finally:
+        handle.close()
+
+
+@metrics.timed("map_qresults")
+def map_qresults(blast_qresults, headers, all_hsps=False):
+    """Accepts the query results of a multi-query BLAST search and the headers of the reads in the query and returns
+    the results per header.
+
+    Every query result is parsed with parse_qresult and stored in a dictionary with the read header as key.
+    Reads without any hits get empty lists.
+    """
+    results = {}
+    for position, blast_qresult in enumerate(blast_qresults):
+        # BLAST names the queries after the first word of the FASTA header, fall back on the query order otherwise
+        if blast_qresult.id in headers:
+            header = blast_qresult.id
+        else:
+            header = headers[position]
+        results[header] = parse_qresult(blast_qresult, all_hsps)
+    for header in headers:
+        if header not in results:
+            results[header] = ([], [], [], [], [], [])
+    return results
+
+
+@metrics.timed("read_xml")
+def read_xml(source, all_hsps=False):
+    """Accepts the name or handle of a BLAST xml file and returns the contents.
+
+    This function reads the BLAST xml containing the results of a single BLAST search.
     Of every hit, the score, percentage query coverages, percentage identity, percentage positives, expect value and
     protein accession codes are stored in lists and returned.
     """
+    blast_qresult = SearchIO.read(source, 'blast-xml')
+    return parse_qresult(blast_qresult, all_hsps)
+
+
+def parse_qresult(blast_qresult, all_hsps=False):
+    """Accepts the BLAST results of a single query and returns the contents.
+
+    Of every hit in the query result, the score, percentage query coverages, percentage identity, percentage positives,
+    expect value and protein accession codes are stored in lists and returned. Only the best HSP of every hit is
+    used, unless all_hsps is True, in which case every HSP is returned as a hit of its own.
+    """
     score = []
     query_cover = []
     identity = []
     positives = []
     evalue = []
     protein_codes = []
-    blast_qresult = SearchIO.read('blast_result.xml', 'blast-xml')
-    for i in range(len(blast_qresult)):
-        score.append(blast_qresult[i][0].bitscore)
-        query_cover.append(round((float(blast_qresult[i][0].query_span) / float(blast_qresult[i][0].query_end) *100), 1))
-        identity.append(round((float(blast_qresult[i][0].ident_num) / float(blast_qresult[i][0].hit_span) * 100), 1))
-        positives.append(round((float(blast_qresult[i][0].pos_num) / float(blast_qresult[i][0].hit_span) * 100), 1))
-        evalue.append(blast_qresult[i][0].evalue)
-        protein_codes.append(blast_qresult[i].accession)
+    for hit in iter_hits(blast_qresult, all_hsps):
+        score.append(hit[0])
+        query_cover.append(hit[1])
+        identity.append(hit[2])
+        positives.append(hit[3])
+        evalue.append(hit[4])
+        protein_codes.append(hit[5])
 
     return score, query_cover, identity, positives, evalue, protein_codes
 
 
-def prot_org_info(protein_codes):
+def iter_hits(blast_qresult, all_hsps=False):
+    """Accepts the BLAST results of a single query and yields the score, percentage query coverage, percentage
+    identity, percentage positives, expect value and protein accession code of its hits one by one.
+
+    Only the best HSP of every hit is used, unless all_hsps is True, in which case every HSP is yielded.
+    """
+    for hit in blast_qresult:
+        if all_hsps:
+            hsps = hit.hsps
+        else:
+            hsps = hit.hsps[:1]
+        for hsp in hsps:
+            hit_span = float(hsp.hit_span)
+            yield (hsp.bitscore, round(float(hsp.query_span) / float(hsp.query_end) * 100, 1),
+                   round(float(hsp.ident_num) / hit_span * 100, 1), round(float(hsp.pos_num) / hit_span * 100, 1),
+                   hsp.evalue, hit.accession)
+
+
+@metrics.timed("prot_org_info")
+def prot_org_info(protein_codes, rate_limiter=None, cache=None):
     """Accepts protein codes and returns corresponding names, comments and taxonomy information.
 
     This function accepts a list of protein accession codes and uses these to retrieve records from
-    the NCBI protein database. From these records, the protein names, comments and source organisms are retrieved
-    and returned in lists.
+    the NCBI protein database. From these records, the protein names, comments, source organisms and taxonomy ids
+    are retrieved. The lineages of the taxonomy ids, with the rank of every taxon, are then retrieved from the NCBI
+    taxonomy database. Every lineage is a list of (name, rank) tuples from the root down to the organism itself.
+    The names, comments, organisms and lineages are returned in lists. If an AnnotationCache is given, the info of
+    codes in the cache is taken from there and only the other codes are retrieved, in batches of EFETCH_BATCH_SIZE
+    codes or taxonomy ids per request, after which they are added to the cache. If a rate limiter is given, a token
+    is acquired from it before every request.
     """
+    if cache is not None:
+        annotations = cache.get_many(protein_codes)
+    else:
+        annotations = {}
+    missing = []
+    for code in protein_codes:
+        if code not in annotations and code not in missing:
+            missing.append(code)
+
+    records = {}
+    for start in range(0, len(missing), EFETCH_BATCH_SIZE):
+        records.update(fetch_annotations(missing[start:start + EFETCH_BATCH_SIZE], rate_limiter))
+    taxids = list(set(taxid for name, comment, organism, taxid in records.values() if taxid is not None))
+    taxid_lineages = {}
+    for start in range(0, len(taxids), EFETCH_BATCH_SIZE):
+        taxid_lineages.update(fetch_lineages(taxids[start:start + EFETCH_BATCH_SIZE], rate_limiter))
+    fetched = {}
+    for code, (name, comment, organism, taxid) in records.items():
+        fetched[code] = (name, comment, organism, taxid_lineages.get(taxid, []))
+    if cache is not None and fetched:
+        cache.put_many(fetched)
+    annotations.update(fetched)
+
     protein_names = []
     protein_comments = []
     organisms = []
+    lineages = []
+    for code in protein_codes:
+        protein_names.append(annotations[code][0])
+        protein_comments.append(annotations[code][1])
+        organisms.append(annotations[code][2])
+        lineages.append(annotations[code][3])
+    return protein_names, protein_comments, organisms, lineages
+
+
+@metrics.timed("fetch_annotations")
+def fetch_annotations(protein_codes, rate_limiter=None):
+    """Accepts a list of protein codes, retrieves their records from the NCBI protein database in a single request
+    and returns a dictionary with a tuple of protein name, protein comment, organism and taxonomy id for every code.
+
+    The records in the response are matched to the codes on their accession, with or without version number.
+    Codes for which no record was returned are retrieved one by one afterwards. The taxonomy id is taken from the
+    source feature of the record and is None if the record doesn't have one.
+    """
     Entrez.email = "A.N.Other@example.com"  # Always tell NCBI who you are
-    for i in range(len(protein_codes)):
-        handle = Entrez.efetch(db="protein", id=protein_codes[i], rettype="gb", retmode="text")
-        record = SeqIO.read(handle, "genbank")
-        handle.close()
-        protein_names.append(record.description.split('[')[0])
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    handle = Entrez.efetch(db="protein", id=",".join(protein_codes), rettype="gb", retmode="text")
+    records = {}
+    for record in SeqIO.parse(handle, "genbank"):
+        for key in (record.id, record.id.split('.')[0], record.name):
+            records[key] = record
+    handle.close()
+
+    annotations = {}
+    for code in protein_codes:
+        record = records.get(code, records.get(code.split('.')[0]))
+        if record is None:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            handle = Entrez.efetch(db="protein", id=code, rettype="gb", retmode="text")
+            record = SeqIO.read(handle, "genbank")
+            handle.close()
+        annotations[code] = (record.description.split('[')[0], record.annotations.get("comment", ""),
+                             record.annotations["organism"], record_taxid(record))
+    return annotations
 
-        try:
-            protein_comments.append(record.annotations["comment"])
-        except KeyError:
-            protein_comments.append("")
 
-        organisms.append(record.annotations["organism"])
-    return protein_names, protein_comments, organisms
+def record_taxid(record):
+    """Accepts a GenBank record and returns the taxonomy id in the db_xref of its source feature, or None."""
+    for feature in record.features:
+        if feature.type == "source":
+            for xref in feature.qualifiers.get("db_xref", []):
+                if xref.startswith("taxon:"):
+                    return xref[len("taxon:"):]
+    return None
 
 
-main()
+@metrics.timed("fetch_lineages")
+def fetch_lineages(taxids, rate_limiter=None):
+    """Accepts a list of taxonomy ids, retrieves their records from the NCBI taxonomy database in a single request
+    and returns a dictionary with the lineage of every taxonomy id, as a list of (name, rank) tuples from the root
+    down to the taxon itself. Taxa without a rank, such as "cellular organisms", have the rank "no rank".
+
+    Ids that were merged into another taxon are returned by NCBI under the new id, they are found through the old
+    ids of the record. Ids for which no record was returned are left out.
+    """
+    Entrez.email = "A.N.Other@example.com"  # Always tell NCBI who you are
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    handle = Entrez.efetch(db="taxonomy", id=",".join(taxids), retmode="xml")
+    records = Entrez.read(handle)
+    handle.close()
+
+    lineages = {}
+    for record in records:
+        lineage = [(str(taxon["ScientificName"]), str(taxon["Rank"])) for taxon in record.get("LineageEx", [])]
+        lineage.append((str(record["ScientificName"]), str(record["Rank"])))
+        for taxid in [record["TaxId"]] + list(record.get("AkaTaxIds", [])):
+            lineages[str(taxid)] = lineage
+    return lineages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="BLAST the reads in txt1.txt and txt2.txt and store the results.")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="number of reads searched together, {} per qblast request by default and "
+                             "--local-chunk-size per blastx process with --backend local".format(BATCH_SIZE))
+    parser.add_argument("--blast-url", default=BLAST_URL,
+                        help="qblast endpoint, for example a local stub server")
+    parser.add_argument("--backend", choices=BACKENDS, default="remote",
+                        help="search with NCBI qblast or with a local BLAST+ installation")
+    parser.add_argument("--blast-database", "--database", default=LOCAL_DATABASE,
+                        help="local BLAST+ protein database, used with --backend local")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="number of blastx processes, used with --backend local")
+    parser.add_argument("--local-chunk-size", type=int, default=LOCAL_CHUNK_SIZE,
+                        help="minimum number of reads per blastx process, used with --backend local")
+    parser.add_argument("--search-workers", type=int, default=SEARCH_WORKERS,
+                        help="number of threads that submit BLAST searches")
+    parser.add_argument("--annotate-workers", type=int, default=ANNOTATE_WORKERS,
+                        help="number of threads that retrieve protein info from Entrez")
+    parser.add_argument("--store-workers", type=int, default=STORE_WORKERS,
+                        help="number of threads that store the results in the database")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="maximum number of items waiting between two pipeline stages")
+    parser.add_argument("--annotation-cache", default=ANNOTATION_CACHE,
+                        help="SQLite file in which the protein info of accession codes is cached")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help="maximum number of accession codes kept in the annotation cache")
+    parser.add_argument("--checkpoints", default=CHECKPOINTS,
+                        help="SQLite file in which the status of every read is kept")
+    parser.add_argument("--lease", type=float, default=checkpoint.LEASE,
+                        help="seconds after which the claims of a worker that stopped are taken over")
+    parser.add_argument("--worker-id", default=None,
+                        help="name of this worker in the checkpoint database, defaults to hostname and process id")
+    parser.add_argument("--insert-batch-size", type=int, default=INSERT_BATCH_SIZE,
+                        help="number of reads committed to the database per transaction")
+    parser.add_argument("--pairing", choices=PAIRING_MODES, default="read",
+                        help="link forward and reverse reads per read, per insert batch or once after the load")
+    parser.add_argument("--all-hsps", action="store_true",
+                        help="store every HSP of a hit instead of only the best one")
+    parser.add_argument("--debug-xml", default=None,
+                        help="also write every BLAST response to a uniquely named xml file in this directory")
+    parser.add_argument("--result-cache", default=RESULT_CACHE,
+                        help="SQLite file in which the BLAST results of every searched sequence are cached")
+    parser.add_argument("--result-cache-size", type=int, default=RESULT_CACHE_SIZE,
+                        help="maximum number of sequences kept in the result cache")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="BLAST every read, also when its sequence was already searched")
+    parser.add_argument("--min-quality", type=float, default=MIN_QUALITY,
+                        help="leave out reads with a lower mean phred quality")
+    parser.add_argument("--min-length", type=int, default=MIN_LENGTH,
+                        help="leave out reads with fewer bases")
+    parser.add_argument("--merge-pairs", action="store_true",
+                        help="merge overlapping forward and reverse reads into one query per pair")
+    parser.add_argument("--min-overlap", type=int, default=pair_merging.MIN_OVERLAP,
+                        help="minimum number of overlapping bases of a merged pair")
+    parser.add_argument("--max-mismatch-rate", type=float, default=pair_merging.MAX_MISMATCH_RATE,
+                        help="maximum fraction of mismatching bases in the overlap of a merged pair")
+    parser.add_argument("--bin-qualities", action="store_true",
+                        help="store the per-base qualities in 8 Illumina bins, smaller but not exact")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve the metrics in the Prometheus format on this port at /metrics during the run")
+    parser.add_argument("--slow-query-seconds", type=float, default=metrics.SLOW_QUERY_SECONDS,
+                        help="log the database queries that take longer than this number of seconds")
+    parser.add_argument("--profile", default=None,
+                        help="profile the run with cProfile and write the profile to this file, to be read with pstats")
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    metrics.SLOW_QUERY_SECONDS = args.slow_query_seconds
+    if args.metrics_port is not None:
+        metrics.start_http_server(args.metrics_port)
+    profiler = None
+    if args.profile is not None:
+        profiler = metrics.Profiler()
+    try:
+        main(batch_size=args.batch_size, blast_url=args.blast_url, backend=args.backend,
+             blast_database=args.blast_database, workers=args.workers, search_workers=args.search_workers,
+             annotate_workers=args.annotate_workers, store_workers=args.store_workers, queue_size=args.queue_size,
+             cache_path=args.annotation_cache, cache_size=args.cache_size, checkpoint_path=args.checkpoints,
+             worker_id=args.worker_id, insert_batch_size=args.insert_batch_size, pairing=args.pairing,
+             profiler=profiler, all_hsps=args.all_hsps, debug_dir=args.debug_xml,
+             result_cache_path=None if args.no_dedup else args.result_cache,
+             result_cache_size=args.result_cache_size, min_quality=args.min_quality, min_length=args.min_length,
+             merge=args.merge_pairs, min_overlap=args.min_overlap, max_mismatch_rate=args.max_mismatch_rate,
+             binned_qualities=args.bin_qualities, lease=args.lease, local_chunk_size=args.local_chunk_size)
+    finally:
+        if profiler is not None:
+            profiler.dump(args.profile)
+            print("Profile written to {}, {} calls ran while another thread was being profiled.".format(
+                args.profile, profiler.unprofiled))
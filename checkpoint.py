@@ -0,0 +1,190 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module keeps track of the progress of the BLAST ingest in a local SQLite database. For every read
+#           header it stores how far the read got (pending, searched, annotated, stored or filtered out) and which
+#           worker is processing it, so an interrupted run can be resumed and multiple workers can process the same
+#           fastq files without doing the same reads.
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+SEARCHED = "searched"
+ANNOTATED = "annotated"
+STORED = "stored"
+# Reads that were left out because of their quality or length. They are released like stored reads, but they aren't
+# done, later runs claim them again because they may use a lower minimum quality or length
+FILTERED = "filtered"
+DONE = (STORED,)
+RELEASED = (STORED, FILTERED)
+
+# Number of seconds after which the claim of a worker that stopped refreshing its claims expires
+LEASE = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def worker_alive(worker):
+    """Accepts a worker id and returns False if the worker is a process on this host that no longer exists.
+    Returns True for workers on other hosts and for worker ids that aren't in the hostname-pid format, because it
+    can't be checked whether those are still running."""
+    host, _, pid = worker.rpartition("-")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to another user
+        return True
+    return True
+
+
+class CheckpointStore:
+    """Per read checkpoint store in the SQLite database file at path.
+
+    A worker has to claim reads before processing them. A claim expires after lease seconds without a status update
+    or heartbeat, after which another worker can claim the read, so the reads of a worker that crashed aren't lost.
+    Claims of a worker process on the same host that no longer exists expire straight away, so a crashed run can be
+    resumed immediately. The number of reads that were skipped because another worker holds them is kept in skipped.
+    The store can be shared by the threads of a worker and by multiple worker processes.
+    """
+
+    def __init__(self, path, worker=None, lease=LEASE):
+        if worker is None:
+            worker = "{}-{}".format(socket.gethostname(), os.getpid())
+        self.worker = worker
+        self.lease = lease
+        self.skipped = 0
+        self.heartbeat = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("""
+          CREATE TABLE IF NOT EXISTS read_status (
+            header TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            worker TEXT,
+            updated REAL NOT NULL)""")
+
+    def claim(self, headers):
+        """Accepts a list of read headers and claims the ones that haven't been stored yet and aren't being processed
+        by another worker. Returns the set of claimed headers.
+
+        The claim is made in a single write transaction, so two workers can never claim the same read.
+        """
+        now = time.time()
+        claimed = set()
+        skipped = 0
+        alive = {}
+        with self.lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                self.con.executemany("""
+                  INSERT OR IGNORE INTO read_status (header, status, worker, updated)
+                  VALUES (?, ?, NULL, ?)""", [(header, PENDING, now) for header in headers])
+                for header in headers:
+                    row = self.con.execute("SELECT status, worker, updated FROM read_status WHERE header = ?",
+                                           (header,)).fetchone()
+                    status, worker, updated = row
+                    if status in DONE:
+                        continue
+                    if worker is None or worker == self.worker or updated < now - self.lease:
+                        claimed.add(header)
+                        continue
+                    if worker not in alive:
+                        alive[worker] = worker_alive(worker)
+                    if alive[worker]:
+                        skipped += 1
+                    else:
+                        claimed.add(header)
+                self.con.executemany("UPDATE read_status SET worker = ?, updated = ? WHERE header = ?",
+                                     [(self.worker, now, header) for header in claimed])
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+            self.con.execute("COMMIT")
+            self.skipped += skipped
+        if skipped:
+            logger.warning("Skipped %d reads that are claimed by another running worker", skipped)
+        return claimed
+
+    def start_heartbeat(self, interval=None):
+        """Starts a background thread that refreshes the claims of this worker every interval seconds, a third of the
+        lease by default, so the claims of a long run don't expire while the worker is still processing them."""
+        if interval is None:
+            interval = self.lease / 3.0
+        self.stopped.clear()
+        self.heartbeat = threading.Thread(target=self._beat, args=(interval,), daemon=True)
+        self.heartbeat.start()
+
+    def _beat(self, interval):
+        while not self.stopped.wait(interval):
+            with self.lock:
+                self.con.execute("UPDATE read_status SET updated = ? WHERE worker = ?", (time.time(), self.worker))
+
+    def stop_heartbeat(self):
+        """Stops the heartbeat thread, if it was started."""
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+            self.heartbeat = None
+
+    def set_status(self, headers, status):
+        """Accepts a list of read headers claimed by this worker and a status and stores the new status.
+        Stored and filtered reads are released. Stored reads are never claimed again, filtered reads are claimed again
+        by later runs.
+        """
+        now = time.time()
+        if status in RELEASED:
+            worker = None
+        else:
+            worker = self.worker
+        with self.lock:
+            self.con.executemany("""
+              UPDATE read_status SET status = ?, worker = ?, updated = ?
+              WHERE header = ?""", [(status, worker, now, header) for header in headers])
+
+    def release(self):
+        """Releases all reads claimed by this worker that aren't done, so other workers can claim them."""
+        with self.lock:
+            self.con.execute("""
+              UPDATE read_status SET status = ?, worker = NULL
+              WHERE worker = ? AND status NOT IN (?, ?)""", (PENDING, self.worker) + RELEASED)
+
+    def close(self):
+        """Stops the heartbeat and closes the connection with the checkpoint database."""
+        self.stop_heartbeat()
+        with self.lock:
+            self.con.close()
+
+
+def claim_reads(reads, store, chunk_size=100):
+    """Accepts an iterator of reads and a CheckpointStore and yields the reads that this worker could claim.
+
+    The reads are claimed in chunks of chunk_size reads, so the checkpoint database isn't queried for every read.
+    """
+    chunk = []
+    for read in reads:
+        chunk.append(read)
+        if len(chunk) == chunk_size:
+            for claimed_read in _claim_chunk(chunk, store):
+                yield claimed_read
+            chunk = []
+    for claimed_read in _claim_chunk(chunk, store):
+        yield claimed_read
+
+
+def _claim_chunk(chunk, store):
+    """Claims the reads in the chunk and returns the reads that were claimed."""
+    if not chunk:
+        return []
+    claimed = store.claim([read[0] for read in chunk])
+    return [read for read in chunk if read[0] in claimed]
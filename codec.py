@@ -0,0 +1,112 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module packs the sequences and per-base qualities of the reads into compact byte strings for the
+#           BLOB columns of the DNA_READ table and unpacks them again. Sequences of only A, C, G and T are packed with
+#           2 bits per base, other sequences with 4 bits per base using the IUPAC codes. Qualities are compressed
+#           with zlib, optionally after binning them into the 8 quality levels used by Illumina, which compresses
+#           much better but doesn't keep the exact qualities. The reverse complement of a sequence is made here as
+#           well, for the modules that compare reads with their corresponding read.
+
+import struct
+import zlib
+import numpy
+
+# First byte of a packed sequence, the number of bits per base
+SEQUENCE_2BIT = 2
+SEQUENCE_4BIT = 4
+# First byte of compressed qualities
+QUALITIES_ZLIB = 0
+QUALITIES_BINNED = 1
+
+# The encoding byte and the number of bases that come before the packed bases of a sequence
+SEQUENCE_HEADER = struct.Struct(">BI")
+
+# Bases in the order of their 2 bit and 4 bit codes, the 4 bit codes are the same as in the BAM format
+TWO_BIT_ALPHABET = numpy.frombuffer(b"ACGT", dtype=numpy.uint8)
+FOUR_BIT_ALPHABET = numpy.frombuffer(b"=ACMGRSVTWYHKDBN", dtype=numpy.uint8)
+
+# Code of every ascii character, 255 for characters without a 2 bit code and N for characters without a 4 bit code
+TWO_BIT_CODES = numpy.full(256, 255, dtype=numpy.uint8)
+TWO_BIT_CODES[TWO_BIT_ALPHABET] = numpy.arange(len(TWO_BIT_ALPHABET))
+FOUR_BIT_CODES = numpy.full(256, 15, dtype=numpy.uint8)
+FOUR_BIT_CODES[FOUR_BIT_ALPHABET] = numpy.arange(len(FOUR_BIT_ALPHABET))
+
+# Phred score of every bin, the Illumina bins are 2-9, 10-19, 20-24, 25-29, 30-34, 35-39 and 40 or higher
+QUALITY_BINS = numpy.zeros(94, dtype=numpy.uint8)
+for low, high, value in [(0, 2, 2), (2, 10, 6), (10, 20, 15), (20, 25, 22), (25, 30, 27), (30, 35, 33),
+                         (35, 40, 37), (40, 94, 40)]:
+    QUALITY_BINS[low:high] = value
+
+# Turns a DNA sequence into its complement, the reverse of the complement is the reverse complement
+COMPLEMENT = str.maketrans("ACGTN", "TGCAN")
+
+
+def reverse_complement(sequence):
+    """Accepts an upper case DNA sequence and returns its reverse complement. Characters other than A, C, G, T and N
+    are kept as they are."""
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def encode_sequence(sequence):
+    """Accepts a DNA sequence and returns it packed into bytes.
+
+    The sequence is packed with 2 bits per base if it only contains A, C, G and T and with 4 bits per base
+    otherwise, with N for every character that isn't an IUPAC code. Lower case bases are stored as upper case.
+    The packed bytes start with the number of bits per base and the length of the sequence.
+    """
+    bases = numpy.frombuffer(sequence.upper().encode("ascii"), dtype=numpy.uint8)
+    codes = TWO_BIT_CODES[bases]
+    bits = SEQUENCE_2BIT
+    if (codes == 255).any():
+        codes = FOUR_BIT_CODES[bases]
+        bits = SEQUENCE_4BIT
+    per_byte = 8 // bits
+    padded = numpy.zeros(-(-len(codes) // per_byte) * per_byte, dtype=numpy.uint8)
+    padded[:len(codes)] = codes
+    shifts = numpy.arange(per_byte - 1, -1, -1, dtype=numpy.uint8) * bits
+    packed = numpy.bitwise_or.reduce(padded.reshape(-1, per_byte) << shifts, axis=1).astype(numpy.uint8)
+    return SEQUENCE_HEADER.pack(bits, len(codes)) + packed.tobytes()
+
+
+def decode_sequence(data):
+    """Accepts a sequence packed by encode_sequence and returns the sequence as a string."""
+    bits, length = SEQUENCE_HEADER.unpack_from(data)
+    if bits == SEQUENCE_2BIT:
+        alphabet = TWO_BIT_ALPHABET
+    elif bits == SEQUENCE_4BIT:
+        alphabet = FOUR_BIT_ALPHABET
+    else:
+        raise ValueError("Unknown sequence encoding {}".format(bits))
+    per_byte = 8 // bits
+    packed = numpy.frombuffer(bytes(data), dtype=numpy.uint8, offset=SEQUENCE_HEADER.size)
+    shifts = numpy.arange(per_byte - 1, -1, -1, dtype=numpy.uint8) * bits
+    codes = (packed[:, None] >> shifts) & ((1 << bits) - 1)
+    return alphabet[codes.ravel()[:length]].tobytes().decode("ascii")
+
+
+def encode_qualities(qualities, binned=False):
+    """Accepts the quality string of a read in the fastq format and returns the phred scores compressed with zlib.
+
+    With binned, the phred scores are first replaced by the score of their Illumina bin. The exact scores are then
+    lost, but the compressed qualities are a lot smaller.
+    """
+    phred_scores = numpy.frombuffer(qualities.encode("ascii"), dtype=numpy.uint8) - 33
+    encoding = QUALITIES_ZLIB
+    if binned:
+        phred_scores = QUALITY_BINS[phred_scores]
+        encoding = QUALITIES_BINNED
+    return bytes((encoding,)) + zlib.compress(phred_scores.tobytes())
+
+
+def decode_phred_scores(data):
+    """Accepts qualities compressed by encode_qualities and returns a numpy array with the phred score of every
+    base."""
+    if data[0] not in (QUALITIES_ZLIB, QUALITIES_BINNED):
+        raise ValueError("Unknown quality encoding {}".format(data[0]))
+    return numpy.frombuffer(zlib.decompress(bytes(data[1:])), dtype=numpy.uint8)
+
+
+def decode_qualities(data):
+    """Accepts qualities compressed by encode_qualities and returns the quality string in the fastq format."""
+    return (decode_phred_scores(data) + 33).astype(numpy.uint8).tobytes().decode("ascii")
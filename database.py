@@ -0,0 +1,125 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module owns the pool of connections to the mysql database. The settings of the database and the pool
+#           are read from config.ini, which is made from config.example.ini. Both the ingest scripts and the web
+#           application borrow their connections from the pool, which checks that a connection still works before
+#           handing it out and keeps statistics about its use.
+
+import configparser
+import os
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import pooling
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+# Section of the config file with the settings of the database, the benchmark uses its own database
+SECTION = "database"
+
+_pool = None
+_slots = None
+_timeout = None
+_lock = threading.Lock()
+_stats = {"borrowed": 0, "in_use": 0, "timeouts": 0, "reconnects": 0, "wait_seconds": 0.0}
+
+
+def read_config(path=CONFIG_FILE, section="database"):
+    """Reads a section of the config file and returns it as a dictionary. The config file isn't part of the
+    repository, an IOError that says how to make it is raised if it doesn't exist."""
+    if not os.path.exists(path):
+        raise IOError("The config file {} doesn't exist, copy {} to it and fill in the settings of the database".format(
+            path, os.path.join(os.path.dirname(path), "config.example.ini")))
+    parser = configparser.ConfigParser()
+    if not parser.read(path):
+        raise IOError("Couldn't read the config file " + path)
+    if not parser.has_section(section):
+        raise KeyError("The config file {} has no [{}] section, see config.example.ini".format(path, section))
+    return dict(parser[section])
+
+
+def get_pool():
+    """Returns the connection pool, creates it the first time this function is called."""
+    global _pool, _slots, _timeout
+    with _lock:
+        if _pool is None:
+            config = read_config(CONFIG_FILE, SECTION)
+            pool_size = int(config.pop("pool_size", 5))
+            _timeout = float(config.pop("pool_timeout", 30))
+            _pool = pooling.MySQLConnectionPool(pool_name="blast_pool", pool_size=pool_size,
+                                                pool_reset_session=True, **config)
+            _slots = threading.BoundedSemaphore(pool_size)
+    return _pool
+
+
+def borrow():
+    """Borrows a connection from the pool and returns it.
+
+    If all connections are in use, this function waits until one is returned. If that takes longer than the
+    pool_timeout in the config file, a RuntimeError is raised. A connection that was lost is reconnected before it
+    is returned. Every borrowed connection has to be given back with give_back.
+    """
+    pool = get_pool()
+    start = time.time()
+    if not _slots.acquire(timeout=_timeout):
+        with _lock:
+            _stats["timeouts"] += 1
+        raise RuntimeError("No database connection became available within {} seconds".format(_timeout))
+    try:
+        con = pool.get_connection()
+        if not con.is_connected():
+            con.reconnect(attempts=3, delay=1)
+            with _lock:
+                _stats["reconnects"] += 1
+    except Exception:
+        _slots.release()
+        raise
+    with _lock:
+        _stats["borrowed"] += 1
+        _stats["in_use"] += 1
+        _stats["wait_seconds"] += time.time() - start
+    return con
+
+
+def give_back(con):
+    """Gives a borrowed connection back to the pool. Uncommitted changes are rolled back."""
+    try:
+        con.close()
+    finally:
+        _slots.release()
+        with _lock:
+            _stats["in_use"] -= 1
+
+
+@contextmanager
+def connection():
+    """Context manager that borrows a connection from the pool and gives it back afterwards."""
+    con = borrow()
+    try:
+        yield con
+    finally:
+        give_back(con)
+
+
+def open_connection():
+    """Opens a connection of its own to the database, outside the pool, and returns it.
+
+    This is meant for long reads, such as exports, that would otherwise keep a connection of the pool busy for
+    minutes. The connection has to be closed by the caller.
+    """
+    config = read_config(CONFIG_FILE, SECTION)
+    config.pop("pool_size", None)
+    config.pop("pool_timeout", None)
+    return mysql.connector.connect(**config)
+
+
+def pool_stats():
+    """Returns a dictionary with the size of the pool and the number of borrowed connections, connections in use,
+    timeouts and reconnects and the total time spent waiting for a connection.
+    """
+    pool = get_pool()
+    with _lock:
+        stats = dict(_stats)
+    stats["pool_size"] = pool.pool_size
+    return stats
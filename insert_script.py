@@ -4,9 +4,58 @@
 # Function: This module sets up a connection to the mysql database with the connect function.
 #           Furthermore, it accepts BLAST results in the form of read and hit data in the insert_read_and_data function,
 #           which is then passed along to the insert_read and insert_hits functions respectively to insert these
-#           results into the database.
+#           results into the database with parameterized queries. The BulkInserter class inserts the same data in
+#           batches, for loading many reads at once. The sequences and per-base qualities of the reads are packed by
+#           the codec module before they are stored. The lineages of the organisms are stored in the taxonomy tables
+#           and the number of hits per taxon is kept up to date. The duration of every query is recorded by the
+#           metrics module.
 
 import mysql.connector as mscon
+import codec
+import database
+import metrics
+from collections import Counter
+
+# Default number of reads the BulkInserter inserts in a single transaction
+BATCH_SIZE = 50
+
+# Queries used by the BulkInserter and link_pairs, the IN lists are filled in with one %s per value
+READ_LOOKUP_QUERY = "SELECT Header FROM DNA_READ WHERE Header IN ({})"
+ORGANISM_LOOKUP_QUERY = "SELECT ORGANISME_id, Organisme_naam FROM ORGANISME WHERE Organisme_naam IN ({})"
+PROTEIN_LOOKUP_QUERY = "SELECT EIWIT_id, Accessiecode FROM EIWIT WHERE Accessiecode IN ({})"
+# Looks up the id of a read by its header, used for corresponding reads and by insert_read for the read itself
+MATE_QUERY = "SELECT DNA_READ_id FROM DNA_READ WHERE Header = %s"
+# Inserts a hit, used by the BulkInserter and insert_hits
+HIT_INSERT_QUERY = """
+  INSERT INTO HIT (DNA_READ_id, ORGANISME_id, EIWIT_id, Score, Query_cover, Identity, Positives, E_value)
+  VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+# Links the reads with an id of at least %s to their corresponding read, which is found on its header
+LINK_NEW_READS_QUERY = """
+  UPDATE DNA_READ r
+  JOIN DNA_READ m
+    ON m.Header = CONCAT(LEFT(r.Header, CHAR_LENGTH(r.Header) - 1), IF(RIGHT(r.Header, 1) = '1', '2', '1'))
+  SET r.For_rev_id = m.DNA_READ_id
+  WHERE r.DNA_READ_id >= %s
+  AND r.For_rev_id IS NULL
+  AND RIGHT(r.Header, 1) IN ('1', '2')"""
+# Links the older reads to their corresponding read among the reads with an id of at least %s
+LINK_OLD_MATES_QUERY = """
+  UPDATE DNA_READ m
+  JOIN DNA_READ r
+    ON r.Header = CONCAT(LEFT(m.Header, CHAR_LENGTH(m.Header) - 1), IF(RIGHT(m.Header, 1) = '1', '2', '1'))
+  SET r.For_rev_id = m.DNA_READ_id
+  WHERE m.DNA_READ_id >= %s
+  AND r.For_rev_id IS NULL
+  AND RIGHT(m.Header, 1) IN ('1', '2')"""
+# Adds a number of new hits of an organism to its taxon and all ancestors of its taxon
+TAXON_COUNT_QUERY = """
+  INSERT INTO TAXON_TELLING (TAXON_id, Aantal)
+  SELECT p.Voorouder_id, %s FROM ORGANISME o
+  JOIN TAXON_PAD p ON p.Afstammeling_id = o.TAXON_id
+  WHERE o.ORGANISME_id = %s
+  ON DUPLICATE KEY UPDATE TAXON_TELLING.Aantal = TAXON_TELLING.Aantal + VALUES(Aantal)"""
+# Rank of the taxa that NCBI doesn't give a rank and of organisms that aren't in their own lineage
+NO_RANK = "no rank"
 
 
 def connect(username, hostname, databasename, password):
@@ -22,14 +71,15 @@ def connect(username, hostname, databasename, password):
         print("Could not connect to the database, the following error occurred:\n{}".format(e))
         return False
     else:
-        cursor = con.cursor()
+        cursor = metrics.TimedCursor(con.cursor(), "ingest")
     return con, cursor
 
 
 def insert_read_and_data(cursor, read_list, hit_list):
     """Accepts a cursor, read data and hit data and passes it to insert_read and insert_hits.
 
-    This function accepts a cursor, a read list with header, sequence and quality score and a 2d list with
+    This function accepts a cursor, a read list with header, sequence, quality score and optionally the quality
+    string of the fastq file and a 2d list with
     data about the hits. It checks if the read is already in the database with the insert_read function, which inserts
     it if it isn't, and then inserts the corresponding hits with the insert_hits function if the read wasn't already
     in the database.
@@ -45,102 +95,341 @@ def insert_read(cursor, read_list):
     """Accepts a cursor and list with read info, inserts the read into the database if it doesnt exist and returns its
     DNA_READ_id. If it already existed, returns False
 
-    This function accepts a cursor and a read list with header, sequence and quality score. If the header is already in
-    the database, it returns false. If not, it inserts the read into the database. It then checks if there is a
-    corresponding forward or reverse read already in the database. If there is, it updates the For_rev_ids of both reads
-    so they reference each other.
+    This function accepts a cursor and a read list with header, sequence, quality score and optionally the quality
+    string of the fastq file. If the header is already in the database, it returns false. If not, it inserts the read
+    into the database with the sequence and qualities packed by read_row. It then links the read to its corresponding
+    forward or reverse read with link_reverse_read, if that read is already in the database.
     """
     new_header = read_list[0]
-    id_query = """
-      SELECT DNA_READ_id FROM DNA_READ
-      WHERE Header = '{}'
-    """
-    cursor.execute(id_query.format(new_header))
+    cursor.execute(MATE_QUERY, (new_header,))
     if not cursor.fetchall():
-        read_query = """
-          Insert INTO DNA_READ (Header, Sequentie, Quality_score)
-          Values('{}',
-                 '{}',
-                 {}
-        );
-        """.format(new_header, read_list[1], read_list[2])
-
-        cursor.execute(read_query)
-        cursor.execute(id_query.format(new_header))
-        new_entry_id = cursor.fetchall()[0][0]
-
-        if new_header[-1] == "1":
-            inverse_header = new_header[0:-1]+"2"
-        elif new_header[-1] == "2":
-            inverse_header = new_header[0:-1] + "1"
-        else:
-            inverse_header = False
-
-        if inverse_header:
-            cursor.execute(id_query.format(inverse_header))
-            result_list = cursor.fetchall()
-            if result_list:
-                old_entry_id = result_list[0][0]
-                read_update_query = """
-                  UPDATE DNA_READ
-                  SET For_rev_id = {}
-                  WHERE Header = '{}'"""
-                cursor.execute(read_update_query.format(old_entry_id, new_header))
-                cursor.execute(read_update_query.format(new_entry_id, inverse_header))
+        cursor.execute("""
+          INSERT INTO DNA_READ (Header, Sequentie, Quality_score, Kwaliteiten)
+          VALUES (%s, %s, %s, %s)""", read_row(read_list))
+        new_entry_id = cursor.lastrowid
+        link_reverse_read(cursor, new_header, new_entry_id)
         return new_entry_id
     else:
         print("That header already exists")
         return False
 
 
+def read_row(read_list, binned_qualities=False):
+    """Accepts a read list with header, sequence, quality score and optionally the quality string of the fastq file
+    and returns the values of the Header, Sequentie, Quality_score and Kwaliteiten columns of the DNA_READ table.
+
+    The sequence and the qualities are packed with the codec module. With binned_qualities the qualities are binned
+    before they are compressed, which makes them smaller but not exact. Kwaliteiten is None if the read list doesn't
+    contain qualities.
+    """
+    qualities = None
+    if len(read_list) > 3 and read_list[3] is not None:
+        qualities = codec.encode_qualities(read_list[3], binned_qualities)
+    return read_list[0], codec.encode_sequence(str(read_list[1])), read_list[2], qualities
+
+
 def insert_hits(cursor, read_id, hit_list):
     """Accepts a cursor, a read_id and 2d list with hit data and inserts the hit data into the database.
 
     This function accepts a cursor, a read_id and 2d list with hit data, each sublist containing a BLAST score,
     percentage query cover, percentage identity, percentage positives, E value, organism name, protein name,
-    protein comment and protein access code. For each hit, it checks if the organism and protein are already in
-    the database and inserts them if they're not, after which their ID's are retrieved. The remaining hit data is then
-    inserted into the hit table.
+    protein comment, protein access code and optionally the taxonomy lineage of the organism as a list of (name,
+    rank) tuples. For each hit, the organism and protein are inserted with insert_organism and insert_protein if
+    they're not in the database yet, which return their ID's. The hits are then inserted into the hit table.
+    Organisms without a taxon get the taxon of their lineage.
     """
-    exists_query = """
-      SELECT {} FROM {}
-      WHERE {} = '{}'"""
-
+    hit_rows = []
     for hit in hit_list:
-        organisme = hit[5].replace("\'", "\'\'")
-        cursor.execute(exists_query.format('ORGANISME_id', 'ORGANISME', 'Organisme_naam', organisme))
-        results = cursor.fetchall()
-        if not results:
+        organisme_id = insert_organism(cursor, hit[5])
+        hit_rows.append((read_id, organisme_id, insert_protein(cursor, hit), hit[0], hit[1], hit[2], hit[3], hit[4]))
+        if len(hit) > 9 and hit[9] is not None:
+            assign_taxon(cursor, organisme_id, taxon_id(cursor, taxon_path(hit[9], hit[5])))
+    if hit_rows:
+        cursor.executemany(HIT_INSERT_QUERY, hit_rows)
+    update_summaries(cursor, [row[1] for row in hit_rows], [hit[6] for hit in hit_list])
+
+
+def insert_organism(cursor, organism):
+    """Accepts a cursor and an organism name, inserts the organism if it isn't in the database yet and returns its
+    ORGANISME_id."""
+    # With the unique key on Organisme_naam, the id of an organism that is already in the database, possibly
+    # inserted by another worker, is returned instead of inserting it twice
+    cursor.execute("""
+      INSERT INTO ORGANISME (Organisme_naam) VALUES (%s)
+      ON DUPLICATE KEY UPDATE ORGANISME_id = LAST_INSERT_ID(ORGANISME_id)""", (organism,))
+    return cursor.lastrowid
+
+
+def insert_protein(cursor, hit):
+    """Accepts a cursor and a hit, inserts the protein of the hit if it isn't in the database yet and returns its
+    EIWIT_id. An empty protein comment is stored as NULL."""
+    cursor.execute("""
+      INSERT INTO EIWIT (Naam, Eiwit_comment, Accessiecode) VALUES (%s, %s, %s)
+      ON DUPLICATE KEY UPDATE EIWIT_id = LAST_INSERT_ID(EIWIT_id)""", (hit[6], hit[7] or None, hit[8]))
+    return cursor.lastrowid
+
+
+class BulkInserter:
+    """Inserts reads with their hits in batches.
+
+    The ids of organisms and proteins are kept in memory, so they only have to be looked up or inserted once.
+    Reads are collected until batch_size reads have been added, after which a connection is borrowed from the
+    connection pool of the database module and the whole batch is inserted with parameterized queries and committed
+    at once.
+
+    The pairing mode determines when reads are linked to their corresponding forward or reverse read. With "read"
+    every new read is linked while it is inserted, with "batch" all new reads of a batch are linked with a single
+    link_pairs query and with "deferred" no reads are linked, link_pairs has to be called after the load has finished.
+    The id of the first read inserted by the inserter is kept in first_read_id for that purpose.
+    With binned_qualities the per-base qualities of the reads are binned before they are stored, see read_row.
+    The ids of the taxa and the organisms that already have a taxon are kept in memory as well.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, pairing="read", binned_qualities=False):
+        self.batch_size = batch_size
+        self.pairing = pairing
+        self.binned_qualities = binned_qualities
+        self.first_read_id = None
+        self.reads = []
+        self.organism_ids = {}
+        self.protein_ids = {}
+        self.taxon_ids = {}
+        self.organisms_with_taxon = set()
+
+    def add(self, read_list, hit_list):
+        """Accepts a read list with header, sequence, quality score and optionally qualities and a 2d list with hit
+        data in the format used by insert_read_and_data and adds them to the batch. When the batch is full, it is
+        inserted and committed.
+        Returns the headers of the reads that were committed, which is an empty list if the batch isn't full yet.
+        """
+        self.reads.append((read_list, hit_list))
+        if len(self.reads) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Inserts and commits all reads in the batch that aren't in the database yet, together with their hits.
+        Returns the headers of all reads in the batch.
+        """
+        if not self.reads:
+            return []
+        headers = [read_list[0] for read_list, hit_list in self.reads]
+        with database.connection() as con:
+            cursor = metrics.TimedCursor(con.cursor(), "ingest")
+            try:
+                self._insert_batch(cursor)
+                con.commit()
+            except Exception:
+                # Ids of organisms, proteins and taxa inserted in this batch were rolled back as well
+                self.organism_ids = {}
+                self.protein_ids = {}
+                self.taxon_ids = {}
+                self.organisms_with_taxon = set()
+                raise
+            finally:
+                cursor.close()
+        self.reads = []
+        return headers
+
+    def _insert_batch(self, cursor):
+        """Inserts the reads in the batch that aren't in the database yet together with their hits."""
+        headers = [read_list[0] for read_list, hit_list in self.reads]
+        cursor.execute(READ_LOOKUP_QUERY.format(", ".join(["%s"] * len(headers))), headers)
+        existing = set(row[0] for row in cursor.fetchall())
+
+        hit_rows = []
+        protein_names = []
+        lineages = {}
+        new_reads = []
+        for read_list, hit_list in self.reads:
+            if read_list[0] in existing:
+                print("That header already exists")
+                continue
+            existing.add(read_list[0])
+            new_reads.append((read_list, hit_list))
+        self._lookup_ids(cursor, [hit for read_list, hit_list in new_reads for hit in hit_list])
+
+        batch_first_id = None
+        for read_list, hit_list in new_reads:
             cursor.execute("""
-                             INSERT INTO ORGANISME (Organisme_naam)
-                             VALUES ('{}')""".format(organisme))
-            cursor.execute(exists_query.format('ORGANISME_id', 'ORGANISME', 'Organisme_naam', organisme))
-            results = cursor.fetchall()
-        organisme_id = results[0][0]
+              INSERT INTO DNA_READ (Header, Sequentie, Quality_score, Kwaliteiten)
+              VALUES (%s, %s, %s, %s)""", read_row(read_list, self.binned_qualities))
+            read_id = cursor.lastrowid
+            if batch_first_id is None:
+                batch_first_id = read_id
+            if self.pairing == "read":
+                link_reverse_read(cursor, read_list[0], read_id)
+            for hit in hit_list:
+                organism_id = self._organism_id(cursor, hit[5])
+                hit_rows.append((read_id, organism_id, self._protein_id(cursor, hit),
+                                 hit[0], hit[1], hit[2], hit[3], hit[4]))
+                protein_names.append(hit[6])
+                if len(hit) > 9 and hit[9] is not None and organism_id not in self.organisms_with_taxon:
+                    lineages[organism_id] = taxon_path(hit[9], hit[5])
+
+        # The organisms get their taxon before the new hits are counted, so the hits are counted for the taxon too
+        for organism_id, lineage in lineages.items():
+            assign_taxon(cursor, organism_id, taxon_id(cursor, lineage, self.taxon_ids))
+            self.organisms_with_taxon.add(organism_id)
+        if hit_rows:
+            cursor.executemany(HIT_INSERT_QUERY, hit_rows)
+            update_summaries(cursor, [row[1] for row in hit_rows], protein_names)
+        if batch_first_id is not None:
+            if self.pairing == "batch":
+                link_pairs(cursor, batch_first_id)
+            if self.first_read_id is None:
+                self.first_read_id = batch_first_id
 
+    def _lookup_ids(self, cursor, hits):
+        """Retrieves the ids of the organisms and proteins of the hits that aren't in memory yet with one query per
+        table. Organism names are compared case insensitively, like mysql does.
+        """
+        organisms = list(set(hit[5] for hit in hits if hit[5].lower() not in self.organism_ids))
+        if organisms:
+            cursor.execute(ORGANISM_LOOKUP_QUERY.format(", ".join(["%s"] * len(organisms))), organisms)
+            for organism_id, organism in cursor.fetchall():
+                self.organism_ids[organism.lower()] = organism_id
+        access_codes = list(set(hit[8] for hit in hits if hit[8] not in self.protein_ids))
+        if access_codes:
+            cursor.execute(PROTEIN_LOOKUP_QUERY.format(", ".join(["%s"] * len(access_codes))), access_codes)
+            for protein_id, access_code in cursor.fetchall():
+                self.protein_ids[access_code] = protein_id
+
+    def _organism_id(self, cursor, organism):
+        """Returns the id of an organism, inserts the organism if it isn't in the database yet."""
+        if organism.lower() not in self.organism_ids:
+            self.organism_ids[organism.lower()] = insert_organism(cursor, organism)
+        return self.organism_ids[organism.lower()]
+
+    def _protein_id(self, cursor, hit):
+        """Returns the id of the protein of a hit, inserts the protein if it isn't in the database yet."""
         access_code = hit[8]
-        cursor.execute(exists_query.format('EIWIT_id', 'EIWIT', 'Accessiecode', access_code))
-        results = cursor.fetchall()
-        if not results:
-            if hit[7] != "":
-                cursor.execute("""
-                  INSERT INTO EIWIT (Naam, Eiwit_comment, Accessiecode)
-                  VALUES ('{}', '{}', '{}')""".format(hit[6].replace("\'", "\'\'"), hit[7].replace("\'", "\'\'"), access_code))
-            else:
-                cursor.execute("""
-                  INSERT INTO EIWIT (Naam, Eiwit_comment, Accessiecode)
-                  VALUES ('{}', Null, '{}')""".format(hit[6].replace("\'", "\'\'"), access_code))
-            cursor.execute(exists_query.format('EIWIT_id', 'EIWIT', 'Accessiecode', access_code))
-            results = cursor.fetchall()
-        eiwit_id = results[0][0]
+        if access_code not in self.protein_ids:
+            self.protein_ids[access_code] = insert_protein(cursor, hit)
+        return self.protein_ids[access_code]
+
+
+def taxon_path(lineage, organism):
+    """Accepts the taxonomy lineage of an organism as a list of (name, rank) tuples from the root down and the name of
+    the organism and returns the lineage with the organism as last taxon. An organism that isn't the last taxon of
+    its lineage is added to it without a rank."""
+    lineage = [tuple(taxon) for taxon in lineage]
+    if lineage and lineage[-1][0] == organism:
+        return lineage
+    return lineage + [(organism, NO_RANK)]
+
+
+def taxon_id(cursor, lineage, known=None):
+    """Accepts a cursor and a lineage of (name, rank) tuples from the root down and returns the TAXON_id of the last
+    taxon.
 
+    Taxa of the lineage that aren't in the TAXON table yet are inserted with their rank, together with their rows in
+    the TAXON_PAD closure table, which are made from the rows of their parent. Taxa are identified by their parent and
+    name, so the same name can occur in different places of the tree. Existing taxa without a rank get the rank of
+    the lineage. If a dictionary is given as known, the ids of the lineages that were already looked up are taken
+    from it and new ones are added to it.
+    """
+    parent_id = 0
+    for depth, (name, rank) in enumerate(lineage):
+        path = tuple(taxon[0] for taxon in lineage[:depth + 1])
+        if known is not None and path in known:
+            parent_id = known[path]
+            continue
+        # With the unique key on the parent and name, the id of an existing taxon is returned instead
+        cursor.execute("""
+          INSERT INTO TAXON (Naam, Ouder_id, Diepte, Rang) VALUES (%s, %s, %s, %s)
+          ON DUPLICATE KEY UPDATE TAXON_id = LAST_INSERT_ID(TAXON_id),
+          Rang = IF(VALUES(Rang) = %s, Rang, VALUES(Rang))""", (name, parent_id, depth, rank, NO_RANK))
+        new_id = cursor.lastrowid
+        # The closure rows of a taxon that already existed are ignored
+        cursor.execute("""
+          INSERT IGNORE INTO TAXON_PAD (Voorouder_id, Afstammeling_id, Afstand)
+          SELECT %s, %s, 0
+          UNION ALL
+          SELECT Voorouder_id, %s, Afstand + 1 FROM TAXON_PAD WHERE Afstammeling_id = %s""",
+                       (new_id, new_id, new_id, parent_id))
+        if known is not None:
+            known[path] = new_id
+        parent_id = new_id
+    return parent_id
+
+
+def assign_taxon(cursor, organism_id, organism_taxon_id):
+    """Accepts a cursor, an organism id and a TAXON_id and makes the taxon the taxon of the organism, if the
+    organism doesn't have a taxon yet. The hits of the organism that were already counted are then added to the
+    number of hits of the taxon and its ancestors."""
+    cursor.execute("UPDATE ORGANISME SET TAXON_id = %s WHERE ORGANISME_id = %s AND TAXON_id IS NULL",
+                   (organism_taxon_id, organism_id))
+    if cursor.rowcount == 1:
         cursor.execute("""
-          INSERT INTO HIT (DNA_READ_id, ORGANISME_id, EIWIT_id, Score, Query_cover, Identity, Positives, E_value)
-          VALUES ({}, {}, {}, {}, {}, {}, {}, {})""".format(read_id,
-                                                            organisme_id,
-                                                            eiwit_id,
-                                                            hit[0],
-                                                            hit[1],
-                                                            hit[2],
-                                                            hit[3],
-                                                            hit[4]))
+          INSERT INTO TAXON_TELLING (TAXON_id, Aantal)
+          SELECT p.Voorouder_id, t.Aantal FROM ORGANISME_TELLING t
+          JOIN TAXON_PAD p ON p.Afstammeling_id = %s
+          WHERE t.ORGANISME_id = %s
+          ON DUPLICATE KEY UPDATE TAXON_TELLING.Aantal = TAXON_TELLING.Aantal + VALUES(Aantal)""",
+                       (organism_taxon_id, organism_id))
+
+
+def update_summaries(cursor, organism_ids, protein_names):
+    """Accepts a cursor and the organism ids and protein names of newly inserted hits, one for every hit, and adds
+    them to the number of hits per organism and per protein name in the summary tables. The hits are also added to
+    the number of hits of the taxon of their organism and its ancestors.
+    """
+    organism_counts = Counter(organism_ids)
+    protein_counts = Counter(protein_names)
+    if organism_counts:
+        cursor.executemany("""
+          INSERT INTO ORGANISME_TELLING (ORGANISME_id, Aantal) VALUES (%s, %s)
+          ON DUPLICATE KEY UPDATE Aantal = Aantal + VALUES(Aantal)""", list(organism_counts.items()))
+        # Not with executemany, which would try to rewrite the INSERT ... SELECT into a single INSERT
+        for organism_id, count in organism_counts.items():
+            cursor.execute(TAXON_COUNT_QUERY, (count, organism_id))
+    if protein_counts:
+        cursor.executemany("""
+          INSERT INTO EIWIT_TELLING (Naam, Aantal) VALUES (%s, %s)
+          ON DUPLICATE KEY UPDATE Aantal = Aantal + VALUES(Aantal)""", list(protein_counts.items()))
+
+
+def link_reverse_read(cursor, header, read_id):
+    """Accepts a cursor and the header and id of a new read and links the read to its corresponding forward or
+    reverse read, if that read is already in the database.
+    """
+    if header[-1] == "1":
+        inverse_header = header[0:-1] + "2"
+    elif header[-1] == "2":
+        inverse_header = header[0:-1] + "1"
+    else:
+        return
+    cursor.execute(MATE_QUERY, (inverse_header,))
+    result_list = cursor.fetchall()
+    if result_list:
+        cursor.execute("UPDATE DNA_READ SET For_rev_id = %s WHERE DNA_READ_id = %s", (result_list[0][0], read_id))
+        cursor.execute("UPDATE DNA_READ SET For_rev_id = %s WHERE DNA_READ_id = %s", (read_id, result_list[0][0]))
+
+
+def link_pairs(cursor, first_id=None):
+    """Accepts a cursor and optionally a DNA_READ_id and links all unpaired reads to their corresponding forward or
+    reverse read. Returns the number of updated reads.
+
+    The header of the corresponding read is found by flipping the last character of the header between 1 and 2.
+    If first_id is given, only the reads with that id or a higher id and the reads that correspond to them are
+    linked, so only the reads that were inserted since then are considered. This takes two queries, one that links
+    the new reads and one that links the older reads to their new corresponding read, so both can read the new reads
+    from a range of the primary key instead of scanning the whole table. Without first_id every read is linked by
+    the first query.
+    """
+    if first_id is None:
+        cursor.execute(LINK_NEW_READS_QUERY, (0,))
+        return cursor.rowcount
+    cursor.execute(LINK_NEW_READS_QUERY, (first_id,))
+    updated = cursor.rowcount
+    cursor.execute(LINK_OLD_MATES_QUERY, (first_id,))
+    return updated + cursor.rowcount
+
+
+if __name__ == '__main__':
+    with database.connection() as con:
+        cursor = metrics.TimedCursor(con.cursor(), "ingest")
+        print("Linked {} reads to their corresponding read.".format(link_pairs(cursor)))
+        con.commit()
+        cursor.close()
@@ -0,0 +1,287 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module keeps counters and timing histograms of the slow steps of the BLAST ingest and the web
+#           application, such as the BLAST searches, the Entrez requests, the parsing of the results and the queries
+#           on the mysql database. The metrics are written in the text format of Prometheus, which the web
+#           application serves on its /metrics page and the ingest on a small http server of its own. Queries that
+#           take longer than a threshold are logged.
+
+import cProfile
+import logging
+import pstats
+import re
+import threading
+import time
+from functools import wraps
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Upper bounds in seconds of the buckets of the timing histograms
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Queries that take longer than this number of seconds are logged
+SLOW_QUERY_SECONDS = 0.5
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_metrics = []
+
+
+class Counter:
+    """Counter with a value per combination of label values, that can only go up."""
+
+    kind = "counter"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        """Adds amount to the counter of the label values."""
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        """Returns the lines of the counter in the Prometheus text format."""
+        return ["{}{} {}".format(self.name, _labels(self.labels, key), value) for key, value in self.values.items()]
+
+
+class Histogram:
+    """Histogram of durations in seconds with the number of durations per bucket for every combination of label
+    values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        _metrics.append(self)
+
+    def observe(self, seconds, *label_values):
+        """Adds a duration in seconds to the histogram of the label values."""
+        with _lock:
+            if label_values not in self.values:
+                self.values[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            value = self.values[label_values]
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    value[0][position] += 1
+            value[1] += 1
+            value[2] += seconds
+
+    def samples(self):
+        """Returns the lines of the histogram in the Prometheus text format, in which the buckets are cumulative."""
+        lines = []
+        for key, (bucket_counts, count, total) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append("{}_bucket{} {}".format(self.name, _labels(self.labels + ("le",), key + (bound,)),
+                                                     bucket_count))
+            lines.append("{}_bucket{} {}".format(self.name, _labels(self.labels + ("le",), key + ("+Inf",)), count))
+            lines.append("{}_sum{} {}".format(self.name, _labels(self.labels, key), total))
+            lines.append("{}_count{} {}".format(self.name, _labels(self.labels, key), count))
+        return lines
+
+
+FUNCTION_SECONDS = Histogram("function_seconds", "Duration of the calls of instrumented functions.", ("function",))
+FUNCTION_ERRORS = Counter("function_errors_total", "Number of calls of instrumented functions that raised an error.",
+                          ("function",))
+QUERY_SECONDS = Histogram("sql_query_seconds", "Duration of the mysql queries.", ("source", "query"))
+SLOW_QUERIES = Counter("sql_slow_queries_total", "Number of mysql queries slower than the slow query threshold.",
+                       ("source", "query"))
+REQUEST_SECONDS = Histogram("http_request_seconds", "Duration of the web requests until the response is returned.",
+                            ("route", "method", "status"))
+
+
+def _labels(names, values):
+    """Returns the label part of a Prometheus sample line for the label names and values."""
+    if not names:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                          for name, value in zip(names, values)) + "}"
+
+
+def render():
+    """Returns all metrics in the Prometheus text format."""
+    lines = []
+    with _lock:
+        for metric in _metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.description))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def timed(name):
+    """Decorator that adds the duration of every call of the decorated function to the function_seconds
+    histogram with name as function label and counts the calls that raise an exception.
+
+    For generator functions only the creation of the generator is timed, so generators shouldn't be decorated.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                FUNCTION_ERRORS.inc(name)
+                raise
+            finally:
+                FUNCTION_SECONDS.observe(time.perf_counter() - start, name)
+        return wrapper
+    return decorator
+
+
+def query_name(query):
+    """Accepts a SQL query and returns a short name for it made of the statement and the first table, such as
+    'insert HIT' or 'select DNA_READ', so the number of different query labels stays small."""
+    match = re.match(r"\s*(\w+)\s+(?:.*?\b(?:FROM|INTO)\s+)?`?(\w+)", query, re.IGNORECASE | re.DOTALL)
+    if match is None:
+        return query.split(None, 1)[0].lower() if query.strip() else "empty"
+    return "{} {}".format(match.group(1).lower(), match.group(2))
+
+
+class TimedCursor:
+    """Wraps a database cursor and times every execute and executemany call.
+
+    The durations are added to the sql_query_seconds histogram with the source and the query_name of the query as
+    labels. Queries that take longer than SLOW_QUERY_SECONDS are logged. All other attributes are taken from the
+    wrapped cursor.
+    """
+
+    def __init__(self, cursor, source):
+        self.cursor = cursor
+        self.source = source
+
+    def execute(self, query, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.cursor.execute(query, *args, **kwargs)
+        finally:
+            self._observe(query, time.perf_counter() - start)
+
+    def executemany(self, query, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.cursor.executemany(query, *args, **kwargs)
+        finally:
+            self._observe(query, time.perf_counter() - start)
+
+    def _observe(self, query, seconds):
+        name = query_name(query)
+        QUERY_SECONDS.observe(seconds, self.source, name)
+        if seconds > SLOW_QUERY_SECONDS:
+            SLOW_QUERIES.inc(self.source, name)
+            logger.warning("Slow query from %s took %.3f seconds: %s", self.source, seconds, " ".join(query.split()))
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics on /metrics."""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host=""):
+    """Serves the metrics on http://host:port/metrics from a background thread and returns the server, which can be
+    stopped with its shutdown method."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Since Python 3.12 cProfile can only be enabled in one thread of the process at a time
+_profile_lock = threading.Lock()
+
+
+class Profiler:
+    """Profiles the calls of wrapped functions with cProfile in every thread that calls them.
+
+    cProfile only profiles the thread in which it is enabled, so every thread gets a profile of its own. The profiles
+    of all threads are combined when they are written to a file with dump. Since Python 3.12 only one profile can be
+    enabled in the whole process, so only one call is profiled at a time. A call that is made while a call in another
+    thread is being profiled runs without being profiled, the number of those calls is kept in unprofiled.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.unprofiled = 0
+
+    def wrap(self, function):
+        """Returns a function that calls function with the profile of the calling thread enabled, if no other thread
+        is being profiled at that moment."""
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if getattr(self.local, "active", False):
+                # Called from another wrapped function, which is already being profiled
+                return function(*args, **kwargs)
+            if not _profile_lock.acquire(blocking=False):
+                with self.lock:
+                    self.unprofiled += 1
+                return function(*args, **kwargs)
+            try:
+                profile = getattr(self.local, "profile", None)
+                if profile is None:
+                    profile = self.local.profile = cProfile.Profile()
+                    with self.lock:
+                        self.profiles.append(profile)
+                self.local.active = True
+                profile.enable()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    profile.disable()
+                    self.local.active = False
+            finally:
+                _profile_lock.release()
+        return wrapper
+
+    def wrap_iterator(self, iterable):
+        """Returns an iterator over iterable that profiles the retrieval of every item like wrap does."""
+        iterator = iter(iterable)
+        end = object()
+        fetch = self.wrap(lambda: next(iterator, end))
+        while True:
+            item = fetch()
+            if item is end:
+                return
+            yield item
+
+    def dump(self, path):
+        """Writes the combined profiles of all threads to the file at path, which can be read with pstats."""
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
@@ -0,0 +1,120 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module merges the forward and reverse read of a read pair into a single longer read when the two
+#           reads overlap, so the pair can be BLASTed with one query instead of two. The reverse complement of the
+#           reverse read is aligned to the end of the forward read and the overlapping part is replaced by a
+#           consensus, in which the qualities of both reads are combined.
+
+import codec
+import metrics
+import numpy
+from collections import namedtuple, OrderedDict
+
+# A merged read pair, with the same first fields as the Read of blast_script and the forward and reverse read in mates
+MergedPair = namedtuple("MergedPair", ["header", "sequence", "quality_score", "mean_quality", "qualities", "mates"])
+
+# Minimum number of overlapping bases and maximum fraction of mismatches in the overlap of a merged pair
+MIN_OVERLAP = 20
+MAX_MISMATCH_RATE = 0.1
+# Maximum number of reads kept while waiting for their corresponding read
+MAX_WAITING = 10000
+
+READ_PAIRS = metrics.Counter("read_pairs_total", "Number of read pairs that were merged or kept separate.", ("result",))
+
+
+def pair_name(header):
+    """Accepts a read header and returns the header without the /1 or /2 at the end, which is the same for the
+    forward and reverse read of a pair. Returns None if the header doesn't end with /1 or /2."""
+    if header[-2:] in ("/1", "/2"):
+        return header[:-2]
+    return None
+
+
+def mates(read):
+    """Accepts a read or a MergedPair and returns a tuple with the reads that it consists of."""
+    if isinstance(read, MergedPair):
+        return read.mates
+    return (read,)
+
+
+def find_overlap(forward, reverse, min_overlap=MIN_OVERLAP, max_mismatch_rate=MAX_MISMATCH_RATE):
+    """Accepts the sequence of a forward read and the reverse complement of its reverse read and returns the length
+    of the longest overlap between the end of the forward read and the start of the reverse complement with at most
+    max_mismatch_rate mismatches. Returns 0 if there is no overlap of at least min_overlap bases."""
+    forward = numpy.frombuffer(forward.encode("ascii"), dtype=numpy.uint8)
+    reverse = numpy.frombuffer(reverse.encode("ascii"), dtype=numpy.uint8)
+    for length in range(min(len(forward), len(reverse)), min_overlap - 1, -1):
+        mismatches = numpy.count_nonzero(forward[len(forward) - length:] != reverse[:length])
+        if mismatches <= max_mismatch_rate * length:
+            return length
+    return 0
+
+
+def merge_pair(forward, reverse, min_overlap=MIN_OVERLAP, max_mismatch_rate=MAX_MISMATCH_RATE):
+    """Accepts the forward and reverse read of a pair and returns a MergedPair if they overlap, otherwise None.
+
+    The merged sequence consists of the forward read followed by the part of the reverse complement of the reverse
+    read after the overlap. Where both reads have the same base in the overlap, the highest of both qualities is
+    used. Where they differ, the base with the highest quality is used and its quality becomes the difference between
+    both qualities, with a minimum of 2. The header of the merged pair is the header of the forward read.
+    """
+    forward_sequence = forward.sequence.upper()
+    reverse_sequence = codec.reverse_complement(reverse.sequence.upper())
+    overlap = find_overlap(forward_sequence, reverse_sequence, min_overlap, max_mismatch_rate)
+    if not overlap:
+        return None
+
+    forward_bases = numpy.frombuffer(forward_sequence.encode("ascii"), dtype=numpy.uint8)
+    reverse_bases = numpy.frombuffer(reverse_sequence.encode("ascii"), dtype=numpy.uint8)
+    forward_phred = numpy.frombuffer(forward.qualities.encode("ascii"), dtype=numpy.uint8).astype(numpy.int64) - 33
+    reverse_phred = numpy.frombuffer(reverse.qualities[::-1].encode("ascii"),
+                                     dtype=numpy.uint8).astype(numpy.int64) - 33
+
+    start = len(forward_bases) - overlap
+    forward_overlap, reverse_overlap = forward_bases[start:], reverse_bases[:overlap]
+    forward_quality, reverse_quality = forward_phred[start:], reverse_phred[:overlap]
+    agree = forward_overlap == reverse_overlap
+    bases = numpy.where(agree | (forward_quality >= reverse_quality), forward_overlap, reverse_overlap)
+    qualities = numpy.where(agree, numpy.maximum(forward_quality, reverse_quality),
+                            numpy.maximum(numpy.abs(forward_quality - reverse_quality), 2))
+
+    sequence = forward_sequence[:start] + bases.tobytes().decode("ascii") + reverse_sequence[overlap:]
+    phred_scores = numpy.concatenate((forward_phred[:start], qualities, reverse_phred[overlap:]))
+    return MergedPair(forward.header, sequence, int(phred_scores.sum()), float(phred_scores.mean()),
+                      (phred_scores + 33).astype(numpy.uint8).tobytes().decode("ascii"), (forward, reverse))
+
+
+def merge_pairs(reads, min_overlap=MIN_OVERLAP, max_mismatch_rate=MAX_MISMATCH_RATE, max_waiting=MAX_WAITING):
+    """Accepts an iterator of reads in which the forward and reverse reads of the pairs are close together and yields
+    a MergedPair for every pair that overlaps and the separate reads of the other pairs.
+
+    Reads are kept until their corresponding read comes along. When more than max_waiting reads are waiting, the
+    read that has been waiting longest is yielded on its own. Reads without /1 or /2 at the end of the header are
+    yielded straight away.
+    """
+    waiting = OrderedDict()
+    for read in reads:
+        name = pair_name(read.header)
+        if name is None:
+            yield read
+            continue
+        mate = waiting.pop(name, None)
+        if mate is None or mate.header == read.header:
+            if mate is not None:
+                yield mate
+            waiting[name] = read
+            if len(waiting) > max_waiting:
+                yield waiting.popitem(last=False)[1]
+            continue
+        forward, reverse = (mate, read) if mate.header.endswith("/1") else (read, mate)
+        merged = merge_pair(forward, reverse, min_overlap, max_mismatch_rate)
+        if merged is None:
+            READ_PAIRS.inc("separate")
+            yield forward
+            yield reverse
+        else:
+            READ_PAIRS.inc("merged")
+            yield merged
+    for read in waiting.values():
+        yield read
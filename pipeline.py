@@ -0,0 +1,147 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module runs the BLAST ingest as a pipeline of stages. Batches of reads are searched, the hits are
+#           annotated and the results are stored by separate groups of threads, connected by bounded queues so that
+#           the stages overlap while memory use stays constant. It also contains the TokenBucket rate limiter that
+#           is used to spread the requests to the NCBI servers over time.
+
+import threading
+import time
+from queue import Queue, Empty, Full
+
+# Marks the end of the items in a queue, every worker stops when it receives it
+_DONE = object()
+
+
+class TokenBucket:
+    """Rate limiter that allows rate requests per second on average, with bursts of at most capacity requests.
+
+    The acquire method blocks until a token is available. The bucket can be shared by multiple threads.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Takes tokens out of the bucket, waits until enough tokens have been added if the bucket is empty."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def run_pipeline(reads, search, annotate, store, batch_size, search_workers=1, annotate_workers=2, store_workers=1,
+                 queue_size=20):
+    """Accepts an iterable of reads and the functions of the three stages and runs the reads through the pipeline.
+
+    Every read is a tuple of which the first two items are the header and sequence. The reads are read lazily and
+    collected in batches of batch_size, search is called with the headers and sequences of a batch and has to return
+    the BLAST results per header. Then annotate is called with the read and its BLAST results and its return value is
+    passed to store together with the read and the BLAST results. Each stage runs in its own number of threads, the
+    queues between the stages hold at most queue_size items, so a slow stage holds up the earlier stages instead of
+    filling the memory.
+    If a stage raises an exception, the pipeline is stopped and the exception is raised again. When the pipeline is
+    interrupted, for example with Ctrl-C, all workers are stopped and waited for before the interrupt is raised again,
+    so the caller can safely clean up what the stages use.
+    """
+    search_queue = Queue(queue_size)
+    annotate_queue = Queue(queue_size)
+    store_queue = Queue(queue_size)
+    failed = threading.Event()
+    errors = []
+
+    def search_stage(batch):
+        headers = [read[0] for read in batch]
+        seqs = [read[1] for read in batch]
+        results = search(headers, seqs)
+        for read in batch:
+            if not _put(annotate_queue, (read, results[read[0]]), failed):
+                break
+
+    def annotate_stage(item):
+        read, blast_data = item
+        _put(store_queue, (read, blast_data, annotate(read, blast_data)), failed)
+
+    def store_stage(item):
+        store(*item)
+
+    stages = [(search_queue, search_stage, search_workers),
+              (annotate_queue, annotate_stage, annotate_workers),
+              (store_queue, store_stage, store_workers)]
+    threads = []
+    for stage_queue, function, workers in stages:
+        threads.append([threading.Thread(target=_worker, args=(stage_queue, function, failed, errors))
+                        for _ in range(workers)])
+        for thread in threads[-1]:
+            thread.start()
+
+    batch = []
+    try:
+        try:
+            for read in reads:
+                batch.append(read)
+                if len(batch) == batch_size:
+                    if not _put(search_queue, batch, failed):
+                        break
+                    batch = []
+            if batch:
+                _put(search_queue, batch, failed)
+        except Exception as e:
+            # Reading the input failed, let the workers stop before the exception is raised again
+            errors.append(e)
+            failed.set()
+
+        # Stop the stages one after the other, so every item that was already queued still gets through the pipeline
+        for (stage_queue, function, workers), stage_threads in zip(stages, threads):
+            for _ in range(workers):
+                _put(stage_queue, _DONE, failed)
+            for thread in stage_threads:
+                thread.join()
+    except BaseException:
+        # Interrupted while reading or waiting, the workers stop after their current item
+        failed.set()
+        for stage_threads in threads:
+            for thread in stage_threads:
+                thread.join()
+        raise
+
+    if errors:
+        raise errors[0]
+
+
+def _worker(stage_queue, function, failed, errors):
+    """Calls function for every item in the queue until the end of the queue is reached or another worker failed."""
+    while not failed.is_set():
+        try:
+            item = stage_queue.get(timeout=0.5)
+        except Empty:
+            continue
+        if item is _DONE:
+            return
+        try:
+            function(item)
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+
+
+def _put(stage_queue, item, failed):
+    """Puts an item in a queue, waits while the queue is full. Returns False if the pipeline failed in the meantime."""
+    while not failed.is_set():
+        try:
+            stage_queue.put(item, timeout=0.5)
+        except Full:
+            continue
+        return True
+    return False
@@ -0,0 +1,61 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module stores the BLAST results of read sequences in a local SQLite database, so a sequence that was
+#           already searched in this run or an earlier run doesn't have to be BLASTed again. Sequences are looked up
+#           by a hash of the sequence or its reverse complement, whichever comes first alphabetically, so a read and
+#           its reverse complement share their results. When the cache holds more than the maximum number of
+#           sequences, the least recently used ones are removed.
+
+import hashlib
+import json
+import re
+import codec
+import sqlite_lru
+
+
+def sequence_key(sequence, all_hsps=False, settings=""):
+    """Accepts a DNA sequence and returns the key of its BLAST results in the cache.
+
+    The sequence is normalized to upper case with every character other than A, C, G and T replaced by N. The key is
+    the SHA-1 hash of the normalized sequence or of its reverse complement, whichever comes first alphabetically,
+    because blastx searches both strands. Results with every HSP get other keys than results with only the best HSP.
+    The settings are a description of the backend, database and parameters of the search, such as the one made by
+    search_settings of blast_script, so results of searches with other settings get other keys as well.
+    """
+    sequence = re.sub("[^ACGT]", "N", sequence.upper())
+    canonical = min(sequence, codec.reverse_complement(sequence))
+    if all_hsps:
+        canonical = "all_hsps:" + canonical
+    if settings:
+        canonical = settings + ":" + canonical
+    return hashlib.sha1(canonical.encode("ascii")).hexdigest()
+
+
+class ResultCache:
+    """Persistent cache that maps sequence keys to the BLAST results of the sequence, in the format returned by
+    parse_qresult of blast_script.
+
+    The cache is stored in the SQLite database file at path and holds at most max_entries sequences.
+    It can be shared by multiple threads.
+    """
+
+    def __init__(self, path, max_entries=1000000):
+        self.table = sqlite_lru.LruTable(path, "blast_result", "sequence_key", [("result", "TEXT NOT NULL")],
+                                         max_entries)
+
+    def get_many(self, keys):
+        """Accepts a list of sequence keys and returns a dictionary with the cached BLAST results of the keys that
+        were found in the cache. The found keys are marked as recently used.
+        """
+        return {key: tuple(json.loads(result)) for key, (result,) in self.table.get_many(keys).items()}
+
+    def put_many(self, results):
+        """Accepts a dictionary with sequence keys as keys and BLAST results as values and stores them in the cache.
+        Afterwards the least recently used keys are removed if the cache holds more than max_entries keys.
+        """
+        self.table.put_many({key: (json.dumps(result),) for key, result in results.items()})
+
+    def close(self):
+        """Closes the connection with the cache database."""
+        self.table.close()
@@ -0,0 +1,344 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module defines the tables and indexes of the mysql database as a numbered list of migrations.
+#           The version of the database is kept in the SCHEMA_VERSIE table, so running the module only applies the
+#           migrations that haven't been applied yet. The module can also check with EXPLAIN that the queries of the
+#           ingest and the web application can use an index instead of scanning a whole table.
+
+import argparse
+import sys
+import codec
+import database
+
+
+def create_base_tables(cursor):
+    """Accepts a cursor and creates the DNA_READ, ORGANISME, EIWIT and HIT tables if they don't exist yet."""
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS DNA_READ (
+        DNA_READ_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        Header VARCHAR(100) NOT NULL,
+        Sequentie TEXT,
+        Quality_score INT,
+        For_rev_id INT NULL)""")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS ORGANISME (
+        ORGANISME_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        Organisme_naam VARCHAR(255) NOT NULL)""")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS EIWIT (
+        EIWIT_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        Naam VARCHAR(500),
+        Eiwit_comment TEXT,
+        Accessiecode VARCHAR(50) NOT NULL)""")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS HIT (
+        HIT_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        DNA_READ_id INT NOT NULL,
+        ORGANISME_id INT NOT NULL,
+        EIWIT_id INT NOT NULL,
+        Score DOUBLE,
+        Query_cover DOUBLE,
+        Identity DOUBLE,
+        Positives DOUBLE,
+        E_value DOUBLE,
+        FOREIGN KEY (DNA_READ_id) REFERENCES DNA_READ (DNA_READ_id),
+        FOREIGN KEY (ORGANISME_id) REFERENCES ORGANISME (ORGANISME_id),
+        FOREIGN KEY (EIWIT_id) REFERENCES EIWIT (EIWIT_id))""")
+
+
+def create_indexes(cursor):
+    """Accepts a cursor and creates the unique keys on the columns that the ingest looks rows up by and the indexes
+    on the HIT table that the joins, the bar charts and the ordering of the search results use.
+
+    If the tables already contain duplicate headers, organism names or accession codes, the unique keys can't be
+    created and the duplicates have to be removed first.
+    """
+    add_index(cursor, "DNA_READ", "uk_dna_read_header", "UNIQUE INDEX uk_dna_read_header (Header)")
+    add_index(cursor, "ORGANISME", "uk_organisme_naam", "UNIQUE INDEX uk_organisme_naam (Organisme_naam)")
+    add_index(cursor, "EIWIT", "uk_eiwit_accessiecode", "UNIQUE INDEX uk_eiwit_accessiecode (Accessiecode)")
+    add_index(cursor, "EIWIT", "ix_eiwit_naam", "INDEX ix_eiwit_naam (Naam)")
+    # Covers the joins from a read to its hits and their organisms and proteins
+    add_index(cursor, "HIT", "ix_hit_read", "INDEX ix_hit_read (DNA_READ_id, ORGANISME_id, EIWIT_id, Score)")
+    add_index(cursor, "HIT", "ix_hit_organisme", "INDEX ix_hit_organisme (ORGANISME_id, EIWIT_id, Score)")
+    add_index(cursor, "HIT", "ix_hit_eiwit", "INDEX ix_hit_eiwit (EIWIT_id, ORGANISME_id, Score)")
+    # Matches the ordering of the search results, so a page can be read from the index
+    add_index(cursor, "HIT", "ix_hit_ranking", "INDEX ix_hit_ranking (Score, Query_cover, Identity, HIT_id)")
+
+
+def create_summary_tables(cursor):
+    """Accepts a cursor and creates the tables with the number of hits per organism and per protein name."""
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS ORGANISME_TELLING (
+        ORGANISME_id INT NOT NULL PRIMARY KEY,
+        Aantal INT NOT NULL,
+        INDEX (Aantal))""")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS EIWIT_TELLING (
+        Naam VARCHAR(500) NOT NULL PRIMARY KEY,
+        Aantal INT NOT NULL,
+        INDEX (Aantal))""")
+    rebuild_summaries(cursor)
+
+
+def rebuild_summaries(cursor):
+    """Accepts a cursor and recounts the number of hits per organism and per protein name from the HIT table."""
+    cursor.execute("DELETE FROM ORGANISME_TELLING")
+    cursor.execute("""
+      INSERT INTO ORGANISME_TELLING (ORGANISME_id, Aantal)
+      SELECT ORGANISME_id, count(*) FROM HIT GROUP BY ORGANISME_id""")
+    cursor.execute("DELETE FROM EIWIT_TELLING")
+    cursor.execute("""
+      INSERT INTO EIWIT_TELLING (Naam, Aantal)
+      SELECT Naam, count(*) FROM HIT NATURAL JOIN EIWIT GROUP BY Naam""")
+
+
+# Full-text indexes on the names and comments that can be searched, with the table, index name and column of each
+SEARCH_INDEXES = [("ORGANISME", "ft_organisme_naam", "Organisme_naam"),
+                  ("EIWIT", "ft_eiwit_naam", "Naam"),
+                  ("EIWIT", "ft_eiwit_comment", "Eiwit_comment")]
+
+
+def create_search_indexes(cursor):
+    """Accepts a cursor and creates the full-text indexes on the organism names, protein names and protein comments
+    that don't exist yet.
+
+    The indexes use the ngram parser, which splits the text into pieces of ngram_token_size characters (2 by default),
+    so they can also find search terms in the middle of a word. Stopwords are turned off while the indexes are
+    created, because the ngram parser would otherwise leave out every piece that contains a stopword such as 'a'.
+    MySQL keeps the indexes up to date when rows are inserted.
+    """
+    cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+    for table, index, column in SEARCH_INDEXES:
+        add_index(cursor, table, index, "FULLTEXT INDEX {} ({}) WITH PARSER ngram".format(index, column))
+
+
+def pack_read_sequences(cursor):
+    """Accepts a cursor and replaces the Sequentie text column of the DNA_READ table by a BLOB column with the
+    sequences packed by the codec module. Also adds the Kwaliteiten column, with the per-base qualities compressed by
+    the codec module.
+
+    The sequences that are already stored are packed in batches. Their qualities weren't stored, so Kwaliteiten stays
+    empty for them. The migration can be run again if it was interrupted, only the sequences that weren't packed yet
+    are then packed.
+    """
+    if column_type(cursor, "DNA_READ", "Kwaliteiten") is None:
+        cursor.execute("ALTER TABLE DNA_READ ADD COLUMN Kwaliteiten BLOB")
+    if column_type(cursor, "DNA_READ", "Sequentie") == "blob":
+        return
+    if column_type(cursor, "DNA_READ", "Sequentie_gepakt") is None:
+        cursor.execute("ALTER TABLE DNA_READ ADD COLUMN Sequentie_gepakt BLOB")
+    last_id = 0
+    while True:
+        cursor.execute("""
+          SELECT DNA_READ_id, Sequentie FROM DNA_READ
+          WHERE DNA_READ_id > %s AND Sequentie IS NOT NULL AND Sequentie_gepakt IS NULL
+          ORDER BY DNA_READ_id LIMIT 1000""", (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany("UPDATE DNA_READ SET Sequentie_gepakt = %s WHERE DNA_READ_id = %s",
+                           [(codec.encode_sequence(sequence), read_id) for read_id, sequence in rows])
+        last_id = rows[-1][0]
+    cursor.execute("ALTER TABLE DNA_READ DROP COLUMN Sequentie")
+    cursor.execute("ALTER TABLE DNA_READ CHANGE Sequentie_gepakt Sequentie BLOB")
+
+
+def create_taxonomy_tables(cursor):
+    """Accepts a cursor and creates the tables with the taxonomy of the organisms and the number of hits per taxon.
+
+    TAXON holds every taxon of the lineages once, with its parent and its depth in the tree. The roots have 0 as
+    parent and depth 0. The organism itself is the last taxon of its lineage and the TAXON_id column of ORGANISME
+    refers to it. TAXON_PAD is the closure table of the tree, with a row for every taxon and each of its ancestors,
+    including the taxon itself at distance 0, so all ancestors or descendants of a taxon are found with one join.
+    TAXON_TELLING holds the number of hits of every taxon and its descendants, which insert_script keeps up to date.
+    The column is called TAXON_id in every table and in no other table, so the NATURAL JOINs of the existing queries
+    still only join on the columns they joined on before.
+    """
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS TAXON (
+        TAXON_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        Naam VARCHAR(255) NOT NULL,
+        Ouder_id INT NOT NULL,
+        Diepte INT NOT NULL,
+        UNIQUE INDEX uk_taxon_ouder_naam (Ouder_id, Naam),
+        INDEX ix_taxon_diepte (Diepte))""")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS TAXON_PAD (
+        Voorouder_id INT NOT NULL,
+        Afstammeling_id INT NOT NULL,
+        Afstand INT NOT NULL,
+        PRIMARY KEY (Voorouder_id, Afstammeling_id),
+        INDEX ix_taxon_pad_afstammeling (Afstammeling_id, Voorouder_id),
+        FOREIGN KEY (Voorouder_id) REFERENCES TAXON (TAXON_id),
+        FOREIGN KEY (Afstammeling_id) REFERENCES TAXON (TAXON_id))""")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS TAXON_TELLING (
+        TAXON_id INT NOT NULL PRIMARY KEY,
+        Aantal INT NOT NULL,
+        INDEX (Aantal))""")
+    if column_type(cursor, "ORGANISME", "TAXON_id") is None:
+        cursor.execute("""
+          ALTER TABLE ORGANISME ADD COLUMN TAXON_id INT NULL,
+          ADD INDEX ix_organisme_taxon (TAXON_id),
+          ADD FOREIGN KEY (TAXON_id) REFERENCES TAXON (TAXON_id)""")
+    rebuild_taxon_counts(cursor)
+
+
+def rebuild_taxon_counts(cursor):
+    """Accepts a cursor and recounts the number of hits of every taxon and its descendants from the number of hits
+    per organism. Organisms without a taxon aren't counted."""
+    cursor.execute("DELETE FROM TAXON_TELLING")
+    cursor.execute("""
+      INSERT INTO TAXON_TELLING (TAXON_id, Aantal)
+      SELECT p.Voorouder_id, SUM(t.Aantal) FROM ORGANISME_TELLING t
+      JOIN ORGANISME o ON o.ORGANISME_id = t.ORGANISME_id
+      JOIN TAXON_PAD p ON p.Afstammeling_id = o.TAXON_id
+      GROUP BY p.Voorouder_id""")
+
+
+def add_taxon_ranks(cursor):
+    """Accepts a cursor and adds the rank of every taxon to the TAXON table, such as phylum, genus or species, with
+    an index for the taxonomy page per rank. Taxa that were stored before the ranks were retrieved get the rank
+    'no rank', until they are stored again as part of a lineage with ranks."""
+    if column_type(cursor, "TAXON", "Rang") is None:
+        cursor.execute("""
+          ALTER TABLE TAXON ADD COLUMN Rang VARCHAR(50) NOT NULL DEFAULT 'no rank',
+          ADD INDEX ix_taxon_rang (Rang)""")
+
+
+def column_type(cursor, table, column):
+    """Accepts a cursor, a table name and a column name and returns the data type of the column, such as 'text' or
+    'blob', or None if the table doesn't have that column."""
+    cursor.execute("""
+      SELECT DATA_TYPE FROM information_schema.COLUMNS
+      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""", (table, column))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    # Some versions of mysql return the columns of information_schema as bytes
+    data_type = row[0].decode() if isinstance(row[0], (bytes, bytearray)) else row[0]
+    return data_type.lower()
+
+
+def add_index(cursor, table, index, definition):
+    """Accepts a cursor, a table name, an index name and the definition of the index and adds the index to the table
+    if the table doesn't have an index with that name yet."""
+    cursor.execute("""
+      SELECT count(*) FROM information_schema.STATISTICS
+      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s""", (table, index))
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("ALTER TABLE {} ADD {}".format(table, definition))
+
+
+# All migrations in the order they have to be applied, with the version of the database after each migration
+MIGRATIONS = [(1, create_base_tables),
+              (2, create_indexes),
+              (3, create_summary_tables),
+              (4, create_search_indexes),
+              (5, pack_read_sequences),
+              (6, create_taxonomy_tables),
+              (7, add_taxon_ranks)]
+
+
+def migrate(con):
+    """Accepts a database connection and applies all migrations that haven't been applied to the database yet.
+    Every migration is committed separately, together with the new version. Returns the version of the database."""
+    cursor = con.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS SCHEMA_VERSIE (Versie INT NOT NULL PRIMARY KEY)")
+    cursor.execute("SELECT MAX(Versie) FROM SCHEMA_VERSIE")
+    current = cursor.fetchone()[0] or 0
+    for version, migration in MIGRATIONS:
+        if version > current:
+            print("Applying migration {}: {}".format(version, migration.__name__))
+            migration(cursor)
+            cursor.execute("INSERT INTO SCHEMA_VERSIE (Versie) VALUES (%s)", (version,))
+            con.commit()
+            current = version
+    cursor.close()
+    return current
+
+
+def recreate(con):
+    """Accepts a database connection, removes all tables from its database and creates them again with the
+    migrations. Only meant for throwaway databases, such as the one of the benchmark and the tests."""
+    cursor = con.cursor()
+    cursor.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+    tables = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for table in tables:
+        cursor.execute("DROP TABLE `{}`".format(table))
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    cursor.close()
+    return migrate(con)
+
+
+def production_queries(newest_read_id=1):
+    """Returns a list with the name, query and example parameters of every query that the ingest and the web
+    application run for each read, hit or page view. newest_read_id is used as the id of the first read of the last
+    insert batch, from which the new reads are linked to their corresponding reads."""
+    # Imported here, so the migrations can be run without the dependencies of the web application
+    import insert_script
+    import webapp
+
+    queries = [("read lookup", insert_script.READ_LOOKUP_QUERY.format("%s"), ("HWI-M02942:21:1/1",)),
+               ("organism lookup", insert_script.ORGANISM_LOOKUP_QUERY.format("%s"), ("Streptomyces",)),
+               ("protein lookup", insert_script.PROTEIN_LOOKUP_QUERY.format("%s"), ("WP_000000001",)),
+               ("mate lookup", insert_script.MATE_QUERY, ("HWI-M02942:21:1/2",)),
+               ("link new reads", insert_script.LINK_NEW_READS_QUERY, (newest_read_id,)),
+               ("link old mates", insert_script.LINK_OLD_MATES_QUERY, (newest_read_id,)),
+               ("hit", webapp.HIT_DETAIL_QUERY, (1,)),
+               ("read", webapp.READ_QUERY, (1,)),
+               ("taxon count", insert_script.TAXON_COUNT_QUERY, (1, 1)),
+               ("taxon children", webapp.TAXON_CHILDREN_QUERY, (0, webapp.TAXON_LIMIT)),
+               ("taxon rank", webapp.TAXON_RANK_QUERY, ("genus", webapp.TAXON_LIMIT)),
+               ("taxon ranks", webapp.TAXON_RANKS_QUERY, ()),
+               ("taxon lineage", webapp.TAXON_LINEAGE_QUERY, (1,))]
+    for id, query in webapp.GRAPH_QUERIES.items():
+        queries.append(("graph " + id, query, ()))
+    for filters in [("", "", "", ""), ("Streptomyces", "", "", ""), ("", "kinase", "", "10000")]:
+        where, parameters = webapp.search_conditions(*filters)
+        queries.append(("results " + ", ".join(filters), webapp.RESULTS_QUERY.format(where=where),
+                        tuple(parameters) + (webapp.PAGE_SIZE + 1,)))
+    return queries
+
+
+def check_query_plans(cursor):
+    """Accepts a cursor, runs EXPLAIN on every production query and returns a list of messages for every table that
+    would be read with a full table scan. An empty list means all queries can use an index.
+
+    The query planner may decide to scan tables that only have a few rows, so the check should be run against a
+    database with a realistic amount of data. The queries that link new reads are checked for the last batch of
+    reads, like they are run during the ingest.
+    """
+    import insert_script
+    cursor.execute("SELECT MAX(DNA_READ_id) FROM DNA_READ")
+    newest_read_id = max(1, (cursor.fetchone()[0] or 0) - insert_script.BATCH_SIZE + 1)
+    problems = []
+    for name, query, parameters in production_queries(newest_read_id):
+        cursor.execute("EXPLAIN " + query, parameters)
+        columns = cursor.column_names
+        for row in cursor.fetchall():
+            plan = dict(zip(columns, row))
+            if plan.get("type") == "ALL":
+                problems.append("{}: full scan of table {} ({} rows)".format(name, plan.get("table"), plan.get("rows")))
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply the database migrations or check the query plans.")
+    parser.add_argument("--explain", action="store_true",
+                        help="check that no production query needs a full table scan, exits with 1 if one does")
+    args = parser.parse_args()
+    with database.connection() as con:
+        if args.explain:
+            cursor = con.cursor()
+            problems = check_query_plans(cursor)
+            cursor.close()
+            for problem in problems:
+                print(problem)
+            if problems:
+                sys.exit(1)
+            print("All queries use an index.")
+        else:
+            print("The database is at version {}.".format(migrate(con)))
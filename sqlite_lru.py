@@ -0,0 +1,76 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module keeps a table in a local SQLite database as a least recently used cache. It is used by the
+#           annotation cache and the BLAST result cache, which only decide what is stored in the table and how.
+
+import sqlite3
+import threading
+import time
+
+# SQLite allows a limited number of parameters per query, keys are looked up in chunks of this many keys
+CHUNK_SIZE = 500
+
+
+class LruTable:
+    """Table with a text key and the columns given as (name, definition) tuples in the SQLite database file at path.
+
+    The table holds at most max_entries keys. Every row has the time it was last used, when the table holds more
+    than max_entries keys, the least recently used ones are removed. Columns that are missing from an existing table
+    are added to it, so they have to be nullable. The table can be shared by multiple threads.
+    """
+
+    def __init__(self, path, table, key, columns, max_entries):
+        self.table = table
+        self.key = key
+        self.columns = [name for name, definition in columns]
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        with self.con:
+            self.con.execute("CREATE TABLE IF NOT EXISTS {} ({} TEXT PRIMARY KEY, {}, last_used REAL NOT NULL)".format(
+                table, key, ", ".join("{} {}".format(name, definition) for name, definition in columns)))
+            self.con.execute("CREATE INDEX IF NOT EXISTS {0}_last_used ON {0} (last_used)".format(table))
+            existing = [row[1] for row in self.con.execute("PRAGMA table_info({})".format(table))]
+            for name, definition in columns:
+                if name not in existing:
+                    self.con.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, name, definition))
+
+    def get_many(self, keys):
+        """Accepts a list of keys and returns a dictionary with a tuple of the column values of every key that was
+        found in the table. The found keys are marked as recently used.
+        """
+        keys = list(set(keys))
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), CHUNK_SIZE):
+                chunk = keys[start:start + CHUNK_SIZE]
+                rows = self.con.execute("SELECT {}, {} FROM {} WHERE {} IN ({})".format(
+                    self.key, ", ".join(self.columns), self.table, self.key, ", ".join("?" * len(chunk))), chunk)
+                for row in rows:
+                    found[row[0]] = row[1:]
+            if found:
+                now = time.time()
+                with self.con:
+                    self.con.executemany("UPDATE {} SET last_used = ? WHERE {} = ?".format(self.table, self.key),
+                                         [(now, key) for key in found])
+        return found
+
+    def put_many(self, rows):
+        """Accepts a dictionary with keys as keys and tuples of column values as values and stores them in the table.
+        Afterwards the least recently used keys are removed if the table holds more than max_entries keys.
+        """
+        now = time.time()
+        with self.lock, self.con:
+            self.con.executemany("INSERT OR REPLACE INTO {} ({}, {}, last_used) VALUES ({}, ?)".format(
+                self.table, self.key, ", ".join(self.columns), ", ".join("?" * (len(self.columns) + 1))),
+                [(key,) + tuple(values) + (now,) for key, values in rows.items()])
+            excess = self.con.execute("SELECT COUNT(*) FROM {}".format(self.table)).fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.con.execute("DELETE FROM {0} WHERE {1} IN (SELECT {1} FROM {0} ORDER BY last_used LIMIT ?)".format(
+                    self.table, self.key), (excess,))
+
+    def close(self):
+        """Closes the connection with the database."""
+        with self.lock:
+            self.con.close()
@@ -0,0 +1,56 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests the retrieval of protein info and ranked taxonomy lineages by blast_script against the
+#           stub Entrez server of the benchmark module, with and without the annotation cache.
+
+import pytest
+
+pytest.importorskip("Bio")
+pytest.importorskip("numpy")
+
+from Bio import Entrez
+import annotation_cache
+import benchmark
+import blast_script
+import insert_script
+
+
+@pytest.fixture(scope="module")
+def stub():
+    """Starts the stub Entrez server, sends the Entrez requests to it and stops it after the tests."""
+    server = benchmark.start_stub_server()
+    urlopen = Entrez.urlopen
+    benchmark.redirect_entrez(server.entrez_url)
+    yield server
+    Entrez.urlopen = urlopen
+    server.shutdown()
+
+
+def test_lineages_have_the_ranks_of_the_taxonomy_database(stub):
+    codes = [benchmark.protein_accession(protein) for protein in (1, 2, 3, 2)]
+
+    names, comments, organisms, lineages = blast_script.prot_org_info(codes)
+
+    for code, organism, lineage in zip(codes, organisms, lineages):
+        assert lineage == benchmark.protein_annotation(code)[3]
+        assert lineage[-1] == (organism, "species")
+        assert ("Bacteria", "domain") in lineage
+
+
+def test_cached_lineages_keep_their_ranks(stub, tmp_path):
+    codes = [benchmark.protein_accession(protein) for protein in (4, 5)]
+    cache = annotation_cache.AnnotationCache(str(tmp_path / "annotations.sqlite"))
+    try:
+        fetched = blast_script.prot_org_info(codes, cache=cache)
+        assert blast_script.prot_org_info(codes, cache=cache) == fetched
+        assert cache.get_many(codes)[codes[0]][3] == fetched[3][0]
+    finally:
+        cache.close()
+
+
+def test_organisms_outside_their_lineage_get_no_rank():
+    lineage = [("Bacteria", "domain"), ("Streptomyces", "genus")]
+
+    assert insert_script.taxon_path(lineage, "Streptomyces") == lineage
+    assert insert_script.taxon_path(lineage, "Streptomyces albus") == lineage + [("Streptomyces albus", "no rank")]
@@ -0,0 +1,120 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests the batched BLAST search of blast_script against the stub qblast server of the
+#           benchmark module, the mapping of the query results of a batch to the read headers and the split of a
+#           batch over the blastx processes of the local backend.
+
+from concurrent.futures import Future
+from io import StringIO
+import pytest
+
+pytest.importorskip("Bio")
+pytest.importorskip("numpy")
+
+from Bio import SearchIO
+from Bio.Blast import NCBIWWW
+import benchmark
+import blast_script
+
+
+@pytest.fixture(scope="module")
+def stub():
+    """Starts the stub qblast server and stops it after the tests."""
+    server = benchmark.start_stub_server()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def no_qblast_delay(monkeypatch):
+    # qblast waits 20 seconds after its previous search before asking for results, also with other servers
+    monkeypatch.setattr(NCBIWWW.qblast, "previous", 0)
+
+
+def batch_headers(with_hits, without_hits):
+    """Returns read headers of which with_hits get canned hits and without_hits don't, mixed together."""
+    headers = []
+    number = 0
+    while with_hits or without_hits:
+        header = "HWI-M02942:21:{}/1".format(number)
+        number += 1
+        if benchmark.canned_hits(header) and with_hits:
+            headers.append(header)
+            with_hits -= 1
+        elif not benchmark.canned_hits(header) and without_hits:
+            headers.append(header)
+            without_hits -= 1
+    return headers
+
+
+def expected_codes(header):
+    return [benchmark.protein_accession(protein) for protein in benchmark.canned_hits(header)]
+
+
+def test_blast_batch_returns_results_per_header(stub):
+    headers = batch_headers(7, 3)
+    results = blast_script.blast_batch(headers, ["ACGT" * 75] * len(headers), url_base=stub.blast_url)
+
+    assert sorted(results) == sorted(headers)
+    for header in headers:
+        score, query_cover, identity, positives, evalue, protein_codes = results[header]
+        assert protein_codes == expected_codes(header)
+        assert len(score) == len(query_cover) == len(identity) == len(positives) == len(evalue) == len(protein_codes)
+
+
+def test_reads_without_hits_get_empty_lists(stub):
+    headers = batch_headers(1, 2)
+    results = blast_script.blast_batch(headers, ["ACGT" * 75] * len(headers), url_base=stub.blast_url)
+
+    for header in headers:
+        if not expected_codes(header):
+            assert results[header] == ([], [], [], [], [], [])
+
+
+def test_map_qresults_falls_back_on_query_order():
+    # Some BLAST versions name the queries Query_1, Query_2, ... instead of after the FASTA header
+    headers = batch_headers(3, 0)
+    names = ["Query_{}".format(number) for number in range(1, len(headers) + 1)]
+    qresults = SearchIO.parse(StringIO(benchmark.blast_xml(names)), "blast-xml")
+
+    results = blast_script.map_qresults(qresults, headers)
+
+    assert sorted(results) == sorted(headers)
+    for header, name in zip(headers, names):
+        assert results[header][5] == expected_codes(name)
+
+
+def test_map_qresults_adds_missing_headers():
+    headers = batch_headers(2, 0)
+    qresults = SearchIO.parse(StringIO(benchmark.blast_xml(headers[:1])), "blast-xml")
+
+    results = blast_script.map_qresults(qresults, headers)
+
+    assert results[headers[0]][5] == expected_codes(headers[0])
+    assert results[headers[1]] == ([], [], [], [], [], [])
+
+
+class ChunkRecorder:
+    """Executor that runs nothing, but records the number of reads of every chunk submitted to it."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def submit(self, function, headers, seqs, *args):
+        self.chunks.append(len(headers))
+        future = Future()
+        future.set_result({header: ([], [], [], [], [], []) for header in headers})
+        return future
+
+
+@pytest.mark.parametrize("reads, workers, chunks", [(10, 16, [10]), (100, 16, [50, 50]), (800, 16, [50] * 16),
+                                                    (1000, 4, [250] * 4), (75, 1, [75])])
+def test_local_chunks_have_enough_reads_per_process(reads, workers, chunks):
+    executor = ChunkRecorder()
+    headers = ["read{}/1".format(number) for number in range(reads)]
+
+    results = blast_script.local_blast_batch(headers, ["ACGT"] * reads, "nr", executor, workers, chunk_size=50)
+
+    assert executor.chunks == chunks
+    assert sorted(results) == sorted(headers)
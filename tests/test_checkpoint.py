@@ -0,0 +1,79 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests how the CheckpointStore of the checkpoint module claims reads for workers.
+
+import os
+import socket
+import subprocess
+import sys
+import pytest
+
+import checkpoint
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "checkpoints.sqlite")
+
+
+def dead_worker():
+    """Returns the worker id of a process on this host that has already stopped."""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return "{}-{}".format(socket.gethostname(), process.pid)
+
+
+def test_reads_are_claimed_by_one_worker(path):
+    first = checkpoint.CheckpointStore(path, "host-a-1")
+    second = checkpoint.CheckpointStore(path, "host-b-1")
+
+    assert first.claim(["r1", "r2"]) == {"r1", "r2"}
+    assert second.claim(["r1", "r2", "r3"]) == {"r3"}
+    assert second.skipped == 2
+
+
+def test_stored_reads_are_never_claimed_again(path):
+    store = checkpoint.CheckpointStore(path, "host-a-1")
+    store.claim(["r1"])
+    store.set_status(["r1"], checkpoint.STORED)
+
+    assert checkpoint.CheckpointStore(path, "host-b-1").claim(["r1"]) == set()
+
+
+def test_filtered_reads_are_claimed_again(path):
+    # A later run may use a lower minimum quality or length
+    store = checkpoint.CheckpointStore(path, "host-a-1")
+    store.claim(["r1"])
+    store.set_status(["r1"], checkpoint.FILTERED)
+
+    assert checkpoint.CheckpointStore(path, "host-b-1").claim(["r1"]) == {"r1"}
+
+
+def test_expired_claims_are_taken_over(path):
+    checkpoint.CheckpointStore(path, "host-a-1", lease=0).claim(["r1"])
+
+    assert checkpoint.CheckpointStore(path, "host-b-1", lease=0).claim(["r1"]) == {"r1"}
+
+
+def test_claims_of_a_dead_process_on_this_host_are_taken_over(path):
+    checkpoint.CheckpointStore(path, dead_worker()).claim(["r1"])
+
+    store = checkpoint.CheckpointStore(path)
+    assert store.claim(["r1"]) == {"r1"}
+    assert store.skipped == 0
+
+
+def test_claims_of_a_live_process_on_this_host_are_kept(path):
+    checkpoint.CheckpointStore(path, "{}-{}".format(socket.gethostname(), os.getppid())).claim(["r1"])
+
+    assert checkpoint.CheckpointStore(path).claim(["r1"]) == set()
+
+
+def test_release_makes_unfinished_reads_claimable(path):
+    store = checkpoint.CheckpointStore(path, "host-a-1")
+    store.claim(["r1", "r2"])
+    store.set_status(["r1"], checkpoint.STORED)
+    store.release()
+
+    assert checkpoint.CheckpointStore(path, "host-b-1").claim(["r1", "r2"]) == {"r2"}
@@ -0,0 +1,44 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests that the codec module packs and unpacks sequences and qualities without changing them.
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import codec
+
+
+@pytest.mark.parametrize("sequence", ["", "A", "ACGT", "ACGTACGTA", "T" * 301])
+def test_acgt_sequences_use_two_bits_per_base(sequence):
+    packed = codec.encode_sequence(sequence)
+    assert packed[0] == codec.SEQUENCE_2BIT
+    assert len(packed) == codec.SEQUENCE_HEADER.size + -(-len(sequence) // 4)
+    assert codec.decode_sequence(packed) == sequence
+
+
+@pytest.mark.parametrize("sequence, decoded", [("ACGN", "ACGN"), ("ACGRYKM", "ACGRYKM"), ("acgtn", "ACGTN"),
+                                               ("AC-X.", "ACNNN")])
+def test_other_sequences_use_four_bits_per_base(sequence, decoded):
+    packed = codec.encode_sequence(sequence)
+    assert packed[0] == codec.SEQUENCE_4BIT
+    assert codec.decode_sequence(bytearray(packed)) == decoded
+
+
+def test_qualities_round_trip():
+    qualities = "".join(chr(33 + score) for score in range(42)) + "IIIII#####"
+    assert codec.decode_qualities(codec.encode_qualities(qualities)) == qualities
+
+
+def test_binned_qualities_use_the_illumina_bins():
+    qualities = "".join(chr(33 + score) for score in (2, 9, 10, 19, 20, 24, 25, 29, 30, 34, 35, 39, 40, 41))
+    scores = codec.decode_phred_scores(codec.encode_qualities(qualities, binned=True)).tolist()
+    assert scores == [6, 6, 15, 15, 22, 22, 27, 27, 33, 33, 37, 37, 40, 40]
+
+
+def test_unknown_encodings_are_refused():
+    with pytest.raises(ValueError):
+        codec.decode_sequence(b"\x03\x00\x00\x00\x01\x00")
+    with pytest.raises(ValueError):
+        codec.decode_qualities(b"\x07")
@@ -0,0 +1,31 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests how the database module reads the config file.
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+import database
+
+
+def test_missing_config_file_points_to_the_example(tmp_path):
+    with pytest.raises(IOError, match="config.example.ini"):
+        database.read_config(str(tmp_path / "config.ini"))
+
+
+def test_missing_section_is_named(tmp_path):
+    path = tmp_path / "config.ini"
+    path.write_text("[database]\nuser = blast\n")
+
+    with pytest.raises(KeyError, match="benchmark"):
+        database.read_config(str(path), "benchmark")
+
+
+def test_example_config_has_every_section():
+    example = database.os.path.join(database.os.path.dirname(database.CONFIG_FILE), "config.example.ini")
+
+    for section in ("database", "benchmark"):
+        config = database.read_config(example, section)
+        assert set(config) == {"user", "host", "database", "password", "pool_size", "pool_timeout"}
@@ -0,0 +1,102 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests that blast_script only BLASTs sequences of which the results aren't known yet, using the
+#           result cache, and that reads that aren't good enough are left out and marked as filtered.
+
+import pytest
+
+pytest.importorskip("Bio")
+pytest.importorskip("numpy")
+
+import blast_script
+import checkpoint
+import result_cache
+
+
+class RecordingSearch:
+    """Search function that returns a hit named after the sequence and records the sequences it was called with."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, headers, seqs):
+        self.calls.append(list(seqs))
+        return {header: ([1.0], [100.0], [100.0], [100.0], [0.0], [seq]) for header, seq in zip(headers, seqs)}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / "results.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_another_database_misses_the_cache(cache):
+    first = RecordingSearch()
+    blast_script.deduplicated(first, cache, settings=blast_script.search_settings("local", "nr"))(["a/1"], ["ACGT"])
+    second = RecordingSearch()
+    search = blast_script.deduplicated(second, cache, settings=blast_script.search_settings("local", "swissprot"))
+
+    search(["a/1"], ["ACGT"])
+
+    assert second.calls == [["ACGT"]]
+
+
+def test_the_remote_and_local_backend_miss_each_others_results(cache):
+    remote = blast_script.search_settings("remote", blast_script.REMOTE_DATABASE, blast_script.BLAST_URL)
+    blast_script.deduplicated(RecordingSearch(), cache, settings=remote)(["a/1"], ["ACGT"])
+    local = RecordingSearch()
+
+    blast_script.deduplicated(local, cache, settings=blast_script.search_settings("local", "nr"))(["a/1"], ["ACGT"])
+
+    assert local.calls == [["ACGT"]]
+
+
+def test_the_same_settings_hit_the_cache(cache):
+    settings = blast_script.search_settings("local", "nr")
+    blast_script.deduplicated(RecordingSearch(), cache, settings=settings)(["a/1"], ["ACGT"])
+    search = RecordingSearch()
+
+    results = blast_script.deduplicated(search, cache, settings=settings)(["b/1"], ["ACGT"])
+
+    assert search.calls == []
+    assert results["b/1"][5] == ["ACGT"]
+
+
+def test_reverse_complements_and_lower_case_duplicates_are_searched_once(cache):
+    search = RecordingSearch()
+
+    results = blast_script.deduplicated(search, cache)(["a/1", "b/1", "c/1", "d/1"],
+                                                       ["AACGTTGG", "ccaacgtt", "aacgttgg", "TTTT"])
+
+    assert search.calls == [["AACGTTGG", "TTTT"]]
+    assert results["a/1"] == results["b/1"] == results["c/1"]
+    assert results["d/1"][5] == ["TTTT"]
+
+
+def test_batch_of_cache_hits_is_not_searched(cache):
+    blast_script.deduplicated(RecordingSearch(), cache)(["a/1", "b/1"], ["ACGTA", "GGGCC"])
+    search = RecordingSearch()
+
+    results = blast_script.deduplicated(search, cache)(["c/1", "d/1"], ["TACGT", "gggcc"])
+
+    assert search.calls == []
+    assert results["c/1"][5] == ["ACGTA"]
+    assert results["d/1"][5] == ["GGGCC"]
+
+
+def test_reads_below_the_thresholds_are_marked_filtered(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    store = checkpoint.CheckpointStore(path, "host-a-1")
+    reads = [blast_script.Read("good", "ACGTACGT", 240, 30.0, None),
+             blast_script.Read("low_quality", "ACGTACGT", 80, 10.0, None),
+             blast_script.Read("short", "ACG", 90, 30.0, None)]
+    store.claim([read.header for read in reads])
+
+    kept = list(blast_script.filter_reads(iter(reads), min_quality=20, min_length=5, checkpoints=store, chunk_size=1))
+
+    assert [read.header for read in kept] == ["good"]
+    statuses = dict(store.con.execute("SELECT header, status FROM read_status"))
+    assert statuses == {"good": checkpoint.PENDING, "low_quality": checkpoint.FILTERED, "short": checkpoint.FILTERED}
+    store.close()
@@ -0,0 +1,94 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests that insert_read_and_data of the insert_script module passes every value of a read and
+#           its hits to the database as a query parameter, using a cursor that records the queries.
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+pytest.importorskip("numpy")
+
+import insert_script
+
+# Name that would end the string and run another statement if it were put in a query
+NAME = "Escherichia 'coli'); DROP TABLE HIT; --"
+
+
+class RecordingCursor:
+    """Cursor that records the executed queries with their parameters. Lookups find the rows given as existing and
+    every insert gets the next id."""
+
+    def __init__(self, existing=()):
+        self.existing = list(existing)
+        self.executed = []
+        self.lastrowid = 0
+        self.rowcount = 0
+        self.result = []
+
+    def execute(self, query, parameters=()):
+        self.executed.append((query, tuple(parameters)))
+        self.result = []
+        if query.lstrip().startswith("SELECT"):
+            self.result = [(row_id,) for header, row_id in self.existing if header in parameters]
+        elif query.lstrip().startswith("INSERT"):
+            self.lastrowid += 1
+        self.rowcount = 1
+
+    def executemany(self, query, rows):
+        for parameters in rows:
+            self.executed.append((query, tuple(parameters)))
+
+    def fetchall(self):
+        return self.result
+
+
+def hit(name=NAME, comment="", access_code="WP_000000001.1"):
+    """Returns a hit list in the format of insert_hits."""
+    return [55.5, 98.0, 91.5, 95.0, 1e-20, name, "Eiwit '" + name, comment, access_code, [("Bacteria", "domain")]]
+
+
+def test_values_are_never_part_of_the_queries():
+    cursor = RecordingCursor()
+
+    insert_script.insert_read_and_data(cursor, ["read'/1", "ACGT", 120, "IIII"], [hit(), hit(comment=NAME)])
+
+    for query, parameters in cursor.executed:
+        assert "coli" not in query
+        assert "read'" not in query
+    parameters = [value for query, values in cursor.executed for value in values]
+    assert NAME in parameters
+    assert "read'/1" in parameters
+
+
+def test_hits_are_inserted_with_the_ids_of_their_read_organism_and_protein():
+    cursor = RecordingCursor()
+
+    insert_script.insert_read_and_data(cursor, ["r/1", "ACGT", 120], [hit()])
+
+    hits = [parameters for query, parameters in cursor.executed if query == insert_script.HIT_INSERT_QUERY]
+    organism = [query for query, parameters in cursor.executed if "INTO ORGANISME " in query]
+    protein = [parameters for query, parameters in cursor.executed if "INTO EIWIT " in query]
+    assert len(hits) == 1 and len(organism) == 1
+    read_id, organism_id, protein_id = hits[0][:3]
+    assert read_id < organism_id < protein_id
+    assert hits[0][3:] == (55.5, 98.0, 91.5, 95.0, 1e-20)
+    # An empty comment is stored as NULL
+    assert protein == [("Eiwit '" + NAME, None, "WP_000000001.1")]
+
+
+def test_existing_read_is_not_inserted_again():
+    cursor = RecordingCursor(existing=[("r/1", 7)])
+
+    insert_script.insert_read_and_data(cursor, ["r/1", "ACGT", 120], [hit()])
+
+    assert all(not query.lstrip().startswith("INSERT") for query, parameters in cursor.executed)
+
+
+def test_new_read_is_linked_to_its_corresponding_read():
+    cursor = RecordingCursor(existing=[("r/2", 7)])
+
+    read_id = insert_script.insert_read(cursor, ["r/1", "ACGT", 120])
+
+    updates = [parameters for query, parameters in cursor.executed if query.startswith("UPDATE DNA_READ")]
+    assert updates == [(7, read_id), (read_id, 7)]
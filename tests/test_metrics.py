@@ -0,0 +1,61 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests that the Profiler of the metrics module can profile the stages of the pipeline while
+#           they run in multiple threads at the same time.
+
+import pstats
+import threading
+
+import metrics
+
+
+def test_wrapped_stages_run_in_two_threads_at_once(tmp_path):
+    profiler = metrics.Profiler()
+    # Both calls wait for each other, so they are running at the same moment
+    barrier = threading.Barrier(2, timeout=10)
+
+    def stage(number):
+        barrier.wait()
+        return sum(range(1000)) + number
+
+    search, annotate = profiler.wrap(stage), profiler.wrap(stage)
+    results = {}
+    errors = []
+
+    def call(function, number):
+        try:
+            results[number] = function(number)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(function, number))
+               for number, function in enumerate((search, annotate))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results == {0: 499500, 1: 499501}
+    assert profiler.unprofiled == 1
+    path = str(tmp_path / "profile.out")
+    profiler.dump(path)
+    assert any(name == "stage" for filename, line, name in pstats.Stats(path).stats)
+
+
+def test_nested_wrapped_calls_are_profiled_once():
+    profiler = metrics.Profiler()
+    inner = profiler.wrap(lambda: 1)
+    outer = profiler.wrap(lambda: inner() + 1)
+
+    assert outer() == 2
+    assert profiler.unprofiled == 0
+    assert len(profiler.profiles) == 1
+
+
+def test_wrap_iterator_profiles_every_item():
+    profiler = metrics.Profiler()
+
+    assert list(profiler.wrap_iterator(iter([1, 2, 3]))) == [1, 2, 3]
+    assert len(profiler.profiles) == 1
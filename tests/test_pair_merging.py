@@ -0,0 +1,73 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests the merging of overlapping forward and reverse reads by the pair_merging module.
+
+import random
+import pytest
+
+pytest.importorskip("numpy")
+
+import pair_merging
+from blast_script import Read
+from codec import reverse_complement
+
+
+def make_read(header, sequence, quality="I"):
+    return Read(header, sequence, 0, 0.0, quality * len(sequence))
+
+
+@pytest.fixture
+def fragment():
+    generator = random.Random(10)
+    return "".join(generator.choice("ACGT") for _ in range(250))
+
+
+def test_find_overlap_returns_the_longest_overlap(fragment):
+    assert pair_merging.find_overlap(fragment[:150], fragment[100:]) == 50
+
+
+def test_find_overlap_allows_some_mismatches(fragment):
+    reverse = list(fragment[100:])
+    reverse[10] = "A" if reverse[10] != "A" else "C"
+    assert pair_merging.find_overlap(fragment[:150], "".join(reverse), max_mismatch_rate=0.1) == 50
+    assert pair_merging.find_overlap(fragment[:150], "".join(reverse), max_mismatch_rate=0.0) == 0
+
+
+def test_find_overlap_needs_min_overlap_bases(fragment):
+    assert pair_merging.find_overlap(fragment[:150], fragment[140:], min_overlap=20) == 0
+
+
+def test_merge_pair_rebuilds_the_fragment(fragment):
+    forward = make_read("read/1", fragment[:150])
+    reverse = make_read("read/2", reverse_complement(fragment[100:]))
+
+    merged = pair_merging.merge_pair(forward, reverse)
+
+    assert merged.sequence == fragment
+    assert merged.header == "read/1"
+    assert merged.mates == (forward, reverse)
+    assert len(merged.qualities) == len(fragment)
+
+
+def test_merge_pair_takes_the_base_with_the_highest_quality(fragment):
+    forward_sequence = list(fragment[:150])
+    forward_sequence[120] = "A" if fragment[120] != "A" else "C"
+    forward = Read("read/1", "".join(forward_sequence), 0, 0.0, "5" * 150)
+    reverse = make_read("read/2", reverse_complement(fragment[100:]))
+
+    merged = pair_merging.merge_pair(forward, reverse)
+
+    assert merged.sequence == fragment
+    # Quality 40 of the reverse read minus quality 20 of the forward read
+    assert ord(merged.qualities[120]) - 33 == 20
+
+
+def test_merge_pairs_keeps_pairs_without_overlap_separate(fragment):
+    forward = make_read("a/1", fragment[:100])
+    reverse = make_read("a/2", reverse_complement(fragment[150:]))
+    unpaired = make_read("b/1", fragment[:50])
+
+    reads = list(pair_merging.merge_pairs([forward, unpaired, reverse]))
+
+    assert sorted(read.header for read in reads) == ["a/1", "a/2", "b/1"]
@@ -0,0 +1,151 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests how run_pipeline of the pipeline module passes reads through the stages and how the
+#           TokenBucket spreads requests over time.
+
+import threading
+import pytest
+
+import pipeline
+
+
+def make_reads(count):
+    """Returns a list of count reads with the headers r0, r1, ... and short sequences."""
+    return [("r{}".format(number), "ACGT" * (number + 1)) for number in range(count)]
+
+
+def search_all(headers, seqs):
+    """Search stage that returns one hit with the sequence length for every header."""
+    return {header: [len(seq)] for header, seq in zip(headers, seqs)}
+
+
+def test_reads_pass_all_stages_in_order():
+    reads = make_reads(25)
+    stored = []
+
+    pipeline.run_pipeline(reads, search_all, lambda read, blast_data: read[0].upper(),
+                          lambda read, blast_data, annotation: stored.append((read[0], blast_data, annotation)),
+                          batch_size=4, search_workers=1, annotate_workers=1, store_workers=1, queue_size=2)
+
+    assert stored == [(header, [len(seq)], header.upper()) for header, seq in reads]
+
+
+def test_every_read_is_stored_once_with_multiple_workers():
+    reads = make_reads(40)
+    stored = []
+    lock = threading.Lock()
+
+    def store(read, blast_data, annotation):
+        with lock:
+            stored.append(read[0])
+
+    pipeline.run_pipeline(reads, search_all, lambda read, blast_data: None, store, batch_size=3, search_workers=2,
+                          annotate_workers=3, store_workers=2, queue_size=2)
+
+    assert sorted(stored) == sorted(header for header, seq in reads)
+
+
+def test_stage_exception_reaches_the_caller_without_leaking_threads():
+    before = set(threading.enumerate())
+
+    def annotate(read, blast_data):
+        if read[0] == "r7":
+            raise ValueError("annotation failed")
+
+    with pytest.raises(ValueError, match="annotation failed"):
+        pipeline.run_pipeline(make_reads(200), search_all, annotate, lambda *item: None, batch_size=2, queue_size=2)
+
+    assert set(threading.enumerate()) == before
+
+
+def test_input_exception_reaches_the_caller_without_leaking_threads():
+    before = set(threading.enumerate())
+
+    def reads():
+        yield from make_reads(3)
+        raise IOError("broken FASTQ file")
+
+    with pytest.raises(IOError, match="broken FASTQ file"):
+        pipeline.run_pipeline(reads(), search_all, lambda *item: None, lambda *item: None, batch_size=2)
+
+    assert set(threading.enumerate()) == before
+
+
+def test_slow_stage_holds_up_reading():
+    release = threading.Event()
+    searching = threading.Event()
+    consumed = []
+    stored = []
+
+    def reads():
+        for read in make_reads(50):
+            consumed.append(read[0])
+            yield read
+
+    def search(headers, seqs):
+        searching.set()
+        release.wait(10)
+        return search_all(headers, seqs)
+
+    runner = threading.Thread(target=pipeline.run_pipeline, args=(
+        reads(), search, lambda *item: None, lambda read, blast_data, annotation: stored.append(read[0])),
+        kwargs={"batch_size": 1, "search_workers": 1, "queue_size": 2})
+    runner.start()
+    assert searching.wait(10)
+    # Give the reader time to fill the queue, it has to stop there instead of reading all reads
+    runner.join(0.5)
+    # One batch is being searched, two are queued and one is waiting to be put in the queue
+    assert len(consumed) <= 4
+
+    release.set()
+    runner.join(10)
+    assert not runner.is_alive()
+    assert sorted(stored) == sorted(header for header, seq in make_reads(50))
+
+
+class FakeClock:
+    """Replaces the time module of the pipeline module, sleeping only moves the clock forward."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(pipeline, "time", clock)
+    return clock
+
+
+def test_token_bucket_spreads_requests_at_rate(clock):
+    bucket = pipeline.TokenBucket(rate=3, capacity=1)
+    times = []
+    for _ in range(7):
+        bucket.acquire()
+        times.append(clock.now - 1000.0)
+
+    assert times == pytest.approx([0, 1 / 3, 2 / 3, 1, 4 / 3, 5 / 3, 2])
+
+
+def test_token_bucket_allows_bursts_up_to_capacity(clock):
+    bucket = pipeline.TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 1000.0
+
+    bucket.acquire()
+    assert clock.now == pytest.approx(1000.5)
+
+    # A long pause refills the bucket to its capacity, not beyond it
+    clock.now += 60
+    start = clock.now
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now - start == pytest.approx(0.5)
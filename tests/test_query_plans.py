@@ -0,0 +1,156 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests that no production query of the ingest or the web application needs a full table scan.
+#           The tables are created in the local database of the [benchmark] section of config.ini, which is emptied
+#           first, and filled with enough rows for the query planner to choose the same plans as on real data.
+#           The tests are skipped when that database can't be reached.
+
+import random
+import pytest
+
+mysql = pytest.importorskip("mysql.connector")
+pytest.importorskip("flask")
+
+import codec
+import database
+import schema
+
+# Number of read pairs, organisms, proteins and hits per read of the seeded database
+READ_PAIRS = 10000
+ORGANISMS = 2000
+PROTEINS = 5000
+HITS_PER_READ = 3
+# Number of children of every taxon above the organisms: phyla, classes and genera
+TAXON_BRANCHES = (10, 5, 4)
+# Rank of the taxa at every depth of the tree, the organisms are species
+TAXON_RANKS = ("domain", "phylum", "class", "genus")
+# Number of rows per INSERT statement
+CHUNK_SIZE = 2000
+
+WORDS = ["kinase", "transporter", "oxidoreductase", "synthase", "hydrolase", "regulator", "permease", "reductase"]
+
+
+@pytest.fixture(scope="module")
+def cursor():
+    """Empties and seeds the benchmark database and yields a cursor on it.
+
+    The connection is opened outside the pool of the database module, which may already be bound to the real
+    database, and it is checked to be connected to the benchmark database before any table is dropped.
+    """
+    try:
+        config = database.read_config(database.CONFIG_FILE, "benchmark")
+        config.pop("pool_size", None)
+        config.pop("pool_timeout", None)
+        con = mysql.connect(**config)
+    except (mysql.Error, IOError, KeyError) as e:
+        pytest.skip("The local benchmark database can't be reached: {}".format(e))
+    try:
+        cursor = con.cursor()
+        cursor.execute("SELECT DATABASE()")
+        assert cursor.fetchone()[0] == config["database"]
+        try:
+            assert config["database"] != database.read_config(database.CONFIG_FILE, "database")["database"]
+        except KeyError:
+            # The config file has no real database to confuse the benchmark database with
+            pass
+        schema.recreate(con)
+        seed(cursor, random.Random(10))
+        con.commit()
+        yield cursor
+        cursor.close()
+    finally:
+        con.close()
+
+
+def insert_rows(cursor, query, rows):
+    """Inserts the rows with the query in chunks of CHUNK_SIZE rows."""
+    for start in range(0, len(rows), CHUNK_SIZE):
+        cursor.executemany(query, rows[start:start + CHUNK_SIZE])
+
+
+def seed(cursor, generator):
+    """Fills the tables with a taxonomy tree, organisms, proteins, read pairs and their hits and brings the summary
+    tables and the statistics of the query planner up to date."""
+    taxa = [(1, "Bacteria", 0, 0, TAXON_RANKS[0])]
+    closure = [(1, 1, 0)]
+    ancestors = {1: [1]}
+    level = [1]
+    for depth, branches in enumerate(TAXON_BRANCHES, 1):
+        next_level = []
+        for parent_id in level:
+            for number in range(branches):
+                taxon_id = len(taxa) + 1
+                taxa.append((taxon_id, "Taxon {}-{}".format(depth, taxon_id), parent_id, depth, TAXON_RANKS[depth]))
+                ancestors[taxon_id] = ancestors[parent_id] + [taxon_id]
+                next_level.append(taxon_id)
+        level = next_level
+    organisms = []
+    for organism_id in range(1, ORGANISMS + 1):
+        taxon_id = len(taxa) + 1
+        parent_id = generator.choice(level)
+        name = "Genus{} species{}".format(parent_id, organism_id)
+        taxa.append((taxon_id, name, parent_id, len(TAXON_BRANCHES) + 1, "species"))
+        ancestors[taxon_id] = ancestors[parent_id] + [taxon_id]
+        organisms.append((organism_id, name, taxon_id))
+    for taxon_id, path in ancestors.items():
+        for distance, ancestor_id in enumerate(reversed(path)):
+            closure.append((ancestor_id, taxon_id, distance))
+    insert_rows(cursor, "INSERT INTO TAXON (TAXON_id, Naam, Ouder_id, Diepte, Rang) VALUES (%s, %s, %s, %s, %s)",
+                taxa)
+    insert_rows(cursor, "INSERT INTO TAXON_PAD (Voorouder_id, Afstammeling_id, Afstand) VALUES (%s, %s, %s)",
+                closure)
+    insert_rows(cursor, "INSERT INTO ORGANISME (ORGANISME_id, Organisme_naam, TAXON_id) VALUES (%s, %s, %s)",
+                organisms)
+
+    proteins = []
+    for protein_id in range(1, PROTEINS + 1):
+        comment = "REFSEQ: protein {}".format(protein_id) if generator.random() < 0.5 else None
+        proteins.append((protein_id, "{} {}".format(generator.choice(WORDS), protein_id), comment,
+                         "WP_{:09d}".format(protein_id)))
+    insert_rows(cursor, "INSERT INTO EIWIT (EIWIT_id, Naam, Eiwit_comment, Accessiecode) VALUES (%s, %s, %s, %s)",
+                proteins)
+
+    reads = []
+    hits = []
+    for pair in range(READ_PAIRS):
+        for mate in (1, 2):
+            read_id = 2 * pair + mate
+            mate_id = read_id + 1 if mate == 1 else read_id - 1
+            sequence = "".join(generator.choice("ACGT") for _ in range(150))
+            reads.append((read_id, "HWI-M02942:21:{}/{}".format(pair, mate), codec.encode_sequence(sequence),
+                          generator.randint(2000, 12000), mate_id))
+            for _ in range(HITS_PER_READ):
+                hits.append((read_id, generator.randint(1, ORGANISMS), generator.randint(1, PROTEINS),
+                             generator.uniform(20, 200), generator.uniform(10, 100), generator.uniform(20, 100),
+                             generator.uniform(20, 100), generator.uniform(0, 1)))
+    # The reads refer to each other, so they are inserted without checking the foreign keys
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    insert_rows(cursor, """
+      INSERT INTO DNA_READ (DNA_READ_id, Header, Sequentie, Quality_score, For_rev_id)
+      VALUES (%s, %s, %s, %s, %s)""", reads)
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    insert_rows(cursor, """
+      INSERT INTO HIT (DNA_READ_id, ORGANISME_id, EIWIT_id, Score, Query_cover, Identity, Positives, E_value)
+      VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", hits)
+
+    schema.rebuild_summaries(cursor)
+    schema.rebuild_taxon_counts(cursor)
+    for table in ("DNA_READ", "ORGANISME", "EIWIT", "HIT", "ORGANISME_TELLING", "EIWIT_TELLING", "TAXON",
+                  "TAXON_PAD", "TAXON_TELLING"):
+        cursor.execute("ANALYZE TABLE {}".format(table))
+        cursor.fetchall()
+
+
+def test_no_full_table_scans(cursor):
+    assert schema.check_query_plans(cursor) == []
+
+
+def test_link_queries_only_read_new_reads(cursor):
+    # The link queries of the last batch must read the new reads from a range of the primary key
+    newest_read_id = 2 * READ_PAIRS - 49
+    for name, query, parameters in schema.production_queries(newest_read_id):
+        if name.startswith("link"):
+            cursor.execute("EXPLAIN " + query, parameters)
+            types = [dict(zip(cursor.column_names, row))["type"] for row in cursor.fetchall()]
+            assert "range" in types and "ALL" not in types, name
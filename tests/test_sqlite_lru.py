@@ -0,0 +1,58 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests the least recently used table of the sqlite_lru module that the annotation cache and
+#           the BLAST result cache are stored in.
+
+import sqlite3
+import pytest
+
+import sqlite_lru
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+def test_values_round_trip(path):
+    table = sqlite_lru.LruTable(path, "item", "key", [("a", "TEXT NOT NULL"), ("b", "TEXT")], 10)
+    table.put_many({"k1": ("x", None), "k2": ("y", "z")})
+
+    assert table.get_many(["k1", "k2", "k3"]) == {"k1": ("x", None), "k2": ("y", "z")}
+    table.close()
+
+
+def test_least_recently_used_keys_are_removed(path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(sqlite_lru.time, "time", lambda: next(clock))
+    table = sqlite_lru.LruTable(path, "item", "key", [("a", "TEXT")], 2)
+    table.put_many({"k1": ("1",)})
+    table.put_many({"k2": ("2",)})
+    table.get_many(["k1"])
+    table.put_many({"k3": ("3",)})
+
+    assert sorted(table.get_many(["k1", "k2", "k3"])) == ["k1", "k3"]
+    table.close()
+
+
+def test_missing_columns_are_added(path):
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE item (key TEXT PRIMARY KEY, a TEXT, last_used REAL NOT NULL)")
+    con.execute("INSERT INTO item VALUES ('k1', 'x', 0)")
+    con.commit()
+    con.close()
+
+    table = sqlite_lru.LruTable(path, "item", "key", [("a", "TEXT"), ("b", "TEXT")], 10)
+
+    assert table.get_many(["k1"]) == {"k1": ("x", None)}
+    table.close()
+
+
+def test_more_keys_than_sqlite_parameters(path):
+    table = sqlite_lru.LruTable(path, "item", "key", [("a", "TEXT")], 10000)
+    keys = ["k{}".format(number) for number in range(3 * sqlite_lru.CHUNK_SIZE)]
+    table.put_many({key: (key,) for key in keys})
+
+    assert len(table.get_many(keys)) == len(keys)
+    table.close()
@@ -0,0 +1,342 @@
+# Version:  1.0
+# Date:     17-10-2026
+# Author:   Project group 10
+# Function: This module tests the web application against a stub cursor instead of the mysql database, so the
+#           search queries, the paging of the results page and the exports can be checked without a database server.
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("matplotlib")
+
+import webapp
+
+
+class StubCursor:
+    """Cursor that records the executed queries and answers the results query from a list of hit rows.
+
+    Every row has the columns of RESULTS_QUERY. The rows are ordered and the after condition and limit are applied
+    like mysql would, so the pages returned by result_retriever can be compared with the full list of hits."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.executed = []
+        self.result = []
+
+    def execute(self, query, parameters=()):
+        self.executed.append((query, list(parameters)))
+        rows = sorted(self.rows, key=lambda row: (row[3], row[4], row[5], row[0]), reverse=True)
+        if "h.HIT_id) < (" in query:
+            after = tuple(parameters[-5:-1])
+            rows = [row for row in rows if (row[3], row[4], row[5], row[0]) < after]
+        self.result = rows[:parameters[-1]]
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cursor(monkeypatch):
+    cursor = StubCursor()
+    monkeypatch.setattr(webapp, "makecon", lambda: (cursor, None))
+    monkeypatch.setattr(webapp, "closecon", lambda cursor, con: None)
+    return cursor
+
+
+def hit_row(hit_id, score, query_cover=100.0, identity=90.0):
+    """Returns a row of the results query for a hit with the given id and values."""
+    return (hit_id, "Organisme {}".format(hit_id), "Eiwit {} [Organisme]".format(hit_id), score, query_cover,
+            identity, 1e-10)
+
+
+@pytest.mark.parametrize("after", [None, "", "abc", "1,2,3", "1,2,3,4,5", "1,2,3,x", "1,2,3,4.5", "a,b,c,d"])
+def test_malformed_after_shows_the_first_page(after):
+    assert webapp.parse_after(after) is None
+
+
+def test_after_is_parsed():
+    assert webapp.parse_after("55.5,100.0,87.25,12") == (55.5, 100.0, 87.25, 12)
+
+
+@pytest.mark.parametrize("page_size, limit", [(0, 1), (-5, 1), (1, 1), (50, 50),
+                                              (webapp.MAX_PAGE_SIZE + 1, webapp.MAX_PAGE_SIZE)])
+def test_page_size_is_limited(cursor, page_size, limit):
+    webapp.result_retriever("", "", "", "", page_size=page_size)
+
+    # One row more than the page is asked for, to know whether there is a next page
+    assert cursor.executed[-1][1][-1] == limit + 1
+
+
+def test_pages_with_tied_scores_neither_skip_nor_repeat_hits(cursor):
+    cursor.rows = [hit_row(hit_id, score=50.0 if hit_id % 3 else 80.0, query_cover=100.0 if hit_id % 2 else 90.0)
+                   for hit_id in range(1, 24)]
+    expected = [row[0] for row in sorted(cursor.rows, key=lambda row: (row[3], row[4], row[5], row[0]),
+                                         reverse=True)]
+
+    seen = []
+    after = None
+    while True:
+        result_list, next_after = webapp.result_retriever("", "", "", "", after, page_size=4)
+        seen.extend(result[0] for result in result_list)
+        if next_after is None:
+            break
+        # The cursor goes through the url of the next page
+        after = webapp.parse_after(",".join(str(value) for value in next_after))
+
+    assert seen == expected
+
+
+def test_last_full_page_has_no_next_page(cursor):
+    cursor.rows = [hit_row(hit_id, score=50.0) for hit_id in range(1, 5)]
+
+    result_list, next_after = webapp.result_retriever("", "", "", "", page_size=4)
+
+    assert len(result_list) == 4
+    assert next_after is None
+
+
+def test_next_page_starts_after_the_last_hit(cursor):
+    cursor.rows = [hit_row(hit_id, score=50.0) for hit_id in range(1, 6)]
+
+    result_list, next_after = webapp.result_retriever("", "", "", "", page_size=2)
+
+    assert [result[0] for result in result_list] == [5, 4]
+    assert next_after == (50.0, 100.0, 90.0, 4)
+
+
+def normalized(where):
+    """Returns a WHERE clause with every run of whitespace replaced by a single space."""
+    return " ".join(where.split())
+
+
+def test_empty_fields_only_need_a_comment():
+    where, parameters = webapp.search_conditions("", "", "", "")
+
+    assert normalized(where) == "WHERE r.Quality_score > %s AND e.Eiwit_comment IS NOT NULL"
+    assert parameters == [0]
+
+
+@pytest.mark.parametrize("read_quality, minimum", [("", 0), ("25", 25), ("abc", 0), ("2.5", 0)])
+def test_read_quality_is_an_integer(read_quality, minimum):
+    where, parameters = webapp.search_conditions("", "", "", read_quality)
+
+    assert parameters[0] == minimum
+
+
+@pytest.mark.parametrize("field, alias, column", [(0, "o", "Organisme_naam"), (1, "e", "Naam"),
+                                                  (2, "e", "Eiwit_comment")])
+def test_terms_shorter_than_the_ngram_size_use_like(field, alias, column):
+    term = "x" * (webapp.NGRAM_SIZE - 1)
+    terms = ["", "", "comment"]
+    terms[field] = term
+
+    where, parameters = webapp.search_conditions(*terms, read_quality="")
+
+    assert "AND {}.{} LIKE %s".format(alias, column) in normalized(where)
+    assert "MATCH({})".format(column) not in where
+    assert "%" + term + "%" in parameters
+
+
+@pytest.mark.parametrize("field, condition", [
+    (0, "AND o.ORGANISME_id IN (SELECT ORGANISME_id FROM ORGANISME WHERE MATCH(Organisme_naam) AGAINST "
+        "(%s IN BOOLEAN MODE) AND Organisme_naam LIKE %s)"),
+    (1, "AND e.EIWIT_id IN (SELECT EIWIT_id FROM EIWIT WHERE MATCH(Naam) AGAINST (%s IN BOOLEAN MODE) "
+        "AND Naam LIKE %s)"),
+    (2, "AND e.EIWIT_id IN (SELECT EIWIT_id FROM EIWIT WHERE MATCH(Eiwit_comment) AGAINST (%s IN BOOLEAN MODE) "
+        "AND Eiwit_comment LIKE %s)")])
+def test_longer_terms_use_the_fulltext_index(field, condition):
+    terms = ["", "", "comment"]
+    terms[field] = 'DNA "polymerase'
+
+    where, parameters = webapp.search_conditions(*terms, read_quality="")
+
+    assert condition in normalized(where)
+    # The term is searched as a phrase, quotes in the term itself can't end the phrase
+    index = parameters.index('"DNA  polymerase"')
+    assert parameters[index + 1] == '%DNA "polymerase%'
+
+
+def test_every_parameter_has_a_placeholder():
+    where, parameters = webapp.search_conditions("Escherichia", "a", "kinase", "30")
+
+    assert where.count("%s") == len(parameters)
+    assert parameters == [30, '"Escherichia"', "%Escherichia%", "%a%", '"kinase"', "%kinase%"]
+
+
+class ExportConnection:
+    """Connection of an export, its cursor returns the given rows of the export query in chunks."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.executed = []
+        self.closed = False
+
+    def cursor(self, buffered=True):
+        assert not buffered
+        return self
+
+    def execute(self, query, parameters=()):
+        self.executed.append((query, list(parameters)))
+
+    def fetchmany(self, size):
+        rows = self.rows[:size]
+        self.rows = self.rows[size:]
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+def export_row(hit_id):
+    """Returns a row of the export query for a hit with the given id."""
+    return (hit_id, "read/{}".format(hit_id), 30 + hit_id, "Organisme, {}".format(hit_id), "Eiwit {}".format(hit_id),
+            "WP_{:09d}.1".format(hit_id), None, 50.0 + hit_id, 100.0, 90.5, 95.0, 1e-20)
+
+
+@pytest.fixture
+def export_connection(monkeypatch):
+    connection = ExportConnection([export_row(hit_id) for hit_id in range(1, 8)])
+    monkeypatch.setattr(webapp.database, "open_connection", lambda: connection)
+    monkeypatch.setattr(webapp, "EXPORT_CHUNK_SIZE", 3)
+    monkeypatch.setattr(webapp, "EXPORT_SLOTS", webapp.threading.BoundedSemaphore(webapp.MAX_EXPORTS))
+    return connection
+
+
+@pytest.fixture
+def client():
+    return webapp.app.test_client()
+
+
+def test_csv_export(client, export_connection):
+    response = client.get("/export?format=csv&organism=Escherichia&read_quality=20")
+    body = response.get_data(as_text=True)
+    response.close()
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "text/csv; charset=utf-8"
+    assert response.headers["Content-Disposition"] == "attachment; filename=hits.csv"
+    rows = list(webapp.csv.reader(webapp.StringIO(body)))
+    assert rows[0] == webapp.EXPORT_COLUMNS
+    assert [row[0] for row in rows[1:]] == [str(hit_id) for hit_id in range(1, 8)]
+    assert rows[1][3] == "Organisme, 1"
+    query, parameters = export_connection.executed[-1]
+    assert parameters[:3] == [20, '"Escherichia"', "%Escherichia%"]
+    assert export_connection.closed
+
+
+def test_jsonl_export(client, export_connection):
+    response = client.get("/export?format=jsonl")
+    lines = response.get_data(as_text=True).splitlines()
+    response.close()
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    assert response.headers["Content-Disposition"] == "attachment; filename=hits.jsonl"
+    records = [webapp.json.loads(line) for line in lines]
+    assert [record["hit_id"] for record in records] == list(range(1, 8))
+    assert records[0] == dict(zip(webapp.EXPORT_COLUMNS, export_row(1)))
+
+
+def test_parquet_export(client, export_connection):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    if webapp.pyarrow is None:
+        pytest.skip("webapp was imported without pyarrow")
+
+    response = client.get("/export?format=parquet")
+    data = response.get_data()
+    response.close()
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/vnd.apache.parquet"
+    assert response.headers["Content-Disposition"] == "attachment; filename=hits.parquet"
+    parquet_file = parquet.ParquetFile(webapp.BytesIO(data))
+    # Every chunk of EXPORT_CHUNK_SIZE rows is a row group of its own
+    assert parquet_file.metadata.num_row_groups == 3
+    table = parquet_file.read()
+    assert table.column_names == webapp.EXPORT_COLUMNS
+    assert table.column("hit_id").to_pylist() == list(range(1, 8))
+    assert table.column("comment").to_pylist() == [None] * 7
+
+
+def test_unknown_export_format_is_refused(client, export_connection):
+    response = client.get("/export?format=xlsx")
+
+    assert response.status_code == 400
+    assert export_connection.executed == []
+
+
+def test_export_is_refused_when_all_slots_are_taken(client, export_connection):
+    for _ in range(webapp.MAX_EXPORTS):
+        assert webapp.EXPORT_SLOTS.acquire(blocking=False)
+
+    response = client.get("/export?format=csv")
+
+    assert response.status_code == 503
+    assert export_connection.executed == []
+
+
+def test_finished_export_gives_its_slot_back(client, export_connection):
+    for _ in range(webapp.MAX_EXPORTS + 1):
+        response = client.get("/export?format=jsonl")
+        response.get_data()
+        response.close()
+        assert response.status_code == 200
+
+
+class GraphCursor:
+    """Cursor that returns the given version of the HIT table and rows of a graph query."""
+
+    def __init__(self, version, rows=()):
+        self.version = version
+        self.rows = list(rows)
+
+    def execute(self, query, parameters=()):
+        pass
+
+    def fetchone(self):
+        return (self.version,)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        pass
+
+
+def test_making_one_graph_does_not_hold_up_the_others(monkeypatch):
+    rendering = webapp.threading.Event()
+    release = webapp.threading.Event()
+
+    def makegraph(cursor, id, version):
+        if id == 'soorten':
+            rendering.set()
+            release.wait(10)
+        return {'version': version, 'checked': webapp.time.time(), 'id': id}
+
+    monkeypatch.setattr(webapp, "GRAPH_CACHE", {})
+    monkeypatch.setattr(webapp, "makegraph", makegraph)
+    monkeypatch.setattr(webapp, "makecon", lambda: (GraphCursor(1), None))
+    monkeypatch.setattr(webapp, "closecon", lambda cursor, con: None)
+    slow = webapp.threading.Thread(target=webapp.get_graph, args=('soorten',))
+    slow.start()
+    try:
+        assert rendering.wait(10)
+        assert webapp.get_graph('eiwitten')['id'] == 'eiwitten'
+    finally:
+        release.set()
+        slow.join(10)
+    assert webapp.get_graph('soorten')['id'] == 'soorten'
+
+
+
+def test_graph_is_made_with_an_aware_modification_time():
+    cursor = GraphCursor(7, [(30, "Escherichia coli"), (12, "Bacillus subtilis")])
+
+    graph = webapp.makegraph(cursor, 'soorten', 7)
+
+    assert graph['mostcommon'] == ["Escherichia coli", "Bacillus subtilis"]
+    assert graph['png'].startswith(b"\x89PNG")
+    assert graph['last_modified'].tzinfo is webapp.timezone.utc
@@ -6,37 +6,169 @@
 #           found organisms is shown and has the options to display a graph with the most found proteins
 #           and to search the database and display the results in an organised manner.
 
-from flask import Flask, render_template, request, redirect, url_for
-import mysql.connector as mscon
+from flask import Flask, render_template, request, redirect, url_for, abort, make_response, Response, \
+    stream_with_context, jsonify, g
+import codec
+import csv
+import database
+import hashlib
+import json
+import metrics
 import os
 import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 os.environ['MPLCONFIGDIR'] = tempfile.mkdtemp()
 import matplotlib
 matplotlib.use('Agg')
-from matplotlib import pyplot as plt
-from io import BytesIO
-import base64
+from matplotlib.figure import Figure
+from io import BytesIO, RawIOBase, StringIO
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    # Exports in the Parquet format are only possible when pyarrow is installed
+    pyarrow = None
 
 app = Flask(__name__)
 
 # Dictionary with info about the graph
 GRAPHS = { 'soorten':
-{       'html': '',
-        'title': 'Soorten',
+{       'title': 'Soorten',
         'description': 'Meest voorkomende soorten'},
           'eiwitten':
- {      'html': '',
-        'title': 'Soorten',
+ {      'title': 'Soorten',
         'description': 'Meest voorkomende soorten'}
           }
 
+# Queries for the 10 most found organisms and proteins, read from the summary tables that insert_script keeps up to date
+GRAPH_QUERIES = {
+    'soorten': """SELECT t.Aantal, o.Organisme_naam FROM ORGANISME_TELLING t NATURAL JOIN ORGANISME o
+                  ORDER BY t.Aantal desc LIMIT 10""",
+    'eiwitten': "SELECT Aantal, Naam FROM EIWIT_TELLING ORDER BY Aantal desc LIMIT 10"}
+
+# Rendered graphs per id together with the version of the HIT table they were made for. Every graph has a lock of
+# its own, so making one graph doesn't hold up requests for the other graphs
+GRAPH_CACHE = {}
+GRAPH_LOCKS = {id: threading.Lock() for id in GRAPHS}
+# Number of seconds a rendered graph is used before checking whether new hits were added
+GRAPH_CHECK_INTERVAL = 10
+
+# Queries of the search results, {where} is filled in with the conditions made by search_conditions
+RESULTS_QUERY = """
+  SELECT h.HIT_id, o.Organisme_naam, e.Naam, h.Score, h.Query_cover, h.Identity, h.E_value FROM HIT h
+  NATURAL JOIN ORGANISME o
+  NATURAL JOIN EIWIT e
+  NATURAL JOIN DNA_READ r{where}
+  ORDER BY h.Score desc, h.Query_cover desc, h.Identity desc, h.HIT_id desc
+  LIMIT %s"""
+COUNT_QUERY = """
+  SELECT count(*) FROM HIT h
+  NATURAL JOIN ORGANISME o
+  NATURAL JOIN EIWIT e
+  NATURAL JOIN DNA_READ r{where}"""
+
+# Query of the hit page, returns the hit itself in the first columns and in the last columns one row for every hit
+# of the read and of its corresponding forward or reverse read, the rows of the read itself come first. The packed
+# sequences and qualities aren't read here, they are only unpacked when the read page asks for them
+HIT_DETAIL_QUERY = """
+  SELECT e.Naam, o.Organisme_naam, h.Score, h.Query_cover, h.Identity, h.Positives, h.E_value, e.Eiwit_comment,
+  e.Accessiecode, r.For_rev_id, rr.DNA_READ_id = r.DNA_READ_id, rr.Header, rr.Quality_score, e2.Naam, h2.HIT_id,
+  o2.Organisme_naam, rr.DNA_READ_id
+  FROM HIT h
+  JOIN DNA_READ r ON r.DNA_READ_id = h.DNA_READ_id
+  JOIN ORGANISME o ON o.ORGANISME_id = h.ORGANISME_id
+  JOIN EIWIT e ON e.EIWIT_id = h.EIWIT_id
+  JOIN DNA_READ rr ON rr.DNA_READ_id IN (r.DNA_READ_id, r.For_rev_id)
+  LEFT JOIN HIT h2 ON h2.DNA_READ_id = rr.DNA_READ_id
+  LEFT JOIN EIWIT e2 ON e2.EIWIT_id = h2.EIWIT_id
+  LEFT JOIN ORGANISME o2 ON o2.ORGANISME_id = h2.ORGANISME_id
+  WHERE h.HIT_id = %s
+  ORDER BY rr.DNA_READ_id = r.DNA_READ_id desc, e2.Naam, o2.Organisme_naam"""
+
+# Queries of the taxonomy pages, the number of hits of every taxon and its descendants is read from TAXON_TELLING,
+# which insert_script keeps up to date, so the HIT table is never scanned
+TAXON_CHILDREN_QUERY = """
+  SELECT t.TAXON_id, t.Naam, c.Aantal FROM TAXON t
+  JOIN TAXON_TELLING c ON c.TAXON_id = t.TAXON_id
+  WHERE t.Ouder_id = %s
+  ORDER BY c.Aantal desc, t.Naam
+  LIMIT %s"""
+TAXON_RANK_QUERY = """
+  SELECT t.TAXON_id, t.Naam, c.Aantal FROM TAXON t
+  JOIN TAXON_TELLING c ON c.TAXON_id = t.TAXON_id
+  WHERE t.Rang = %s
+  ORDER BY c.Aantal desc, t.Naam
+  LIMIT %s"""
+TAXON_RANKS_QUERY = "SELECT DISTINCT Rang FROM TAXON"
+TAXON_LINEAGE_QUERY = """
+  SELECT t.TAXON_id, t.Naam, c.Aantal FROM TAXON_PAD p
+  JOIN TAXON t ON t.TAXON_id = p.Voorouder_id
+  LEFT JOIN TAXON_TELLING c ON c.TAXON_id = t.TAXON_id
+  WHERE p.Afstammeling_id = %s
+  ORDER BY t.Diepte"""
+# Maximum number of taxa in the table of a taxonomy page and in its bar chart
+TAXON_LIMIT = 100
+TAXON_GRAPH_SIZE = 10
+# Ranks that can be chosen on the taxonomy pages, from the root down, NCBI calls the superkingdom domain since 2025
+RANKS = ["domain", "superkingdom", "kingdom", "phylum", "class", "order", "family", "genus", "species"]
+
+# Query of the packed sequence and qualities of a read
+READ_QUERY = "SELECT Header, Sequentie, Kwaliteiten FROM DNA_READ WHERE DNA_READ_id = %s"
+
+# Hit pages that were retrieved recently, the least recently used page is removed when there are more than
+# HIT_CACHE_SIZE pages in the cache
+HIT_CACHE = OrderedDict()
+HIT_CACHE_LOCK = threading.Lock()
+HIT_CACHE_SIZE = 1000
+
+# Query of the export, {where} is filled in with the conditions made by search_conditions. The hits are ordered on
+# their id, so mysql can read them from the primary key instead of sorting the whole result first
+EXPORT_QUERY = """
+  SELECT h.HIT_id, r.Header, r.Quality_score, o.Organisme_naam, e.Naam, e.Accessiecode, e.Eiwit_comment, h.Score,
+  h.Query_cover, h.Identity, h.Positives, h.E_value FROM HIT h
+  NATURAL JOIN ORGANISME o
+  NATURAL JOIN EIWIT e
+  NATURAL JOIN DNA_READ r{where}
+  ORDER BY h.HIT_id"""
+# Names of the columns of the export
+EXPORT_COLUMNS = ["hit_id", "read_header", "read_quality", "organism", "protein_name", "accession", "comment",
+                  "bitscore", "query_cover", "identity", "positives", "evalue"]
+# Content type and file extension of every export format
+EXPORT_FORMATS = {'csv': ('text/csv; charset=utf-8', 'csv'),
+                  'jsonl': ('application/x-ndjson', 'jsonl'),
+                  'parquet': ('application/vnd.apache.parquet', 'parquet')}
+# Number of rows that are read from the database and sent to the browser at once, every chunk becomes a row group
+# in the Parquet format
+EXPORT_CHUNK_SIZE = 5000
+# Maximum number of exports that run at the same time, every export has a database connection of its own
+MAX_EXPORTS = 2
+EXPORT_SLOTS = threading.BoundedSemaphore(MAX_EXPORTS)
+# Number of seconds mysql waits for the browser to receive a chunk before it gives up on a running export
+EXPORT_WRITE_TIMEOUT = 3600
+
+# Length of the pieces the full-text indexes split the names and comments into, the ngram_token_size of mysql
+NGRAM_SIZE = 2
+
+# Default and maximum number of results per page on the results page
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 def makecon():
-    # makes connection with mySQL database
-    #returns cursor
-    con = mscon.connect(user="sql7241825", host="sql7.freemysqlhosting.net", database="sql7241825", password="7cCBxT27sc")
-    cursor = con.cursor()
+    # borrows connection from the pool of the database module
+    # returns cursor and connection, give the connection back with closecon
+    # every query is timed by the metrics module
+    con = database.borrow()
+    cursor = metrics.TimedCursor(con.cursor(), "webapp")
     return cursor, con
 
+def closecon(cursor, con):
+    # closes cursor and gives connection back to the pool
+    cursor.close()
+    database.give_back(con)
+
 def getdata(cursor):
     #input: cursor
     #gets organism and protein data from database
@@ -54,58 +186,77 @@ def getdata(cursor):
 
     return data
 
-def makegraph(cursor):
-    #input: cursor
-    #creates barcharts of most common organisms
-    #returns list of most common organisms
-    querys = [
-        "SELECT count(*), Organisme_naam FROM HIT natural join ORGANISME group by ORGANISME_id order by count(*) desc",
-        "SELECT count(*), naam FROM HIT natural join EIWIT group by Naam order by count(*) desc"]
-    mostcommon = {
-        'soorten': [],
-        'eiwitten': []
-    }
-    for i in range(2):
-        cursor.execute(querys[i])
-        x = []
-        y = []
-        for value in cursor:
-            x.append(value[1])
-            y.append(value[0])
-        if i == 0:
-            id = 'soorten'
-            for index in range(10):
-                mostcommon[id].append(x[index])
-        if i == 1:
-            id = 'eiwitten'
-            for index in range(10):
-                mostcommon[id].append(x[index])
-
-        plt.bar(range(10), y[:10], color='#5f021f', align='center')
-        plt.xticks(range(10), range(1, 11))
-        plt.title("Meest voorkomende " + id)
-        plt.xlabel("")
-        plt.ylabel("Frequentie")
-        plt.tight_layout()
-        graphfile = BytesIO()
-        plt.savefig(graphfile, format='png')
-        graphfile.seek(0)
-        figdata_png = graphfile.getvalue()
-        figdata_png = base64.b64encode(figdata_png)
-        figdata_png = figdata_png.decode('utf-8')
-        GRAPHS[id]['html'] = figdata_png
-        plt.close()
-    return mostcommon
-
-
-def result_retriever(organism, protein, protein_comment, read_quality):
-    """This function accepts an organism name, protein name, protein comment and read quality. It then queries
-    the mysql database to find all results in which the organism name, protein name and protein comment are present
-    and where the minimal read quality was the read quality given to the function. It then returns a list of tuples
-    containing the data of each result.
-    """
-    cursor, con = makecon()
-
+def makegraph(cursor, id, version):
+    #input: cursor, graph id and version of the HIT table
+    #creates barchart of most common organisms or proteins from the summary tables
+    #returns dictionary with the most common names, the png image and its etag and creation time
+    cursor.execute(GRAPH_QUERIES[id])
+    x = []
+    y = []
+    for value in cursor:
+        x.append(value[1])
+        y.append(value[0])
+
+    png = plotbars(y, "Meest voorkomende " + id)
+    return {'mostcommon': x, 'png': png, 'etag': hashlib.md5(png).hexdigest(), 'version': version,
+            'last_modified': datetime.now(timezone.utc), 'checked': time.time()}
+
+
+def plotbars(y, title):
+    #input: list of frequencies and title
+    #creates barchart with a numbered bar for every frequency
+    #returns the png image
+    figure = Figure()
+    axes = figure.subplots()
+    axes.bar(range(len(y)), y, color='#5f021f', align='center')
+    axes.set_xticks(range(len(y)))
+    axes.set_xticklabels(range(1, len(y) + 1))
+    axes.set_title(title)
+    axes.set_xlabel("")
+    axes.set_ylabel("Frequentie")
+    figure.tight_layout()
+    graphfile = BytesIO()
+    figure.savefig(graphfile, format='png')
+    return graphfile.getvalue()
+
+
+def get_graph(id):
+    """This function accepts a graph id and returns the rendered graph from the cache. At most once every
+    GRAPH_CHECK_INTERVAL seconds it checks whether hits were added to the HIT table since the graph was made, in
+    which case the graph is made again. Only the requests for the same graph wait while it is checked or made,
+    requests for the other graphs don't."""
+    graph = GRAPH_CACHE.get(id)
+    if graph is not None and time.time() - graph['checked'] < GRAPH_CHECK_INTERVAL:
+        return graph
+    with GRAPH_LOCKS[id]:
+        # Another request may have checked the graph while this one waited for the lock
+        graph = GRAPH_CACHE.get(id)
+        if graph is not None and time.time() - graph['checked'] < GRAPH_CHECK_INTERVAL:
+            return graph
+        cursor, con = makecon()
+        try:
+            cursor.execute("SELECT MAX(HIT_id) FROM HIT")
+            version = cursor.fetchone()[0]
+            if graph is None or graph['version'] != version:
+                graph = makegraph(cursor, id, version)
+                GRAPH_CACHE[id] = graph
+            else:
+                graph['checked'] = time.time()
+        finally:
+            closecon(cursor, con)
+        return graph
+
+
+def search_conditions(organism, protein, protein_comment, read_quality):
+    """This function accepts an organism name, protein name, protein comment and read quality as entered in the
+    search form and returns the WHERE clause of a search query on the HIT, ORGANISME, EIWIT and DNA_READ tables
+    together with its parameters.
+
+    For every search term the matching organism or protein ids are first looked up with the full-text indexes
+    created by the schema module, after which only those ids are joined to the HIT table. Within these candidates
+    the term is still matched with LIKE, so the results are the same as with a plain LIKE search. Terms shorter than
+    the ngram size of the indexes are only matched with LIKE. An empty term matches everything, except that the
+    protein comment has to be filled in, like with LIKE '%%'."""
     if read_quality == "":
         read_quality = 0
     else:
@@ -114,33 +265,125 @@ def result_retriever(organism, protein, protein_comment, read_quality):
         except ValueError:
             read_quality = 0
 
-    organism = '%'+organism+'%'
-    protein = '%'+protein+'%'
-    protein_comment ='%'+protein_comment+'%'
-
-
-    query = """
-      SELECT h.HIT_id, o.Organisme_naam, e.Naam, h.Score, h.Query_cover, h.Identity, h.E_value FROM HIT h
-      NATURAL JOIN ORGANISME o
-      NATURAL JOIN EIWIT e
-      NATURAL JOIN DNA_READ r
-      WHERE o.Organisme_naam LIKE %s
-      AND e.Naam LIKE %s
-      AND e.Eiwit_comment LIKE %s
-      AND r.Quality_score > %s
-      ORDER BY h.Score desc, h.Query_cover desc, h.Identity desc"""
-    cursor.execute(query, (organism, protein, protein_comment, read_quality))
-    result_list = []
-
-    for element in cursor:
-        try:
-            protein_name = element[2].split('[')[0]
-            result_list.append((element[0], element[1], protein_name, element[3], element[4], element[5], element[6]))
-        except IndexError:
-            result_list.append(element)
-    cursor.close()
-    con.close()
-    return result_list
+    where = """
+      WHERE r.Quality_score > %s"""
+    parameters = [read_quality]
+    for term, id_column, table, column in [(organism, 'ORGANISME_id', 'ORGANISME', 'Organisme_naam'),
+                                           (protein, 'EIWIT_id', 'EIWIT', 'Naam'),
+                                           (protein_comment, 'EIWIT_id', 'EIWIT', 'Eiwit_comment')]:
+        alias = table[0].lower()
+        if term == "":
+            if column == 'Eiwit_comment':
+                where += """
+      AND e.Eiwit_comment IS NOT NULL"""
+        elif len(term) < NGRAM_SIZE:
+            where += """
+      AND {}.{} LIKE %s""".format(alias, column)
+            parameters.append('%'+term+'%')
+        else:
+            where += """
+      AND {alias}.{id} IN (SELECT {id} FROM {table}
+                           WHERE MATCH({column}) AGAINST (%s IN BOOLEAN MODE) AND {column} LIKE %s)""".format(
+                alias=alias, id=id_column, table=table, column=column)
+            parameters.append('"' + term.replace('"', ' ') + '"')
+            parameters.append('%'+term+'%')
+    return where, parameters
+
+
+def result_retriever(organism, protein, protein_comment, read_quality, after=None, page_size=PAGE_SIZE):
+    """This function accepts an organism name, protein name, protein comment and read quality. It then queries
+    the mysql database to find all results in which the organism name, protein name and protein comment are present
+    and where the minimal read quality was the read quality given to the function.
+
+    The results are ordered on score, query cover, identity and hit id and only one page of at most page_size results
+    is retrieved. If after is given, the page starts after the result with those four values, so the database can
+    jump straight to the page instead of skipping all earlier results. It returns a list of tuples containing the data
+    of each result and the values to pass as after to get the next page, or None if this is the last page.
+    """
+    # At least one result per page, otherwise there is no last result to continue after
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    where, parameters = search_conditions(organism, protein, protein_comment, read_quality)
+    if after is not None:
+        where += """
+      AND (h.Score, h.Query_cover, h.Identity, h.HIT_id) < (%s, %s, %s, %s)"""
+        parameters.extend(after)
+
+    cursor, con = makecon()
+    try:
+        cursor.execute(RESULTS_QUERY.format(where=where), parameters + [page_size + 1])
+        result_list = []
+
+        for element in cursor:
+            try:
+                protein_name = element[2].split('[')[0]
+                result_list.append((element[0], element[1], protein_name, element[3], element[4], element[5], element[6]))
+            except IndexError:
+                result_list.append(element)
+    finally:
+        closecon(cursor, con)
+
+    next_after = None
+    if len(result_list) > page_size:
+        result_list = result_list[:page_size]
+        last = result_list[-1]
+        next_after = (last[3], last[4], last[5], last[0])
+    return result_list, next_after
+
+
+def count_results(organism, protein, protein_comment, read_quality):
+    """This function accepts the same search information as result_retriever and returns the total number of
+    results."""
+    where, parameters = search_conditions(organism, protein, protein_comment, read_quality)
+    cursor, con = makecon()
+    try:
+        cursor.execute(COUNT_QUERY.format(where=where), parameters)
+        return cursor.fetchone()[0]
+    finally:
+        closecon(cursor, con)
+
+
+def get_taxa(taxon_id=0, rank=None):
+    """This function accepts a taxon id or a rank. It returns the lineage of the taxon as a list of tuples with the
+    id, name and number of hits of every taxon from the root down to the taxon itself, followed by the same tuples
+    for the children of the taxon or, if a rank is given, for the taxa of that rank, with the most hits first. Taxon
+    id 0 stands for the roots of the tree. The number of hits of a taxon includes the hits of all its descendants.
+    None is returned if the taxon doesn't exist."""
+    cursor, con = makecon()
+    try:
+        lineage = []
+        if rank is not None:
+            cursor.execute(TAXON_RANK_QUERY, (rank, TAXON_LIMIT))
+            taxa = cursor.fetchall()
+        else:
+            if taxon_id != 0:
+                cursor.execute(TAXON_LINEAGE_QUERY, (taxon_id,))
+                lineage = cursor.fetchall()
+                if not lineage:
+                    return None
+            cursor.execute(TAXON_CHILDREN_QUERY, (taxon_id, TAXON_LIMIT))
+            taxa = cursor.fetchall()
+    finally:
+        closecon(cursor, con)
+    return lineage, taxa
+
+
+def get_ranks():
+    """This function returns the ranks of RANKS that at least one taxon has, from the root down."""
+    cursor, con = makecon()
+    try:
+        cursor.execute(TAXON_RANKS_QUERY)
+        present = set(row[0] for row in cursor.fetchall())
+    finally:
+        closecon(cursor, con)
+    return [rank for rank in RANKS if rank in present]
+
+
+def stream_template(template_name, **context):
+    """This function renders an HTML template piece by piece, so the first part of the page is sent to the browser
+    before the whole page has been rendered."""
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return stream_with_context(template.stream(context))
 
 
 def get_hit_data(hit_id):
@@ -148,54 +391,197 @@ def get_hit_data(hit_id):
     corresponding to that hit. It returns a 2d hit info list containing labels and values for all the data retrieved.
     It also returns a list of tuples containing the data of the read that the hit was found with, including the other
     hits that were found with that read. A similar list is returned for the reverse or forward read corresponding to
-    that read.
+    that read. If the hit doesn't exist, None is returned.
+
+    All data is retrieved with a single query. Because hits don't change after they are stored, the result is kept
+    in a cache. Hits of reads without a corresponding read aren't cached, since that read could still be added.
     """
+    with HIT_CACHE_LOCK:
+        if hit_id in HIT_CACHE:
+            HIT_CACHE.move_to_end(hit_id)
+            return HIT_CACHE[hit_id]
+
     cursor, con = makecon()
-    query = """
-      SELECT r.DNA_READ_id, r.For_rev_id, e.Naam, o.Organisme_naam, h.Score, h.Query_cover, h.Identity, h.Positives, h.E_value,
-      e.Eiwit_comment, e.Accessiecode
-      FROM DNA_READ r
-      NATURAL JOIN HIT h
-      NATURAL JOIN ORGANISME o
-      NATURAL JOIN EIWIT e
-      WHERE h.HIT_id = %s"""
-    cursor.execute(query, (hit_id,))
-
-    for element in cursor:
-        result_tuple = element
-
-
-    query = """
-    SELECT r.Header, r.Quality_score, e.Naam, h.HIT_id, o.Organisme_naam FROM DNA_READ r
-    NATURAL LEFT OUTER JOIN HIT h
-    NATURAL LEFT OUTER JOIN EIWIT e
-    NATURAL LEFT OUTER JOIN ORGANISME o
-    WHERE r.DNA_READ_id = %s
-    ORDER BY e.Naam, o.Organisme_naam"""
-    cursor.execute(query, (result_tuple[0],))
+    try:
+        cursor.execute(HIT_DETAIL_QUERY, (hit_id,))
+        rows = cursor.fetchall()
+    finally:
+        closecon(cursor, con)
+    if not rows:
+        return None
 
     read_list1 = []
-    for element in cursor:
-        read_list1.append(element)
-
     read_list2 = []
-
-    if result_tuple[1] is not None:
-
-        cursor.execute(query, (result_tuple[1],))
-        read_list2 = []
-        for element in cursor:
-            read_list2.append(element)
+    for row in rows:
+        if row[10]:
+            read_list1.append(tuple(row[11:]))
+        else:
+            read_list2.append(tuple(row[11:]))
 
     label_list = ["Eiwit naam: ", "Organisme naam: ", "Bitscore: ", "Percentage query coverage: ",
                   "Percentage identity: ", "Percentage positives: ", "E value: ", "Eiwit comment: ", "Accessiecode: "]
     hit_info_list = []
-    for value, label in zip(result_tuple[2:], label_list):
+    for value, label in zip(rows[0][:9], label_list):
         hit_info_list.append([label, value])
-    cursor.close()
-    con.close()
 
-    return hit_info_list, read_list1, read_list2
+    hit_data = (hit_info_list, read_list1, read_list2)
+    if rows[0][9] is not None:
+        with HIT_CACHE_LOCK:
+            HIT_CACHE[hit_id] = hit_data
+            HIT_CACHE.move_to_end(hit_id)
+            while len(HIT_CACHE) > HIT_CACHE_SIZE:
+                HIT_CACHE.popitem(last=False)
+    return hit_data
+
+
+def hit_data_dict(hit_id, hit_info_list, read_list1, read_list2):
+    """This function accepts a hit id and the lists returned by get_hit_data and returns the same data as a
+    dictionary that can be converted to JSON."""
+    keys = ["protein_name", "organism", "bitscore", "query_cover", "identity", "positives", "evalue", "comment",
+            "accession"]
+    hit_info = {}
+    for key, (label, value) in zip(keys, hit_info_list):
+        hit_info[key] = value
+
+    def read_dict(read_list):
+        if not read_list:
+            return None
+        hits = []
+        for header, quality_score, protein_name, read_hit_id, organism, read_id in read_list:
+            if read_hit_id is not None:
+                hits.append({"hit_id": read_hit_id, "protein_name": protein_name, "organism": organism})
+        return {"read_id": read_list[0][5], "header": read_list[0][0], "quality_score": read_list[0][1],
+                "hits": hits}
+
+    return {"hit_id": hit_id, "hit": hit_info, "read": read_dict(read_list1),
+            "corresponding_read": read_dict(read_list2)}
+
+
+class ExportSink(RawIOBase):
+    """File-like object that the Parquet writer writes to. It keeps only the bytes that haven't been sent yet,
+    but counts all written bytes, because the writer stores the positions of the row groups in the file."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        """Returns the bytes written since the last call and forgets them."""
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_chunks(cursor, export_format):
+    """This function accepts a cursor on which the export query was executed and the export format and yields the
+    rows of the query in that format, EXPORT_CHUNK_SIZE rows at a time. Only one chunk of rows is in memory at once.
+    In the Parquet format every chunk becomes a row group of its own."""
+    if export_format == 'parquet':
+        schema = pyarrow.schema([("hit_id", pyarrow.int64()), ("read_header", pyarrow.string()),
+                                 ("read_quality", pyarrow.int64()), ("organism", pyarrow.string()),
+                                 ("protein_name", pyarrow.string()), ("accession", pyarrow.string()),
+                                 ("comment", pyarrow.string()), ("bitscore", pyarrow.float64()),
+                                 ("query_cover", pyarrow.float64()), ("identity", pyarrow.float64()),
+                                 ("positives", pyarrow.float64()), ("evalue", pyarrow.float64())])
+        sink = ExportSink()
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    elif export_format == 'csv':
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_COLUMNS)
+        yield output.getvalue()
+
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        if export_format == 'parquet':
+            columns = list(zip(*rows))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            yield sink.take()
+        elif export_format == 'csv':
+            output.seek(0)
+            output.truncate()
+            writer.writerows(rows)
+            yield output.getvalue()
+        else:
+            yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+    if export_format == 'parquet':
+        writer.close()
+        yield sink.take()
+
+
+def get_read_data(read_id):
+    """This function accepts a read id and returns the header, sequence and phred scores of the read, with the
+    sequence and qualities unpacked by the codec module. The phred scores are None if the qualities of the read
+    weren't stored. If the read doesn't exist, None is returned."""
+    cursor, con = makecon()
+    try:
+        cursor.execute(READ_QUERY, (read_id,))
+        row = cursor.fetchone()
+    finally:
+        closecon(cursor, con)
+    if row is None:
+        return None
+    header, sequence, qualities = row
+    sequence = codec.decode_sequence(sequence) if sequence is not None else None
+    phred_scores = codec.decode_phred_scores(qualities).tolist() if qualities is not None else None
+    return header, sequence, phred_scores
+
+
+def makequalitygraph(header, phred_scores):
+    #input: header and phred scores of a read
+    #creates a line graph of the phred score of every base of the read
+    #returns the png image
+    figure = Figure(figsize=(8, 3))
+    axes = figure.subplots()
+    axes.plot(range(1, len(phred_scores) + 1), phred_scores, color='#5f021f')
+    axes.set_title(header)
+    axes.set_xlabel("Positie")
+    axes.set_ylabel("Phred score")
+    axes.set_ylim(0, 45)
+    figure.tight_layout()
+    graphfile = BytesIO()
+    figure.savefig(graphfile, format='png')
+    return graphfile.getvalue()
+
+
+@app.before_request
+def start_timer():
+    """This function stores the time at which the handling of a request started."""
+    g.start_time = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    """This function adds the duration of the request to the request histogram of the metrics module, with the
+    route, method and status code as labels. For streamed pages only the time until the response is returned
+    is counted."""
+    start_time = g.get('start_time')
+    if start_time is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start_time, route, request.method,
+                                        response.status_code)
+    return response
+
+
+@app.route('/metrics')
+def metrics_page():
+    """This function returns the metrics of the web application in the Prometheus text format."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route('/')
@@ -207,38 +593,218 @@ def gotohomepage():
 def barchart(id):
     """This function renders the HTML template for the homepage of the application, showing a bar chart
     with the most found species or proteins, depending on the id that was given in the url."""
-    cursor, con = makecon()
-    graph = GRAPHS.get(id)
-    mostcommon = makegraph(cursor)
-    most10 = mostcommon.get(id)
-    cursor.close()
-    con.close()
-    return render_template("graph.html", graph=graph, mostcommon=most10, id=id)
+    if id not in GRAPHS:
+        abort(404)
+    graph = get_graph(id)
+    return render_template("graph.html", graph=GRAPHS[id], etag=graph['etag'], mostcommon=graph['mostcommon'], id=id)
+
+
+@app.route('/grafiek/<id>.png')
+def graph_png(id):
+    """This function returns the png image of the bar chart with the most found species or proteins. The image
+    has an ETag and Last-Modified header, so browsers only download it again when it has changed."""
+    if id not in GRAPHS:
+        abort(404)
+    graph = get_graph(id)
+    response = make_response(graph['png'])
+    response.mimetype = 'image/png'
+    response.set_etag(graph['etag'])
+    response.last_modified = graph['last_modified']
+    response.cache_control.public = True
+    response.cache_control.max_age = GRAPH_CHECK_INTERVAL
+    return response.make_conditional(request)
+
+
+@app.route('/taxonomie')
+@app.route('/taxonomie/<int:taxon_id>')
+def taxonomy(taxon_id=0):
+    """This function renders the HTML template of the taxonomy page of a taxon, with its lineage and a bar chart
+    and table of the number of hits of its children. Without a taxon id, the roots of the taxonomy tree are shown.
+    For an organism, which has no children, the page links to its search results."""
+    taxa = get_taxa(taxon_id)
+    if taxa is None:
+        abort(404)
+    lineage, children = taxa
+    return render_template("taxonomy.html", lineage=lineage, taxa=children, rank=None, ranks=get_ranks(),
+                           graph_url=url_for('taxonomy_png', taxon_id=taxon_id))
+
+
+@app.route('/taxonomie/rang/<rank>')
+def taxonomy_rank(rank):
+    """This function renders the HTML template of the taxonomy page with the taxa of a rank, such as phylum or
+    genus, that have the most hits."""
+    lineage, taxa = get_taxa(rank=rank)
+    return render_template("taxonomy.html", lineage=lineage, taxa=taxa, rank=rank, ranks=get_ranks(),
+                           graph_url=url_for('taxonomy_rank_png', rank=rank))
+
+
+@app.route('/taxonomie/<int:taxon_id>.png')
+def taxonomy_png(taxon_id):
+    """This function returns the png image of the bar chart with the children of a taxon that have the most hits."""
+    taxa = get_taxa(taxon_id)
+    if taxa is None:
+        abort(404)
+    lineage, children = taxa
+    title = lineage[-1][1] if lineage else "Taxonomie"
+    return taxonomy_graph_response(children, title)
+
+
+@app.route('/taxonomie/rang/<rank>.png')
+def taxonomy_rank_png(rank):
+    """This function returns the png image of the bar chart with the taxa of a rank that have the most hits."""
+    lineage, taxa = get_taxa(rank=rank)
+    return taxonomy_graph_response(taxa, rank.capitalize())
+
+
+def taxonomy_graph_response(taxa, title):
+    """This function accepts a list of taxa with their number of hits and a title and returns a response with the
+    bar chart of the first TAXON_GRAPH_SIZE taxa. The counts only change when hits are added, so browsers may keep
+    the image for GRAPH_CHECK_INTERVAL seconds."""
+    response = make_response(plotbars([taxon[2] for taxon in taxa[:TAXON_GRAPH_SIZE]], title))
+    response.mimetype = 'image/png'
+    response.cache_control.public = True
+    response.cache_control.max_age = GRAPH_CHECK_INTERVAL
+    return response
 
 
 @app.route('/results', methods=['POST', 'GET'])
 def results():
     """This function calls the result_retriever function to get results out of the mysql database
-    based on the search information that was passed on from an HTML form. It then renders the HTML template
-    that displays these results."""
-    if request.method == 'POST':
-        organism = request.form['organism']
-        protein = request.form['protein']
-        comment = request.form['comment']
-        read_quality = request.form['read_quality']
-        result_list = result_retriever(organism, protein, comment, read_quality)
-        return render_template('results.html', result_list=result_list)
+    based on the search information that was passed on from an HTML form or from the url of the next page.
+    It then renders the HTML template that displays one page of these results. The total number of results is
+    only counted if the url asks for it with count=1."""
+    if 'organism' in request.values:
+        organism = request.values.get('organism', '')
+        protein = request.values.get('protein', '')
+        comment = request.values.get('comment', '')
+        read_quality = request.values.get('read_quality', '')
+        try:
+            page_size = max(1, min(int(request.values.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE))
+        except ValueError:
+            page_size = PAGE_SIZE
+        after = parse_after(request.values.get('after'))
+        result_list, next_after = result_retriever(organism, protein, comment, read_quality, after, page_size)
+        total = None
+        if request.values.get('count') == '1':
+            total = count_results(organism, protein, comment, read_quality)
+        next_url = None
+        if next_after is not None:
+            next_url = url_for('results', organism=organism, protein=protein, comment=comment,
+                               read_quality=read_quality, page_size=page_size,
+                               after=",".join(str(value) for value in next_after),
+                               count=request.values.get('count', '0'))
+        export_urls = [(name, url_for('export', format=export_format, organism=organism, protein=protein,
+                                      comment=comment, read_quality=read_quality))
+                       for export_format, name in [('csv', 'CSV'), ('jsonl', 'JSON Lines'), ('parquet', 'Parquet')]
+                       if export_format != 'parquet' or pyarrow is not None]
+        return Response(stream_template('results.html', result_list=result_list, next_url=next_url, total=total,
+                                        export_urls=export_urls))
     else:
         return render_template('results.html', result_list=[[]])
 
 
-@app.route('/hit/<hit_id>')
+@app.route('/export')
+def export():
+    """This function exports all results of a search with the same search information as the results page, in
+    the CSV, JSON Lines or Parquet format that is given with format in the url.
+
+    The rows are read with an unbuffered cursor, so mysql sends them while they are read, and are sent to the
+    browser in chunks. The memory use therefore stays the same however many hits are exported. Every export uses a
+    connection of its own instead of one from the pool, so the other pages keep working during a long export. When
+    MAX_EXPORTS exports are already running, 503 is returned."""
+    export_format = request.values.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        abort(400, "Unknown export format, use one of: " + ", ".join(EXPORT_FORMATS))
+    if export_format == 'parquet' and pyarrow is None:
+        abort(501, "The Parquet format needs pyarrow, which isn't installed")
+    where, parameters = search_conditions(request.values.get('organism', ''), request.values.get('protein', ''),
+                                          request.values.get('comment', ''), request.values.get('read_quality', ''))
+    if not EXPORT_SLOTS.acquire(blocking=False):
+        abort(503, "Too many exports are running, try again later")
+    try:
+        con = database.open_connection()
+        try:
+            cursor = metrics.TimedCursor(con.cursor(buffered=False), "webapp")
+            cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_WRITE_TIMEOUT,))
+            cursor.execute(EXPORT_QUERY.format(where=where), parameters)
+        except Exception:
+            con.close()
+            raise
+    except Exception:
+        EXPORT_SLOTS.release()
+        raise
+
+    def finish():
+        # closes the connection when the export is done or the browser stopped downloading, mysql drops the rows
+        # that weren't read yet
+        try:
+            con.close()
+        finally:
+            EXPORT_SLOTS.release()
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    response = Response(export_chunks(cursor, export_format), content_type=content_type)
+    response.headers['Content-Disposition'] = 'attachment; filename=hits.' + extension
+    response.call_on_close(finish)
+    return response
+
+
+def parse_after(after):
+    """This function accepts the after value from the url of a result page and returns the score, query cover,
+    identity and hit id in it. If there is no valid after value, None is returned, so the first page is shown."""
+    if not after:
+        return None
+    try:
+        score, query_cover, identity, hit_id = after.split(",")
+        return float(score), float(query_cover), float(identity), int(hit_id)
+    except ValueError:
+        return None
+
+
+@app.route('/hit/<int:hit_id>')
 def hit(hit_id):
     """This function calls the get_hit_data function to retrieve all relevant hit information based on a hit id
     passed on in the URL. It the renders the HTML template that displays this hit information."""
-    hit_info_list, read_list1, read_list2 = get_hit_data(hit_id)
+    hit_data = get_hit_data(hit_id)
+    if hit_data is None:
+        abort(404)
+    hit_info_list, read_list1, read_list2 = hit_data
     return render_template("hit_info.html", hit_info_list=hit_info_list, read_list1=read_list1, read_list2=read_list2)
 
 
+@app.route('/read/<int:read_id>/kwaliteit.png')
+def read_quality_png(read_id):
+    """This function returns a png image with the phred score of every base of a read. The hit page loads this
+    image separately, so the qualities are only unpacked when they are shown. Reads don't change after they are
+    stored, so browsers may keep the image for a day."""
+    read_data = get_read_data(read_id)
+    if read_data is None or read_data[2] is None:
+        abort(404)
+    response = make_response(makequalitygraph(read_data[0], read_data[2]))
+    response.mimetype = 'image/png'
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+
+@app.route('/api/read/<int:read_id>')
+def read_json(read_id):
+    """This function returns the header, sequence and phred scores of a read as JSON."""
+    read_data = get_read_data(read_id)
+    if read_data is None:
+        abort(404)
+    header, sequence, phred_scores = read_data
+    return jsonify({"read_id": read_id, "header": header, "sequence": sequence, "phred_scores": phred_scores})
+
+
+@app.route('/api/hit/<int:hit_id>')
+def hit_json(hit_id):
+    """This function returns the same hit information as the hit page as JSON."""
+    hit_data = get_hit_data(hit_id)
+    if hit_data is None:
+        abort(404)
+    return jsonify(hit_data_dict(hit_id, *hit_data))
+
+
 if __name__ == '__main__':
     app.run()